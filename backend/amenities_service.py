@@ -1,11 +1,17 @@
 import requests
 import os
 import math
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import timed
 
 class AmenitiesFinder:
     def __init__(self):
         self.api_key = os.getenv('REACT_APP_MAPTILER_KEY') or os.getenv('MAPTILER_KEY')
         self.base_url = "https://api.maptiler.com/geocoding"
+        # Geocoding queries are independent, so they are issued concurrently
+        self.executor = ThreadPoolExecutor(max_workers=12, thread_name_prefix='amenities')
 
     def find_amenities(self, lat, lng, radius_km=50.0):
         """
@@ -31,47 +37,22 @@ class AmenitiesFinder:
             'parks': ['park', 'garden']
         }
 
+        # Issue every query concurrently; results are merged in query order below
+        pending = {
+            query: self.executor.submit(contextvars.copy_context().run, self._search, query, lat, lng)
+            for queries in searches.values()
+            for query in queries
+        }
+
         total_results = 0
         for category, queries in searches.items():
             category_results = []
             for query in queries:
-                try:
-                    # Search with proximity bias, but large bbox
-                    url = f"{self.base_url}/{query}.json"
-                    params = {
-                        'key': self.api_key,
-                        'proximity': f"{lng},{lat}",
-                        'limit': 5,  # Get more to filter/sort
-                        'bbox': f"{lng-0.5},{lat-0.5},{lng+0.5},{lat+0.5}" # ~50km box
-                    }
-                    
-                    response = requests.get(url, params=params, timeout=10)
-                    if response.status_code == 200:
-                        features = response.json().get('features', [])
-                        for feature in features:
-                            place_lng, place_lat = feature['center']
-                            dist = self._calculate_distance(lat, lng, place_lat, place_lng)
-                            
-                            # Calculate estimated travel time (walking speed ~5 km/h, driving ~30 km/h in city)
-                            walking_time = max(1, round((dist / 5) * 60))  # minutes, minimum 1
-                            driving_time = max(1, round((dist / 30) * 60))  # minutes, minimum 1
-                            
-                            item = {
-                                'name': feature.get('place_name', feature.get('text', 'Unknown')),
-                                'distance': round(dist, 2) if dist > 0 else 0.1,
-                                'walkingTime': walking_time,
-                                'drivingTime': driving_time,
-                                'lat': place_lat,
-                                'lng': place_lng,
-                                'type': category
-                            }
-                            # Avoid duplicates
-                            if not any(x['name'] == item['name'] for x in category_results):
-                                category_results.append(item)
-                    else:
-                        print(f"API error for {query}: Status {response.status_code}")
-                except Exception as e:
-                    print(f"Error searching for {query}: {e}")
+                for item in pending[query].result():
+                    item['type'] = category
+                    # Avoid duplicates
+                    if not any(x['name'] == item['name'] for x in category_results):
+                        category_results.append(item)
             
             # Sort by distance and take top 3
             category_results.sort(key=lambda x: x['distance'])
@@ -91,6 +72,45 @@ class AmenitiesFinder:
 
         return amenities
 
+    def _search(self, query, lat, lng):
+        """Run one geocoding query and return the places found around the location"""
+        results = []
+        try:
+            # Search with proximity bias, but large bbox
+            url = f"{self.base_url}/{query}.json"
+            params = {
+                'key': self.api_key,
+                'proximity': f"{lng},{lat}",
+                'limit': 5,  # Get more to filter/sort
+                'bbox': f"{lng-0.5},{lat-0.5},{lng+0.5},{lat+0.5}" # ~50km box
+            }
+            
+            with timed(f"amenity_query_{query.replace(' ', '_')}"):
+                response = requests.get(url, params=params, timeout=10)
+            if response.status_code == 200:
+                features = response.json().get('features', [])
+                for feature in features:
+                    place_lng, place_lat = feature['center']
+                    dist = self._calculate_distance(lat, lng, place_lat, place_lng)
+                    
+                    # Calculate estimated travel time (walking speed ~5 km/h, driving ~30 km/h in city)
+                    walking_time = max(1, round((dist / 5) * 60))  # minutes, minimum 1
+                    driving_time = max(1, round((dist / 30) * 60))  # minutes, minimum 1
+                    
+                    results.append({
+                        'name': feature.get('place_name', feature.get('text', 'Unknown')),
+                        'distance': round(dist, 2) if dist > 0 else 0.1,
+                        'walkingTime': walking_time,
+                        'drivingTime': driving_time,
+                        'lat': place_lat,
+                        'lng': place_lng
+                    })
+            else:
+                print(f"API error for {query}: Status {response.status_code}")
+        except Exception as e:
+            print(f"Error searching for {query}: {e}")
+        return results
+
     def get_road_condition(self, lat, lng):
         """
         Infer road condition using Overpass API (OpenStreetMap).
@@ -103,7 +123,8 @@ class AmenitiesFinder:
                 way(around:50,{lat},{lng})["highway"];
                 out tags;
             """
-            response = requests.post("https://overpass-api.de/api/interpreter", data=query)
+            with timed('overpass'):
+                response = requests.post("https://overpass-api.de/api/interpreter", data=query, timeout=15)
             
             if response.status_code == 200:
                 data = response.json()
@@ -1,29 +1,65 @@
+import hashlib
+import json
 import os
+import shutil
 from datetime import datetime
 
 from document_processor import DocumentProcessor
-from flask import Flask, jsonify, request, send_from_directory
+from flask import (Flask, Response, jsonify, request, send_from_directory,
+                   stream_with_context)
 from flask_cors import CORS
+from model_registry import CityModelRegistry
 from zoning_ml_model import ZoningMLModel
 
 app = Flask(__name__, static_folder='static', static_url_path='')
 CORS(app)
 
-# Initialize ML model and document processor
-ml_model = ZoningMLModel()
+# Initialize ML model and document processor. Requests take the serving model
+# once from zoning_models.current(city); retraining swaps in a new instance
+zoning_models = CityModelRegistry(ZoningMLModel)
 doc_processor = DocumentProcessor()
 
 # Initialize new services
 from amenities_service import AmenitiesFinder
 from aqi_model import AQIPredictor
+from document_store import city_slug
 from dotenv import load_dotenv
 from flood_model import FloodPredictor
+import geometry
+from jobs import DocumentIngestionQueue, JobStore, ModelTrainingQueue
+import metrics
+from report_cache import ReportCache, json_default
+from report_orchestrator import ReportOrchestrator, ReportStage
+from rule_tables import RuleTableCache
+import scenarios
+from spatial_index import AreaStore, load_areas
+from training_store import TrainingStore
 
 load_dotenv() # Load environment variables
 
 amenities_finder = AmenitiesFinder()
 aqi_predictor = AQIPredictor()
 flood_predictor = FloodPredictor()
+report_orchestrator = ReportOrchestrator()
+report_cache = ReportCache()
+job_store = JobStore()
+rule_tables = RuleTableCache(doc_processor.store)
+area_store = AreaStore()
+training_store = TrainingStore(ZoningMLModel.FEATURE_NAMES)
+metrics.init_app(app)
+
+# Per-stage deadlines (seconds) for /api/generate-report
+REPORT_STAGE_TIMEOUTS = {
+    'amenities': float(os.getenv('REPORT_TIMEOUT_AMENITIES', 12)),
+    'aqiForecast': float(os.getenv('REPORT_TIMEOUT_AQI', 10)),
+    'roadCondition': float(os.getenv('REPORT_TIMEOUT_ROAD', 8)),
+    'floodRisk': float(os.getenv('REPORT_TIMEOUT_FLOOD', 10))
+}
+MAX_BATCH_PARCELS = int(os.getenv('MAX_BATCH_PARCELS', 500))
+# Network stages of one batch running at once; each amenity lookup fans out further on its own pool
+REPORT_BATCH_CONCURRENCY = int(os.getenv('REPORT_BATCH_CONCURRENCY', 4))
+MAX_TRAINING_SAMPLES = int(os.getenv('MAX_TRAINING_SAMPLES', 10000))
+MAX_SCENARIOS = int(os.getenv('MAX_SCENARIOS', 1000))
 
 # Load flood model on startup
 try:
@@ -41,13 +77,14 @@ def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'model_trained': ml_model.is_trained(),
-        'documents_processed': len(doc_processor.get_documents())
+        'model_trained': zoning_models.current().is_trained(),
+        'city_models': zoning_models.stats(),
+        'documents_processed': doc_processor.store.count()
     })
 
 @app.route('/api/upload-document', methods=['POST'])
 def upload_document():
-    """Upload and process zoning regulation documents"""
+    """Upload a zoning regulation document and queue it for processing"""
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
     
@@ -58,60 +95,209 @@ def upload_document():
     # Get optional city parameter (default: bangalore)
     city = request.form.get('city', 'bangalore').lower()
     
-    # Create city-specific folder
-    city_folder = os.path.join(ZONING_DOCS_FOLDER, city)
-    os.makedirs(city_folder, exist_ok=True)
-    
     # Save file with timestamp
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     filename = f"{timestamp}_{file.filename}"
     
-    # Save to both uploads (temporary) and zoning-documents (permanent)
+    # Saved to uploads (temporary); copied to zoning-documents once processed
     temp_filepath = os.path.join(UPLOAD_FOLDER, filename)
-    permanent_filepath = os.path.join(city_folder, filename)
-    
-    file.save(temp_filepath)
+    content_hash = _save_upload(file, temp_filepath)
     
-    try:
-        # Process document
-        extracted_data = doc_processor.process_document(temp_filepath, city=city)
-        
-        # Copy to permanent storage after successful processing
-        import shutil
-        shutil.copy2(temp_filepath, permanent_filepath)
-        
-        # Train model with extracted data
-        ml_model.add_training_data(extracted_data, city=city)
-        
-        print(f"✅ Document saved to: {permanent_filepath}")
-        print(f"📊 Extracted {len(extracted_data['rules'])} rules for {city}")
-        
+    existing = doc_processor.find_by_hash(content_hash, city)
+    if existing:
+        # Same content already ingested for this city: answer with a finished job
+        os.remove(temp_filepath)
+        job_id = job_store.create('ingest', {'filename': filename, 'city': city})
+        job_store.complete(job_id, dict(_ingestion_result(existing, existing.get('storage_path')), duplicate=True))
+        print(f"♻️ {filename} duplicates document {existing['id']}")
         return jsonify({
             'success': True,
-            'document_id': extracted_data['id'],
+            'job_id': job_id,
+            'status_url': f"/api/jobs/{job_id}",
             'filename': filename,
             'city': city,
-            'extracted_rules': len(extracted_data['rules']),
-            'processed': True,
-            'storage_path': permanent_filepath
+            'document_id': existing['id'],
+            'duplicate': True,
+            'processed': True
         })
+    
+    try:
+        job_id = ingestion_queue.submit(temp_filepath, city, content_hash)
     except Exception as e:
-        print(f"❌ Error processing document: {str(e)}")
+        print(f"❌ Error queueing document: {str(e)}")
         return jsonify({'error': str(e)}), 500
+    
+    print(f"📥 Queued {filename} for {city} (job {job_id})")
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': f"/api/jobs/{job_id}",
+        'filename': filename,
+        'city': city,
+        'processed': False
+    }), 202
+
+def _save_upload(file, path, chunk_size=1024 * 1024):
+    """Write an uploaded file to disk, hashing it on the way; returns the sha256"""
+    digest = hashlib.sha256()
+    with open(path, 'wb') as out:
+        for chunk in iter(lambda: file.stream.read(chunk_size), b''):
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+def _ingestion_result(document, storage_path):
+    return {
+        'document_id': document['id'],
+        'filename': document['filename'],
+        'city': document.get('city', 'unknown'),
+        'extracted_rules': len(document['rules']),
+        'text_length': document['text_length'],
+        'processed_at': document['processed_at'],
+        'processed': True,
+        'storage_path': storage_path,
+        'rules': document['rules']
+    }
+
+def _finish_ingestion(document, city):
+    """Runs in the web process once a sandboxed worker has processed a document"""
+    filename = document['filename']
+    
+    # Create city-specific folder
+    city_folder = os.path.join(ZONING_DOCS_FOLDER, city)
+    os.makedirs(city_folder, exist_ok=True)
+    
+    # Copy to permanent storage after successful processing
+    permanent_filepath = os.path.join(city_folder, filename)
+    shutil.copy2(document['filepath'], permanent_filepath)
+    document['storage_path'] = permanent_filepath
+    
+    # The record keeps the city detected from the text, if any
+    doc_processor.add_document(document)
+    
+    print(f"✅ Document saved to: {permanent_filepath}")
+    print(f"📊 Extracted {len(document['rules'])} rules for {document['city']}")
+    
+    return _ingestion_result(document, permanent_filepath)
+
+ingestion_queue = DocumentIngestionQueue(job_store, _finish_ingestion)
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, progress and result of a background job"""
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+def _publish_model(city, artifacts, version, training_result):
+    """Runs in the web process once a training process has written its artifact"""
+    artifacts.publish(version)
+    # Swap it in here right away; other workers follow on their next request
+    zoning_models.current(city)
+    print(f"✅ Published zoning model {version} for {city or 'all cities'} (accuracy {training_result['accuracy']:.2f})")
+    return {
+        'city': city,
+        'accuracy': training_result['accuracy'],
+        'model_version': training_result['version'],
+        'artifact_version': version,
+        'trained_at': training_result['trained_at'],
+        'training_samples': training_result['samples'],
+        'synthetic_samples': training_result['synthetic_samples']
+    }
+
+training_queue = ModelTrainingQueue(job_store, _publish_model)
+
+@app.route('/api/training-samples', methods=['POST'])
+def add_training_samples():
+    """
+    Store labelled parcels of a city for training. Each sample has a zone_type,
+    a far and either a polygon (with optional nearby_areas) or its features.
+    """
+    data = request.get_json(silent=True) or {}
+    samples = data.get('samples')
+    if not isinstance(samples, list) or not samples:
+        return jsonify({'error': 'A non-empty list of samples is required'}), 400
+    if len(samples) > MAX_TRAINING_SAMPLES:
+        return jsonify({'error': f'At most {MAX_TRAINING_SAMPLES} samples per request'}), 400
+    
+    city = str(data.get('city', 'bangalore')).lower()
+    try:
+        city_slug(city)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    model = zoning_models.current(city)
+    polygons = []
+    try:
+        for index, sample in enumerate(samples):
+            if not isinstance(sample, dict):
+                raise ValueError(f'Sample {index} is not an object')
+            if sample.get('zone_type') not in model.zone_types:
+                raise ValueError(f"Sample {index}: zone_type must be one of {', '.join(model.zone_types)}")
+            try:
+                float(sample.get('far'))
+            except (TypeError, ValueError):
+                raise ValueError(f'Sample {index}: far must be a number')
+            if not isinstance(sample.get('features'), dict):
+                try:
+                    valid_polygon = len(geometry.as_coords(sample.get('polygon'))) >= 3
+                except ValueError:
+                    valid_polygon = False
+                if not valid_polygon:
+                    raise ValueError(f'Sample {index}: needs features or a polygon of at least 3 coordinates')
+                polygons.append(sample['polygon'])
+        
+        # Parcels given as polygons are measured in one vectorized pass
+        shapes = iter(geometry.measure_polygons(polygons))
+        area_index = area_store.get(city)
+        features = [
+            sample['features'] if isinstance(sample.get('features'), dict) else
+            model.extract_features(sample['polygon'], sample.get('nearby_areas', []), shape=next(shapes), area_index=area_index)
+            for sample in samples
+        ]
+        added = training_store.append(
+            city,
+            training_store.feature_matrix(features),
+            [sample['zone_type'] for sample in samples],
+            [float(sample['far']) for sample in samples]
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    print(f"📚 Stored {added} training samples for {city}")
+    return jsonify({
+        'success': True,
+        'city': city,
+        'added': added,
+        'total_samples': training_store.count(city)
+    })
 
 @app.route('/api/train-model', methods=['POST'])
 def train_model():
-    """Train the ML model on uploaded documents"""
+    """
+    Train a new model in the background: a city's own model when a city is
+    given, otherwise the global one. The serving model is swapped when it is ready.
+    """
+    city = str((request.get_json(silent=True) or {}).get('city') or '').lower() or None
     try:
-        training_result = ml_model.train()
-        return jsonify({
-            'success': True,
-            'accuracy': training_result['accuracy'],
-            'model_version': training_result['version'],
-            'training_samples': training_result['samples']
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        artifacts = zoning_models.artifacts_for(city)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if city:
+        # A city's model is only worth publishing when trained on its own samples
+        samples = training_store.count(city)
+        if samples < ZoningMLModel.MIN_TRAINING_SAMPLES:
+            return jsonify({
+                'error': f'{city} has {samples} training samples; store at least '
+                         f'{ZoningMLModel.MIN_TRAINING_SAMPLES} with POST /api/training-samples first'
+            }), 400
+    job_id = training_queue.submit(training_store, artifacts, city)
+    print(f"🧠 Queued model training for {city or 'all cities'} (job {job_id})")
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': f"/api/jobs/{job_id}"
+    }), 202
 
 @app.route('/api/predict-zoning', methods=['POST'])
 def predict_zoning():
@@ -121,6 +307,15 @@ def predict_zoning():
     if not data or 'polygon' not in data:
         return jsonify({'error': 'Polygon coordinates required'}), 400
     
+    try:
+        road_width = float(data['road_width']) if data.get('road_width') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'road_width must be a number (meters)'}), 400
+    try:
+        plot_area = float(data['plot_area']) if data.get('plot_area') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'plot_area must be a number (sqm)'}), 400
+    
     try:
         polygon = data['polygon']
         nearby_areas = data.get('nearby_areas', [])
@@ -136,145 +331,562 @@ def predict_zoning():
         
         print(f"🔍 Predicting zoning for {city}")
         
-        # Extract features from polygon
-        features = ml_model.extract_features(polygon, nearby_areas)
+        # Extract features from polygon; known areas of the city replace nearby_areas
+        model = zoning_models.current(city)
+        features = model.extract_features(polygon, nearby_areas, area_index=area_store.get(city))
         
-        # Predict zoning attributes
-        predictions = ml_model.predict(features)
+        # Regulation tables of the city's documents answer first; the model is the fallback
+        predictions = model.predict(
+            features,
+            rule_table=rule_tables.get(city),
+            road_width=road_width,
+            plot_area=plot_area,
+            zone_type=data.get('zone_type')
+        )
         
         return jsonify({
             'success': True,
             'zoning_attributes': predictions['attributes'],
             'confidence': predictions['confidence'],
-            'model_version': predictions['model_version']
+            'model_version': predictions['model_version'],
+            'source': predictions['source'],
+            'regulations': predictions.get('regulations', [])
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _report_cache_keys(model, polygon, city, nearby_areas, current_aqi, area_index=None):
+    """
+    Cache key per report section. Every key covers the normalized polygon and the
+    city; model sections add the identity of their model and the inputs they use.
+    """
+    # Zoning features come from the city's known areas when there are any
+    neighbourhood = {'areas': area_index.version} if area_index else {'nearby_areas': nearby_areas}
+    keys = {
+        'amenities': report_cache.make_key(polygon, city, {}),
+        'roadCondition': report_cache.make_key(polygon, city, {}),
+        'floodRisk': report_cache.make_key(polygon, city, {'flood': flood_predictor.model_identity()}),
+        'zoning': report_cache.make_key(
+            polygon, city, {'zoning': model.model_identity()}, neighbourhood
+        )
+    }
+    # Until an AQI model is published its forecasts aren't cached; training it is left to the deadline-bound stage
+    aqi_identity = aqi_predictor.model_identity()
+    if aqi_identity is not None:
+        keys['aqiForecast'] = report_cache.make_key(polygon, city, {'aqi': aqi_identity}, {'current_aqi': current_aqi})
+    return keys
+
+def _begin_report(data, city):
+    """
+    Shared start of /api/generate-report and its streaming variant: look up
+    cached sections, launch the remaining slow stages and run the local
+    zoning prediction while they are in flight
+    """
+    polygon = data['polygon']
+    nearby_areas = data.get('nearby_areas', [])
+    model = zoning_models.current(city)
+    
+    # Parcel geometry is measured once here and reused by every section
+    area_index = area_store.get(city)
+    features = model.extract_features(polygon, nearby_areas, area_index=area_index)
+    centroid_lng, centroid_lat = features['centroid_lng'], features['centroid_lat']
+    
+    # For demo, we use a default current AQI if not provided
+    current_aqi = data.get('current_aqi', 100)
+    
+    # Sections already computed for this parcel and these models are reused
+    cache_keys = _report_cache_keys(model, polygon, city, nearby_areas, current_aqi, area_index)
+    cached = report_cache.get_sections(cache_keys)
+    for name in cached:
+        metrics.record_stage_outcome(name, 'cached')
+    
+    # Slow, independent stages run concurrently, each with its own deadline
+    stages = [
+        ReportStage(
+            'amenities',
+            lambda: amenities_finder.find_amenities(centroid_lat, centroid_lng),
+            timeout=REPORT_STAGE_TIMEOUTS['amenities'],
+            fallback=amenities_finder._get_mock_amenities
+        ),
+        ReportStage(
+            'aqiForecast',
+            lambda: aqi_predictor.predict_future(current_aqi),
+            timeout=REPORT_STAGE_TIMEOUTS['aqiForecast']
+        ),
+        ReportStage(
+            'roadCondition',
+            lambda: amenities_finder.get_road_condition(centroid_lat, centroid_lng),
+            timeout=REPORT_STAGE_TIMEOUTS['roadCondition'],
+            fallback=lambda: 'Unknown'
+        ),
+        ReportStage(
+            'floodRisk',
+            lambda: flood_predictor.predict_city_risk(city, lat=centroid_lat, lng=centroid_lng),
+            timeout=REPORT_STAGE_TIMEOUTS['floodRisk']
+        )
+    ]
+    stage_run = report_orchestrator.start([stage for stage in stages if stage.name not in cached])
+    
+    # Lightning risk needs the building type from the zoning prediction,
+    # which is local compute and runs while the stages are in flight
+    zoning_prediction = cached.get('zoning') or model.predict(features)
+    if 'zoning' not in cached:
+        report_cache.set_sections(cache_keys, {'zoning': zoning_prediction})
+    
+    return {
+        # Every stage of the request uses this instance, even if a new version is swapped in meanwhile
+        'model': model,
+        'polygon': polygon,
+        'nearby_areas': nearby_areas,
+        'centroid': [centroid_lng, centroid_lat],
+        'area': model.resolve_area(polygon, data.get('area', None), features),
+        'cache_keys': cache_keys,
+        'cached': cached,
+        'stage_run': stage_run,
+        'features': features,
+        'zoning_prediction': zoning_prediction,
+        'lightning_risk': aqi_predictor.get_lightning_risk(city, zoning_prediction['attributes']['zoneType'])
+    }
+
+def _flood_section(model, flood_result):
+    """floodRisk report block from a flood stage result (None falls back to model's default block)"""
+    if not flood_result:
+        return model.default_flood_risk()
+    print(f"✅ Flood risk: {flood_result['current'].get('riskLevel', 'Unknown')} (Score: {flood_result['current']['riskScore']})")
+    return {'current': flood_result['current'], 'future': flood_result['future']}
+
+def _stage_status(cached, stage_results):
+    status = {name: {'status': 'cached', 'elapsedMs': 0.0} for name in cached}
+    status.update({
+        name: {'status': result.status, 'elapsedMs': round(result.elapsed * 1000, 1)}
+        for name, result in stage_results.items()
+    })
+    return status
+
+def _check_report_request(data):
+    """Validation shared by the report endpoints; returns an error response or None"""
+    if not data or 'polygon' not in data:
+        return jsonify({'error': 'Polygon coordinates required'}), 400
+    
+    city = data.get('city', 'bangalore').lower()
+    
+    # Check if zoning documents exist for this city
+    docs = doc_processor.get_documents(city=city)
+    if not docs:
+        return jsonify({
+            'error': f'No zoning regulations found for {city}. Please upload documents first.',
+            'code': 'NO_ZONING_DOCS'
+        }), 400
+    return None
+
 @app.route('/api/generate-report', methods=['POST'])
 def generate_report():
     """Generate comprehensive ML-powered report"""
     data = request.json
     
-    if not data or 'polygon' not in data:
-        return jsonify({'error': 'Polygon coordinates required'}), 400
+    error = _check_report_request(data)
+    if error:
+        return error
     
     try:
-        polygon = data['polygon']
-        nearby_areas = data.get('nearby_areas', [])
         city = data.get('city', 'bangalore').lower()
+        ctx = _begin_report(data, city)
         
-        # Check if zoning documents exist for this city
-        docs = doc_processor.get_documents(city=city)
-        if not docs:
-            return jsonify({
-                'error': f'No zoning regulations found for {city}. Please upload documents first.',
-                'code': 'NO_ZONING_DOCS'
-            }), 400
-        
-        # Calculate centroid for amenities search
-        centroid_lng = sum(p[0] for p in polygon) / len(polygon)
-        centroid_lat = sum(p[1] for p in polygon) / len(polygon)
-        
-        # Fetch real amenities
-        amenities = amenities_finder.find_amenities(centroid_lat, centroid_lng)
+        stage_results = ctx['stage_run'].results()
         
-        # Predict AQI
-        # For demo, we use a random current AQI if not provided
-        current_aqi = data.get('current_aqi', 100)
-        aqi_forecast = aqi_predictor.predict_future(current_aqi)
-        
-        # Get Lightning Risk
-        # We need to know the building type, which comes from zoning prediction
-        # So we first predict zoning to get the type
-        features = ml_model.extract_features(polygon, nearby_areas)
-        zoning_prediction = ml_model.predict(features)
-        building_type = zoning_prediction['attributes']['zoneType']
-        
-        lightning_risk = aqi_predictor.get_lightning_risk(city, building_type)
+        # Only real results are cached, never timeouts or fallbacks
+        report_cache.set_sections(ctx['cache_keys'], {
+            name: result.value for name, result in stage_results.items() if result.status == 'ok'
+        })
         
-        # Get Road Condition
-        road_condition = amenities_finder.get_road_condition(centroid_lat, centroid_lng)
+        sections = dict(ctx['cached'])
+        sections.update({name: result.value for name, result in stage_results.items()})
         
-        # Get area from frontend (already calculated with turf.js)
-        area_sqm = data.get('area', None)
+        # Generate full report using ML predictions and real data
+        report = ctx['model'].generate_comprehensive_report(
+            ctx['polygon'], 
+            ctx['nearby_areas'], 
+            amenities=sections['amenities'],
+            aqi_forecast=sections['aqiForecast'],
+            lightning_risk=ctx['lightning_risk'],
+            road_condition=sections['roadCondition'],
+            area=ctx['area'],
+            flood_risk=_flood_section(ctx['model'], sections['floodRisk']),
+            features=ctx['features'],
+            predictions=ctx['zoning_prediction']
+        )
         
-        # Predict Flood Risk using city-specific data
-        print("🌊 Predicting flood risk...")
-        try:
-            import random
-
-            from city_climate_data import (get_city_climate,
-                                           get_season_adjustment)
+        return jsonify({
+            'success': True,
+            'report': report,
+            'stages': _stage_status(ctx['cached'], stage_results)
+        })
+    except Exception as e:
+        print(f"Error generating report: {e}")
+        return jsonify({'error': str(e)}), 500
 
-            # Get historical climate data for the city
-            city_climate = get_city_climate(city)
-            season_multiplier = get_season_adjustment()
+@app.route('/api/generate-report/stream', methods=['POST'])
+def generate_report_stream():
+    """
+    Streaming variant of /api/generate-report. Local sections are sent first,
+    then each slow section as soon as its stage finishes. Frames are NDJSON by
+    default, or server-sent events with ?format=sse / Accept: text/event-stream.
+    """
+    data = request.json
+    
+    error = _check_report_request(data)
+    if error:
+        return error
+    
+    use_sse = request.args.get('format') == 'sse' or 'text/event-stream' in request.headers.get('Accept', '')
+    
+    def frame(event, payload):
+        body = json.dumps(dict(payload, event=event), default=json_default)
+        if use_sse:
+            return f"event: {event}\ndata: {body}\n\n"
+        return body + "\n"
+    
+    def section_frames(name, value, ctx):
+        if name == 'floodRisk':
+            yield frame('section', {'section': name, 'data': _flood_section(ctx['model'], value)})
+        elif name == 'amenities':
+            amenity_sections = ctx['model'].report_amenity_sections(
+                ctx['zoning_prediction']['attributes'], ctx['area'], value, ctx['centroid']
+            )
+            for section in ('amenities', 'buildability', 'recommendations'):
+                yield frame('section', {'section': section, 'data': amenity_sections[section]})
+        else:
+            yield frame('section', {'section': name, 'data': value})
+    
+    def generate():
+        try:
+            city = data.get('city', 'bangalore').lower()
+            ctx = _begin_report(data, city)
             
-            print(f"   Using historical data for {city_climate['name']}")
-            print(f"   Avg annual rainfall: {city_climate['avg_annual_rainfall']}mm")
-            print(f"   Elevation: {city_climate['avg_elevation']}m")
-            print(f"   Risk multiplier: {city_climate['risk_multiplier']}")
+            # Pure local compute goes out first
+            with metrics.timed('report_assembly'):
+                local = ctx['model'].report_local_sections(
+                    ctx['polygon'], ctx['features'], ctx['zoning_prediction'], ctx['area']
+                )
+            for name in ('parcelInfo', 'zoningDetails', 'scenarios', 'pricing', 'mlConfidence', 'generatedAt'):
+                yield frame('section', {'section': name, 'data': local[name]})
+            yield frame('section', {'section': 'lightningRisk', 'data': ctx['lightning_risk']})
             
-            # Use city-specific data with some variation
-            weather_data = {
-                "rainfall": city_climate['monsoon_rainfall'] * season_multiplier * random.uniform(0.8, 1.2),
-                "temperature": city_climate['avg_temperature'] + random.uniform(-3, 3),
-                "humidity": city_climate['avg_humidity'] + random.uniform(-10, 10),
-                "pressure": city_climate['avg_pressure'] + random.uniform(-5, 5),
-                "elevation": city_climate['avg_elevation']
-            }
-
-            # Pass centroid coordinates for location-specific prediction
-            flood_risk = flood_predictor.predict_flood(weather_data, lat=centroid_lat, lng=centroid_lng)
+            for name in ('amenities', 'aqiForecast', 'roadCondition', 'floodRisk'):
+                if name in ctx['cached']:
+                    yield from section_frames(name, ctx['cached'][name], ctx)
             
-            # Apply city-specific risk multiplier
-            original_score = flood_risk['riskScore']
-            adjusted_score = min(100, original_score * city_climate['risk_multiplier'])
-            flood_risk['riskScore'] = round(adjusted_score, 2)
-            flood_risk['riskLevel'] = flood_predictor._get_risk_level(adjusted_score)
-            flood_risk['description'] = f"{city_climate['name']}: {flood_predictor._get_risk_description(adjusted_score)}"
+            # Then every slow stage as soon as it finishes or expires
+            stage_results = {}
+            for result in ctx['stage_run'].iter_completed():
+                stage_results[result.name] = result
+                if result.status == 'ok':
+                    report_cache.set_sections(ctx['cache_keys'], {result.name: result.value})
+                yield from section_frames(result.name, result.value, ctx)
             
-            # Pass coordinates for future predictions too and include city risk multiplier
-            future_flood_risk = flood_predictor.predict_future_risk(
-                weather_data,
-                lat=centroid_lat,
-                lng=centroid_lng,
-                city_multiplier=city_climate.get('risk_multiplier', 1.0)
+            yield frame('complete', {'stages': _stage_status(ctx['cached'], stage_results)})
+        except Exception as e:
+            print(f"Error streaming report: {e}")
+            yield frame('error', {'error': str(e)})
+    
+    mimetype = 'text/event-stream' if use_sse else 'application/x-ndjson'
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/generate-reports', methods=['POST'])
+def generate_reports():
+    """Generate reports for many parcels of one city in a single request"""
+    data = request.json
+    
+    if not data or not isinstance(data.get('parcels'), list) or not data['parcels']:
+        return jsonify({'error': 'A non-empty list of parcels is required'}), 400
+    
+    parcels = data['parcels']
+    if len(parcels) > MAX_BATCH_PARCELS:
+        return jsonify({'error': f'At most {MAX_BATCH_PARCELS} parcels per request'}), 400
+    
+    city = data.get('city', 'bangalore').lower()
+    
+    # Check if zoning documents exist for this city
+    docs = doc_processor.get_documents(city=city)
+    if not docs:
+        return jsonify({
+            'error': f'No zoning regulations found for {city}. Please upload documents first.',
+            'code': 'NO_ZONING_DOCS'
+        }), 400
+    
+    # Network lookups cost about a dozen HTTP calls per parcel, so they are opt-in
+    include_amenities = bool(data.get('include_amenities', False))
+    
+    results = [None] * len(parcels)
+    items = []
+    
+    # Per-parcel validation; bad parcels become per-item errors
+    for index, parcel in enumerate(parcels):
+        parcel_id = parcel.get('id') if isinstance(parcel, dict) else None
+        try:
+            polygon = parcel['polygon']
+            if len(geometry.as_coords(polygon)) < 3:
+                raise ValueError('Polygon needs at least 3 coordinates')
+            items.append({
+                'index': index,
+                'id': parcel_id,
+                'polygon': polygon,
+                'nearby_areas': parcel.get('nearby_areas', []),
+                'area': parcel.get('area'),
+                'current_aqi': parcel.get('current_aqi', 100)
+            })
+        except Exception as e:
+            results[index] = {'index': index, 'id': parcel_id, 'success': False, 'error': str(e)}
+    
+    # The geometry of all valid parcels is measured in one vectorized pass
+    shapes = geometry.measure_polygons([item['polygon'] for item in items])
+    area_index = area_store.get(city)
+    model = zoning_models.current(city)
+    valid = []
+    for item, shape in zip(items, shapes):
+        try:
+            item['features'] = model.extract_features(
+                item['polygon'], item['nearby_areas'], shape=shape, area_index=area_index
             )
-            print(f"✅ Flood risk: {flood_risk.get('riskLevel', 'Unknown')} (Score: {flood_risk['riskScore']})")
+            item['lng'], item['lat'] = shape['centroid_lng'], shape['centroid_lat']
+            valid.append(item)
         except Exception as e:
-            print(f"⚠️ Error predicting flood risk: {e}")
-            flood_risk = {'riskScore': 15, 'riskLevel': 'Low', 'description': 'Minimal risk', 'depthInches': 0.5}
-            future_flood_risk = [
-                {'year': '+5 Years', 'riskScore': 18, 'riskLevel': 'Low', 'depthInches': 0.8},
-                {'year': '+10 Years', 'riskScore': 25, 'riskLevel': 'Moderate', 'depthInches': 2.5}
-            ]
+            results[item['index']] = {'index': item['index'], 'id': item['id'], 'success': False, 'error': str(e)}
+    items = valid
+    
+    if items:
+        network_run = None
+        if include_amenities:
+            stages = []
+            for item in items:
+                stages.append(ReportStage(
+                    f"amenities:{item['index']}",
+                    lambda item=item: amenities_finder.find_amenities(item['lat'], item['lng']),
+                    timeout=REPORT_STAGE_TIMEOUTS['amenities'],
+                    fallback=amenities_finder._get_mock_amenities
+                ))
+                stages.append(ReportStage(
+                    f"roadCondition:{item['index']}",
+                    lambda item=item: amenities_finder.get_road_condition(item['lat'], item['lng']),
+                    timeout=REPORT_STAGE_TIMEOUTS['roadCondition'],
+                    fallback=lambda: 'Unknown'
+                ))
+            network_run = report_orchestrator.start(stages, max_concurrency=REPORT_BATCH_CONCURRENCY)
         
-        # Generate full report using ML predictions and real data
-        report = ml_model.generate_comprehensive_report(
-            polygon, 
-            nearby_areas, 
-            amenities=amenities,
-            aqi_forecast=aqi_forecast,
-            lightning_risk=lightning_risk,
-            road_condition=road_condition,
-            area=area_sqm,
-            flood_risk={
-                'current': flood_risk,
-                'future': future_flood_risk
-            }
-        )
+        # One model pass per batch for zoning, flood and AQI
+        predictions = model.predict_batch([item['features'] for item in items])
+        
+        batch_status = {'floodRisk': 'ok', 'aqiForecast': 'ok'}
+        try:
+            flood_results = flood_predictor.predict_city_risk_batch(
+                city, [(item['lat'], item['lng']) for item in items]
+            )
+        except Exception as e:
+            print(f"⚠️ Batch flood prediction failed, using defaults: {e}")
+            flood_results = [None] * len(items)
+            batch_status['floodRisk'] = 'error'
         
-        # Debug: Log flood data
-        print(f"🌊 Flood data in report: {report.get('floodRisk', 'NOT FOUND')}")
+        try:
+            aqi_forecasts = aqi_predictor.predict_future_batch([item['current_aqi'] for item in items])
+        except Exception as e:
+            print(f"⚠️ Batch AQI forecast failed: {e}")
+            aqi_forecasts = [None] * len(items)
+            batch_status['aqiForecast'] = 'error'
         
-        return jsonify({
-            'success': True,
-            'report': report
-        })
+        network_results = network_run.results() if network_run else {}
+        
+        for item, prediction, flood_result, aqi_forecast in zip(items, predictions, flood_results, aqi_forecasts):
+            index = item['index']
+            try:
+                amenities = network_results.get(f'amenities:{index}')
+                road_condition = network_results.get(f'roadCondition:{index}')
+                # Which sections are real and which are fallbacks (timeouts, errors)
+                stages = {name: {'status': status} for name, status in batch_status.items()}
+                for name, result in (('amenities', amenities), ('roadCondition', road_condition)):
+                    if result:
+                        stages[name] = {'status': result.status, 'elapsedMs': round(result.elapsed * 1000, 1)}
+                report = model.generate_comprehensive_report(
+                    item['polygon'],
+                    item['nearby_areas'],
+                    amenities=amenities.value if amenities else None,
+                    aqi_forecast=aqi_forecast,
+                    lightning_risk=aqi_predictor.get_lightning_risk(city, prediction['attributes']['zoneType']),
+                    road_condition=road_condition.value if road_condition else None,
+                    area=item['area'],
+                    flood_risk={'current': flood_result['current'], 'future': flood_result['future']} if flood_result else None,
+                    features=item['features'],
+                    predictions=prediction
+                )
+                results[index] = {
+                    'index': index,
+                    'id': item['id'],
+                    'success': True,
+                    'report': report,
+                    'stages': stages,
+                    'degraded': any(stage['status'] != 'ok' for stage in stages.values())
+                }
+            except Exception as e:
+                results[index] = {'index': index, 'id': item['id'], 'success': False, 'error': str(e)}
+    
+    return jsonify({
+        'success': True,
+        'city': city,
+        'count': len(results),
+        'failed': sum(1 for result in results if not result['success']),
+        'results': results
+    })
+
+def _scenario_axis(data, name, default):
+    values = data.get(name, default)
+    try:
+        values = [float(value) for value in values]
+    except (TypeError, ValueError):
+        values = []
+    if not values or min(values) < 0:
+        raise ValueError(f'{name} must be a non-empty list of non-negative numbers')
+    return values
+
+@app.route('/api/scenarios/sweep', methods=['POST'])
+def sweep_scenarios():
+    """
+    Development scenarios for many parcels of one city over a grid of FAR
+    utilisation x ground coverage x construction cost, in one NumPy broadcast
+    """
+    data = request.get_json(silent=True) or {}
+    
+    parcels = data.get('parcels')
+    if not isinstance(parcels, list) or not parcels:
+        return jsonify({'error': 'A non-empty list of parcels is required'}), 400
+    if len(parcels) > MAX_BATCH_PARCELS:
+        return jsonify({'error': f'At most {MAX_BATCH_PARCELS} parcels per request'}), 400
+    
+    try:
+        far_utilisation = _scenario_axis(data, 'far_utilisation', [p['far_utilisation'] for p in scenarios.PRESETS])
+        coverage = _scenario_axis(data, 'coverage', [p['coverage'] for p in scenarios.PRESETS])
+        cost_per_sqm = _scenario_axis(data, 'cost_per_sqm', [scenarios.DEFAULT_COST_PER_SQM])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if len(far_utilisation) * len(coverage) * len(cost_per_sqm) > MAX_SCENARIOS:
+        return jsonify({'error': f'At most {MAX_SCENARIOS} scenarios per request'}), 400
+    
+    city = data.get('city', 'bangalore').lower()
+    model = zoning_models.current(city)
+    results = [None] * len(parcels)
+    items = []
+    
+    # Per-parcel validation; bad parcels become per-item errors. Limits not given
+    # come from the parcel's zone type, or else from a zoning prediction
+    for index, parcel in enumerate(parcels):
+        parcel_id = parcel.get('id') if isinstance(parcel, dict) else None
+        try:
+            polygon = parcel.get('polygon')
+            if polygon is not None and len(geometry.as_coords(polygon)) < 3:
+                raise ValueError('Polygon needs at least 3 coordinates')
+            area = float(parcel['area']) if parcel.get('area') else None
+            far_max, coverage_max = parcel.get('far_max'), parcel.get('coverage_max')
+            zone_type = parcel.get('zone_type')
+            if zone_type is not None and zone_type not in model.zone_types:
+                raise ValueError(f"zone_type must be one of {', '.join(model.zone_types)}")
+            if polygon is None and (area is None or (zone_type is None and (far_max is None or coverage_max is None))):
+                raise ValueError('Parcel needs a polygon, or an area (sqm) with a zone_type or far_max and coverage_max')
+            items.append({
+                'index': index,
+                'id': parcel_id,
+                'polygon': polygon,
+                'nearby_areas': parcel.get('nearby_areas', []),
+                'area': area,
+                'zone_type': zone_type,
+                'far_max': float(far_max) if far_max is not None else None,
+                'coverage_max': float(coverage_max) if coverage_max is not None else None
+            })
+        except Exception as e:
+            results[index] = {'index': index, 'id': parcel_id, 'success': False, 'error': str(e)}
+    
+    # Parcels with polygons are measured in one vectorized pass, and those
+    # whose limits must be predicted go through the model in one batch
+    measured = [item for item in items if item['polygon'] is not None]
+    for item, shape in zip(measured, geometry.measure_polygons([item['polygon'] for item in measured])):
+        item['shape'] = shape
+        item['area'] = item['area'] or shape['area']
+    unresolved = [
+        item for item in items
+        if item['zone_type'] is None and (item['far_max'] is None or item['coverage_max'] is None)
+    ]
+    if unresolved:
+        area_index = area_store.get(city)
+        predictions = model.predict_batch([
+            model.extract_features(item['polygon'], item['nearby_areas'], shape=item['shape'], area_index=area_index)
+            for item in unresolved
+        ])
+        for item, prediction in zip(unresolved, predictions):
+            item['zone_type'] = str(prediction['attributes']['zoneType'])
+    for item in items:
+        limits = model.zone_limits(item['zone_type']) if item['zone_type'] else None
+        if item['far_max'] is None:
+            item['far_max'] = limits['far'][1]
+        if item['coverage_max'] is None:
+            item['coverage_max'] = limits['groundCoverage'][1]
+    
+    if items:
+        grid = scenarios.sweep(
+            [item['area'] for item in items],
+            [item['far_max'] for item in items],
+            [item['coverage_max'] for item in items],
+            far_utilisation, coverage, cost_per_sqm
+        )
+        columns = scenarios.report_columns(grid)
+        for row, item in enumerate(items):
+            results[item['index']] = dict(
+                {
+                    'index': item['index'],
+                    'id': item['id'],
+                    'success': True,
+                    'zone_type': item['zone_type'],
+                    'area': item['area'],
+                    'far_max': item['far_max'],
+                    'coverage_max': item['coverage_max']
+                },
+                **{name: values[row] for name, values in columns.items()}
+            )
+    
+    return jsonify({
+        'success': True,
+        'city': city,
+        # Column j of every parcel's far, floors, builtArea, openSpace and estimatedCost
+        'scenarios': [
+            {'far_utilisation': u, 'coverage': c, 'cost_per_sqm': k}
+            for u in far_utilisation for c in coverage for k in cost_per_sqm
+        ],
+        'count': len(results),
+        'failed': sum(1 for result in results if not result['success']),
+        'results': results
+    })
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics: stage latency histograms, request counters and in-flight gauges"""
+    exported = metrics.export()
+    if exported is None:
+        return jsonify({'error': 'prometheus_client is not installed'}), 501
+    body, content_type = exported
+    return Response(body, content_type=content_type)
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Report cache hit/miss counters, shared by all workers"""
+    return jsonify({'success': True, 'cache': report_cache.stats()})
+
+@app.route('/api/cache', methods=['DELETE'])
+def clear_cache():
+    """Drop every cached report section"""
+    try:
+        report_cache.clear()
+        return jsonify({'success': True})
     except Exception as e:
-        print(f"Error generating report: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/documents', methods=['GET'])
@@ -283,6 +895,7 @@ def get_documents():
     city = request.args.get('city', None)
     # Get processed document metadata (if any)
     documents = doc_processor.get_documents(city=city)
+    known_filenames = {doc['filename'] for doc in documents}
 
     # Also include any raw files that exist under zoning-documents/<city> but have no metadata
     try:
@@ -303,7 +916,7 @@ def get_documents():
                     continue
 
                 # if this file already has metadata (match by filename), skip
-                if any(doc.get('filename') == fname for doc in documents):
+                if fname in known_filenames:
                     continue
 
                 # Otherwise add a lightweight metadata entry so frontend can display it
@@ -322,7 +935,7 @@ def get_documents():
         print(f"⚠️ Error while scanning zoning-documents: {e}")
 
     # Get unique cities from both processed metadata and folder names
-    cities = list(set(doc.get('city', 'unknown') for doc in doc_processor.documents))
+    cities = list(doc_processor.get_cities())
     try:
         # add any cities from zoning-documents folders
         zoning_cities = []
@@ -345,16 +958,8 @@ def get_documents():
 @app.route('/api/cities', methods=['GET'])
 def get_cities():
     """Get list of cities with uploaded documents"""
-    cities = list(doc_processor.documents_by_city.keys())
-    city_stats = {}
-    
-    for city in cities:
-        docs = doc_processor.documents_by_city[city]
-        total_rules = sum(len(doc['rules']) for doc in docs)
-        city_stats[city] = {
-            'documents': len(docs),
-            'total_rules': total_rules
-        }
+    city_stats = doc_processor.get_cities()
+    cities = list(city_stats)
     
     return jsonify({
         'success': True,
@@ -362,6 +967,56 @@ def get_cities():
         'statistics': city_stats
     })
 
+@app.route('/api/areas/<city>', methods=['PUT'])
+def put_areas(city):
+    """Replace the known areas (zones, parcels) of a city used for neighbourhood features"""
+    try:
+        areas = load_areas(request.json)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    area_store.put(city.lower(), areas)
+    return jsonify({'success': True, 'city': city.lower(), 'count': len(areas)})
+
+@app.route('/api/areas/<city>/nearby', methods=['GET'])
+def get_nearby_areas(city):
+    """Known areas closest to a point: the k nearest, or all within radius_km"""
+    lng = request.args.get('lng', type=float)
+    lat = request.args.get('lat', type=float)
+    if lng is None or lat is None:
+        return jsonify({'error': 'Query parameters lng and lat are required'}), 400
+    
+    area_index = area_store.get(city.lower())
+    if area_index is None:
+        return jsonify({'error': f'No known areas for {city}', 'code': 'NO_AREAS'}), 404
+    
+    radius_km = request.args.get('radius_km', type=float)
+    if radius_km is not None:
+        areas = area_index.within(lng, lat, radius_km)
+    else:
+        areas = area_index.nearest(lng, lat, min(max(request.args.get('k', 5, type=int), 1), 100))
+    
+    return jsonify({'success': True, 'city': city.lower(), 'areas': areas})
+
+@app.route('/api/search', methods=['GET'])
+def search_documents():
+    """Ranked bylaw sentences matching a free-text query, optionally within one city"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query parameter q is required'}), 400
+    city = request.args.get('city') or None
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+
+    with metrics.timed('search'):
+        results = doc_processor.search(query, city=city, limit=limit)
+
+    return jsonify({
+        'success': True,
+        'query': query,
+        'city': city,
+        'results': results
+    })
+
 @app.route('/api/documents/<doc_id>', methods=['DELETE'])
 def delete_document(doc_id):
     """Delete a document"""
@@ -404,45 +1059,16 @@ def predict_flood():
         return jsonify({'error': 'Request data required'}), 400
     
     try:
-        import random
-
-        from city_climate_data import get_city_climate, get_season_adjustment
-
         # Get city and coordinates
         city = data.get('city', 'bangalore').lower()
         lat = data.get('lat')
         lng = data.get('lng')
         
-        # Get city-specific climate data
-        city_climate = get_city_climate(city)
-        season_multiplier = get_season_adjustment()
-        
-        # Build weather data with city-specific values
-        weather_data = {
-            "rainfall": city_climate['monsoon_rainfall'] * season_multiplier * random.uniform(0.8, 1.2),
-            "temperature": city_climate['avg_temperature'] + random.uniform(-3, 3),
-            "humidity": city_climate['avg_humidity'] + random.uniform(-10, 10),
-            "pressure": city_climate['avg_pressure'] + random.uniform(-5, 5),
-            "elevation": city_climate['avg_elevation']
-        }
-        
-        # Predict flood risk with location
-        flood_risk = flood_predictor.predict_flood(weather_data, lat=lat, lng=lng)
-        
-        # Apply city-specific risk multiplier
-        original_score = flood_risk['riskScore']
-        adjusted_score = min(100, original_score * city_climate['risk_multiplier'])
-        flood_risk['riskScore'] = round(adjusted_score, 2)
-        flood_risk['riskLevel'] = flood_predictor._get_risk_level(adjusted_score)
-        flood_risk['description'] = f"{city_climate['name']}: {flood_predictor._get_risk_description(adjusted_score)}"
-        
-        # Get future predictions (include city multiplier so depths vary by city)
-        future_flood_risk = flood_predictor.predict_future_risk(
-            weather_data,
-            lat=lat,
-            lng=lng,
-            city_multiplier=city_climate.get('risk_multiplier', 1.0)
-        )
+        # Predict current and future flood risk with city-specific climate data
+        city_flood = flood_predictor.predict_city_risk(city, lat=lat, lng=lng)
+        flood_risk = city_flood['current']
+        future_flood_risk = city_flood['future']
+        city_climate = city_flood['city_climate']
         
         return jsonify({
             'success': True,
@@ -501,8 +1127,7 @@ if __name__ == '__main__':
     print("📊 Loading pre-trained models...")
 
     # Load any existing trained models
-    if os.path.exists('models/zoning_model.pkl'):
-        ml_model.load_model('models/zoning_model.pkl')
+    if zoning_models.current().is_trained():
         print("✅ Loaded existing trained model")
     else:
         print("⚠️  No pre-trained model found. Upload documents to train.")
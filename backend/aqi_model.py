@@ -1,24 +1,36 @@
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense
 from datetime import datetime, timedelta
 import random
+import threading
+
+import mmap_artifacts
+from lstm_runtime import LSTMRegressor
+from metrics import timed
+from model_registry import ModelArtifacts
 
 class AQIPredictor:
     def __init__(self):
-        self.model = None
+        self.model = None  # LSTMRegressor over the trained weights; TensorFlow is only used to train
         self.is_trained = False
         self.sequence_length = 10  # Days of history to look at
+        self.model_version = 'lstm-50-v1'
+        # Exported weights as versioned array artifacts in MODEL_DIR (aqi_model-<version>/)
+        self.artifacts = ModelArtifacts('aqi_model')
+        self.version = None
+        # Report stages run on a thread pool; only one of them may load or train the model
+        self._train_lock = threading.Lock()
 
     def build_model(self):
-        """Build LSTM model"""
+        """Build the Keras LSTM model for training"""
+        from tensorflow.keras.layers import LSTM, Dense, Input
+        from tensorflow.keras.models import Sequential
+
         model = Sequential([
-            LSTM(50, activation='relu', input_shape=(self.sequence_length, 1)),
+            Input(shape=(self.sequence_length, 1)),
+            LSTM(50, activation='relu'),
             Dense(1)
         ])
         model.compile(optimizer='adam', loss='mse')
-        self.model = model
         return model
 
     def train_mock_model(self):
@@ -40,41 +52,110 @@ class AQIPredictor:
         X = np.array(X)
         y = np.array(y)
         
-        if self.model is None:
-            self.build_model()
-            
-        self.model.fit(X, y, epochs=5, verbose=0)
+        keras_model = self.build_model()
+        keras_model.fit(X, y, epochs=5, verbose=0)
+        
+        # Forecasts run on the exported weights, so serving workers never import TensorFlow
+        self.model = LSTMRegressor.from_keras(keras_model)
+        # Workers training at once each write their own version; the last one published is loaded from then on
+        self.version = self.artifacts.new_version()
+        mmap_artifacts.write(
+            self.artifacts.path_for(self.version),
+            self.model.to_arrays(),
+            metadata={
+                'model_version': self.model_version,
+                'sequence_length': self.sequence_length,
+                'activation': self.model.activation_name,
+                'recurrent_activation': self.model.recurrent_activation_name
+            },
+            version=self.version
+        )
+        self.artifacts.publish(self.version)
         self.is_trained = True
-        print("✅ AQI Model Trained")
+        print(f"✅ AQI Model Trained ({self.version})")
+
+    def load_model(self):
+        """Load the exported LSTM weights; if there are none for this architecture, train a mock model"""
+        current = self.artifacts.current()
+        path = current and current[1]
+        try:
+            if path and mmap_artifacts.is_artifact(path):
+                arrays, manifest = mmap_artifacts.read(path)
+                metadata = manifest['metadata']
+                if (metadata.get('model_version'), metadata.get('sequence_length')) == (self.model_version, self.sequence_length):
+                    self.model = LSTMRegressor(arrays, metadata['activation'], metadata['recurrent_activation'])
+                    self.version = manifest['version']
+                    self.is_trained = True
+                    print(f"✅ Loaded existing AQI model from {path}")
+                    return
+        except Exception as e:
+            print(f"⚠️ Failed to load AQI model from {path}: {e}")
+        self.train_mock_model()
 
     def predict_future(self, current_aqi, days=30):
         """Predict AQI for next N days"""
-        if not self.is_trained:
-            self.train_mock_model()
+        return self.predict_future_batch([current_aqi], days=days)[0]
+
+    @timed('aqi_forecast')
+    def predict_future_batch(self, current_aqis, days=30):
+        """Predict AQI for next N days for many locations, one LSTM pass per day"""
+        self._ensure_model()
             
-        predictions = []
-        current_seq = np.array([[current_aqi] for _ in range(self.sequence_length)]) # Initialize with current
-        current_seq = current_seq.reshape(1, self.sequence_length, 1)
+        n = len(current_aqis)
+        predictions = [[] for _ in range(n)]
+        if n == 0:
+            return predictions
+
+        # Initialize each sequence with its current AQI
+        current_seq = np.repeat(
+            np.array(current_aqis, dtype=float).reshape(n, 1, 1),
+            self.sequence_length,
+            axis=1
+        )
         
         # Add some randomness to initial sequence to make it look realistic
-        for i in range(self.sequence_length):
-            current_seq[0][i][0] += random.gauss(0, 10)
+        current_seq += np.array([random.gauss(0, 10) for _ in range(n * self.sequence_length)]).reshape(current_seq.shape)
+        
+        # Input projections of the window slide along with it; each day only projects its new value
+        projected = self.model.project(current_seq)
 
         for _ in range(days):
-            pred = self.model.predict(current_seq, verbose=0)[0][0]
+            preds = self.model.predict_projected(projected).astype(float)
             # Add noise for realism
-            pred += random.gauss(0, 5)
-            pred = max(0, pred) # AQI can't be negative
+            preds = preds + np.array([random.gauss(0, 5) for _ in range(n)])
+            preds = np.maximum(0, preds) # AQI can't be negative
             
-            predictions.append(int(pred))
+            for i in range(n):
+                predictions[i].append(int(preds[i]))
             
             # Update sequence: remove first, add prediction
-            new_seq = np.roll(current_seq, -1, axis=1)
-            new_seq[0][-1][0] = pred
-            current_seq = new_seq
+            projected = np.roll(projected, -1, axis=1)
+            projected[:, -1] = self.model.project(preds[:, None])
             
         return predictions
 
+    def _ensure_model(self):
+        if not self.is_trained:
+            with self._train_lock:
+                if not self.is_trained:
+                    self.load_model()
+
+    def model_identity(self):
+        """
+        Identifies the weights forecasts are made with: the architecture and the
+        artifact version loaded in this worker, or before the first forecast the
+        published one it will load. Never loads or trains the model itself; None
+        while no version is published, when forecasts shouldn't be cached.
+        """
+        if self.is_trained:
+            version = self.version
+        else:
+            current = self.artifacts.current()
+            version = current and current[0]
+        if version is None:
+            return None
+        return f"{self.model_version}/seq{self.sequence_length}@{version}"
+
     def get_lightning_risk(self, city, building_type):
         """Get lightning risk warning"""
         high_risk_cities = ['bangalore', 'kolkata', 'ranchi', 'bhubaneswar']
@@ -0,0 +1,82 @@
+"""
+Benchmark 30-day AQI forecasts on the NumPy LSTM runtime against Keras
+model.predict with the same weights.
+
+Run from the backend directory:
+    python benchmarks/aqi_forecast.py
+
+Uses the current exported weights in MODEL_DIR (trained on first use if
+missing). Reports the largest relative difference of single predictions and
+median forecast latency for 1 and 200 locations. Needs TensorFlow for the
+Keras side only.
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aqi_model import AQIPredictor  # noqa: E402
+
+
+def keras_model(predictor):
+    """The Keras model with the runtime's weights"""
+    model = predictor.build_model()
+    runtime = predictor.model
+    model.layers[0].set_weights([runtime.kernel, runtime.recurrent_kernel, runtime.bias])
+    model.layers[1].set_weights([runtime.dense_kernel, runtime.dense_bias])
+    return model
+
+
+def keras_forecast(predictor, model, current_aqis, days=30):
+    """AQIPredictor.predict_future_batch as it ran before the NumPy runtime"""
+    n = len(current_aqis)
+    seq = np.repeat(np.array(current_aqis, dtype=float).reshape(n, 1, 1), predictor.sequence_length, axis=1)
+    seq += np.array([random.gauss(0, 10) for _ in range(seq.size)]).reshape(seq.shape)
+    predictions = [[] for _ in range(n)]
+    for _ in range(days):
+        preds = np.maximum(0, model.predict(seq, verbose=0)[:, 0] + np.array([random.gauss(0, 5) for _ in range(n)]))
+        for i in range(n):
+            predictions[i].append(int(preds[i]))
+        seq = np.roll(seq, -1, axis=1)
+        seq[:, -1, 0] = preds
+    return predictions
+
+
+def median_latency(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    predictor = AQIPredictor()
+    predictor.load_model()
+    model = keras_model(predictor)
+
+    X = np.random.default_rng(42).uniform(0, 300, size=(2000, predictor.sequence_length, 1))
+    expected = model.predict(X, verbose=0)[:, 0]
+    actual = predictor.model.predict(X)
+    relative = np.abs(actual - expected) / np.maximum(1, np.abs(expected))
+    print(f"Largest relative difference over {len(X)} predictions: {relative.max():.2e}")
+
+    print(f"\n{'path':<8} {'1 location':>12} {'200 locations':>15}")
+    for name, forecast in (
+        ('keras', lambda aqis: keras_forecast(predictor, model, aqis)),
+        ('numpy', predictor.predict_future_batch)
+    ):
+        single = median_latency(lambda: forecast([120.0]), 5)
+        batch = median_latency(lambda: forecast([120.0] * 200), 3)
+        print(f"{name:<8} {single * 1e3:>9.1f} ms {batch * 1e3:>12.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Benchmark loading a zoning model from its memory-mapped array artifact
+against unpickling it with joblib, as each gunicorn worker does at boot.
+
+Run from the backend directory:
+    python benchmarks/model_loading.py [model artifact]
+
+Defaults to the current model in MODEL_DIR (train one first with POST /api/train-model).
+Each load runs in a fresh process, like a booting worker; peak resident
+memory of that process is reported too (mapped pages count only once touched).
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_registry import ModelArtifacts  # noqa: E402
+
+LOADER = '''
+import resource, sys, time
+sys.path.insert(0, {backend!r})
+from zoning_ml_model import ZoningMLModel
+model = ZoningMLModel()
+start = time.perf_counter()
+model.load_model({path!r})
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+
+
+def measure(path, repeat):
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    timings, rss = [], []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', LOADER.format(backend=backend, path=path)],
+            capture_output=True, text=True, check=True
+        ).stdout.split()
+        timings.append(float(output[-2]))
+        rss.append(int(output[-1]))
+    return statistics.median(timings), statistics.median(rss)
+
+
+def main(path):
+    if path is None or not os.path.isdir(path):
+        print(f"No array artifact at {path or ModelArtifacts().directory}; train one first (POST /api/train-model)")
+        return 1
+    print(f"Artifact: {path} ({os.path.getsize(os.path.join(path, 'arrays.bin')) / 1024 / 1024:.1f} MB of arrays)")
+    print(f"\n{'format':<10} {'load (median)':>14} {'max RSS':>10}")
+    for name, load_path in (('pickle', os.path.join(path, 'estimators.pkl')), ('mmap', path)):
+        elapsed, rss = measure(load_path, 5)
+        print(f"{name:<10} {elapsed * 1e3:>11.1f} ms {rss / 1024:>7.0f} MB")
+    return 0
+
+
+if __name__ == '__main__':
+    current = ModelArtifacts().current()
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else current and current[1]))
@@ -0,0 +1,83 @@
+"""
+Benchmark the rule extractor against the former per-sentence regex loop.
+
+Run from the backend directory:
+    python benchmarks/rule_extraction.py [file ...]
+
+Defaults to every bundled document under zoning-documents/. Extracted text is
+taken from (and stored in) the document text cache, so only the first run pays
+for PDF extraction.
+"""
+import glob
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_processor import DocumentProcessor, file_hash  # noqa: E402
+from nltk.tokenize import sent_tokenize  # noqa: E402
+
+
+def legacy_parse(sentence, zone_keywords):
+    """DocumentProcessor._parse_sentence_for_rules before the compiled extractor"""
+    rule = {}
+    for zone_type in zone_keywords:
+        if zone_type in sentence:
+            rule['zone_type'] = zone_type.replace('-use', '')
+    far_match = re.search(r'(?:far|fsi)[\s:]*(?:of|is|=)?[\s]*(\d+\.?\d*)', sentence)
+    if far_match:
+        rule['far'] = float(far_match.group(1))
+    height_match = re.search(r'(?:height|tall)[\s:]*(?:of|is|up to)?[\s]*(\d+)[\s]*(?:m|meter|metre|feet|ft)', sentence)
+    if height_match:
+        rule['max_height'] = int(height_match.group(1))
+    coverage_match = re.search(r'(?:coverage)[\s:]*(?:of|is)?[\s]*(\d+)[\s]*%', sentence)
+    if coverage_match:
+        rule['ground_coverage'] = int(coverage_match.group(1))
+    setback_match = re.search(r'(?:setback)[\s:]*(?:of|is)?[\s]*(\d+)[\s]*(?:m|meter|metre|feet|ft)', sentence)
+    if setback_match:
+        rule['setback'] = int(setback_match.group(1))
+    parking_match = re.search(r'(?:parking)[\s:]*(\d+)[\s]*(?:per|for every|/)[\s]*(\d+)[\s]*(?:sqm|sq\.m|square meter)', sentence)
+    if parking_match:
+        rule['parking'] = f"1 per {parking_match.group(2)} sqm"
+    if len(rule) >= 2:
+        rule['source_sentence'] = sentence
+        return rule
+    return None
+
+
+def best_of(func, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def main(paths):
+    processor = DocumentProcessor(load_existing=False)
+    zone_keywords = processor.keywords['zone_type']
+
+    for path in paths:
+        content_hash = file_hash(path)
+        if os.path.exists(processor._cache_path(content_hash, '.txt.gz')):
+            text = "".join(processor._iter_cached_text(content_hash))
+        else:
+            print(f"Extracting {path} (first run only)...")
+            blocks = processor._iter_blocks(path, os.path.splitext(path)[1].lower())
+            text = "".join(processor._caching_text(content_hash, blocks))
+
+        sentences = sent_tokenize(text.lower())
+        legacy_rules, legacy_time = best_of(lambda: [legacy_parse(s, zone_keywords) for s in sentences])
+        rules, compiled_time = best_of(lambda: [processor._parse_sentence_for_rules(s) for s in sentences])
+
+        print(f"\n{os.path.basename(path)}: {len(sentences)} sentences, {len(text)} chars")
+        print(f"  legacy    {len(sentences) / legacy_time:>10,.0f} sentences/s")
+        print(f"  extractor {len(sentences) / compiled_time:>10,.0f} sentences/s "
+              f"({legacy_time / compiled_time:.1f}x), identical output: {rules == legacy_rules}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or sorted(glob.glob(os.path.join('zoning-documents', '*', '*.pdf'))))
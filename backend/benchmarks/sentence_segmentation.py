@@ -0,0 +1,82 @@
+"""
+Benchmark the sentence segmenters: throughput and rule recall against Punkt.
+
+Run from the backend directory:
+    python benchmarks/sentence_segmentation.py [file ...]
+
+Defaults to every bundled PDF under zoning-documents/ (identical files once).
+Text comes from the document text cache like in benchmarks/rule_extraction.py.
+Agreement is the share of Punkt's sentences the segmenter produces exactly.
+Recall counts the rules Punkt finds that the segmenter finds too, compared
+without their source sentences, which differ with the sentence boundaries.
+"""
+import glob
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_processor import DocumentProcessor, file_hash  # noqa: E402
+from sentence_segmenter import SEGMENTERS  # noqa: E402
+
+
+def best_of(func, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def rule_keys(rules):
+    return Counter(
+        json.dumps({k: v for k, v in rule.items() if k != 'source_sentence'}, sort_keys=True)
+        for rule in rules
+    )
+
+
+def main(paths):
+    processors = {name: DocumentProcessor(load_existing=False, segmenter=name) for name in SEGMENTERS}
+    reference = processors['punkt']
+
+    seen = set()
+    for path in paths:
+        content_hash = file_hash(path)
+        if content_hash in seen:
+            continue
+        seen.add(content_hash)
+
+        if os.path.exists(reference._cache_path(content_hash, '.txt.gz')):
+            blocks = list(reference._iter_cached_text(content_hash))
+        else:
+            print(f"Extracting {path} (first run only)...")
+            file_blocks = reference._iter_blocks(path, os.path.splitext(path)[1].lower())
+            blocks = list(reference._caching_text(content_hash, file_blocks))
+        blocks = [block.lower() for block in blocks]
+        megabytes = sum(len(block) for block in blocks) / 1e6
+
+        print(f"\n{os.path.basename(path)}: {megabytes:.1f} MB of text")
+        baseline = None
+        for name, processor in processors.items():
+            sentences, seconds = best_of(lambda: list(processor._iter_sentences(iter(blocks))))
+            rules = [rule for rule in map(processor._parse_sentence_for_rules, sentences) if rule]
+            line = (f"  {name:<6} {len(sentences):>7,} sentences {len(sentences) / seconds:>10,.0f} sentences/s "
+                    f"{megabytes / seconds:>6.2f} MB/s {len(rules):>5} rules")
+            if baseline is None:
+                baseline = (Counter(sentences), rule_keys(rules), seconds)
+            else:
+                baseline_sentences, baseline_rules, baseline_seconds = baseline
+                agreement = sum((Counter(sentences) & baseline_sentences).values()) / sum(baseline_sentences.values())
+                line += f"  {baseline_seconds / seconds:.1f}x, agreement {agreement:.1%}"
+                if baseline_rules:
+                    found = sum((rule_keys(rules) & baseline_rules).values())
+                    line += f", recall {found / sum(baseline_rules.values()):.1%}"
+            print(line)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or sorted(glob.glob(os.path.join('zoning-documents', '*', '*.pdf'))))
@@ -0,0 +1,77 @@
+"""
+Benchmark compiled tree-ensemble inference against sklearn's predict calls.
+
+Run from the backend directory:
+    python benchmarks/tree_inference.py [model artifact or .pkl]
+
+Defaults to the current model in MODEL_DIR (train one first with POST /api/train-model).
+Reports median single-row latency and batch throughput of the former
+scaler + predict + predict_proba + FAR predict path and of the compiled model,
+and checks that both give identical outputs.
+"""
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_registry import ModelArtifacts  # noqa: E402
+from zoning_ml_model import ZoningMLModel  # noqa: E402
+
+
+def sklearn_predict(model, X):
+    """ZoningMLModel.predict's model calls before the compiled engine"""
+    X_scaled = model.scaler.transform(X)
+    zone_types = model.classifier.predict(X_scaled)
+    confidences = model.classifier.predict_proba(X_scaled).max(axis=1)
+    return zone_types, confidences, model.far_regressor.predict(X_scaled)
+
+
+def median_latency(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main(path):
+    if path is None or not os.path.exists(path):
+        print(f"No trained model at {path or ModelArtifacts().directory}; train one first (POST /api/train-model)")
+        return 1
+    if os.path.isdir(path):
+        # The sklearn estimators of an array artifact
+        path = os.path.join(path, 'estimators.pkl')
+    model = ZoningMLModel()
+    model.load_model(path)
+    compiled = model.compiled
+    forest, boosting = compiled.forest, compiled.boosting
+    print(f"Model: {len(forest.roots)} forest trees (depth {forest.depth}), "
+          f"{len(boosting.roots)} boosting stages (depth {boosting.depth}), "
+          f"{len(forest.feature) + len(boosting.feature)} nodes")
+
+    rng = np.random.default_rng(42)
+    mean, scale = model.scaler.mean_, model.scaler.scale_
+    X = mean + scale * rng.normal(size=(2000, len(mean)))
+
+    expected = sklearn_predict(model, X)
+    actual = compiled.predict(X)
+    identical = all(np.array_equal(e, a) for e, a in zip(expected, actual))
+    print(f"Identical outputs on {len(X)} rows: {'yes' if identical else 'NO'}")
+
+    row = X[:1]
+    print(f"\n{'path':<10} {'1 row (median)':>16} {'500 rows':>12}")
+    for name, func in (('sklearn', lambda X: sklearn_predict(model, X)), ('compiled', compiled.predict)):
+        single = median_latency(lambda: func(row), 200)
+        batch = median_latency(lambda: func(X[:500]), 20)
+        print(f"{name:<10} {single * 1e6:>13.0f} µs {batch * 1e3:>9.2f} ms")
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    current = ModelArtifacts().current()
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else current and current[1]))
@@ -1,13 +1,22 @@
+import gzip
+import hashlib
 import json
+import multiprocessing
 import os
-import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import islice
 
 import nltk
 import pdfplumber
 from docx import Document
 from nltk.corpus import stopwords
-from nltk.tokenize import sent_tokenize, word_tokenize
+from nltk.tokenize import word_tokenize
+from document_store import DocumentStore
+from rule_extractor import RuleExtractor
+from search_index import SearchIndex
+from sentence_segmenter import get_segmenter
 
 # Download required NLTK data
 try:
@@ -20,17 +29,80 @@ try:
 except LookupError:
     nltk.download('stopwords')
 
+# Bump whenever the rule extraction changes, so cached rules get re-parsed from cached text
+RULES_VERSION = 1
+
+
+def file_hash(filepath, chunk_size=1024 * 1024):
+    """sha256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Text blocks of TXT/DOCX files and cached text are about this size
+TEXT_BLOCK_CHARS = 64 * 1024
+# A "sentence" still unfinished after this many characters is emitted anyway
+MAX_SENTENCE_CARRY = 100 * 1024
+
+
+def _iter_pdf_pages(filepath, start, stop, progress=None):
+    """
+    Text of pages [start, stop) of a PDF, one line break after each page.
+    Each page is released as soon as its text is taken.
+    """
+    with pdfplumber.open(filepath) as pdf:
+        total = len(pdf.pages)
+        for number in range(start, stop):
+            page = pdf.pages[number]
+            text = (page.extract_text() or "") + "\n"
+            page.close()
+            if progress:
+                progress(pages_done=number + 1, pages_total=total)
+            yield text
+
+
+def _extract_pdf_pages(filepath, start, stop):
+    """Text of a page range; module-level so it can run in a worker process"""
+    return "".join(_iter_pdf_pages(filepath, start, stop))
+
+
+def _group_lines(lines, block_chars=TEXT_BLOCK_CHARS):
+    """Join consecutive lines into blocks of roughly block_chars"""
+    block, size = [], 0
+    for line in lines:
+        block.append(line)
+        size += len(line)
+        if size >= block_chars:
+            yield "".join(block)
+            block, size = [], 0
+    if block:
+        yield "".join(block)
+
+
 class DocumentProcessor:
     """
     Process zoning regulation documents and extract structured data
     Supports PDF, DOCX, and TXT formats
     """
     
-    def __init__(self):
-        self.documents = []
-        self.documents_by_city = {}  # Store documents grouped by city
+    def __init__(self, load_existing=True, store=None, segmenter=None, search_index=None):
+        # Processed documents live in an indexed store shared by all workers
+        self.store = store or DocumentStore()
         self.stop_words = set(stopwords.words('english'))
         
+        # Ranked full-text search over their sentences
+        self.search_index = search_index or SearchIndex(stop_words=self.stop_words)
+        
+        # Large PDFs are split into page ranges extracted on a process pool
+        self.pdf_workers = int(os.getenv('DOC_PDF_WORKERS', os.cpu_count() or 1))
+        self.pdf_chunk_pages = int(os.getenv('DOC_PDF_CHUNK_PAGES', 16))
+        
+        # Extracted text and parsed rules, keyed by content hash
+        self.text_cache_dir = os.getenv('DOC_TEXT_CACHE_DIR', os.path.join('cache', 'text'))
+        
         # Keywords for extracting zoning information
         self.keywords = {
             'far': ['far', 'floor area ratio', 'fsi', 'floor space index'],
@@ -52,255 +124,379 @@ class DocumentProcessor:
             'kolkata': ['kolkata', 'calcutta', 'kmc', 'west bengal']
         }
         
-        # Load existing documents from metadata
-        self.load_existing_documents()
+        self._city_keyword_list = [k for keywords in self.city_keywords.values() for k in keywords]
+        
+        # Compiled rule patterns with a keyword prefilter
+        self.rule_extractor = RuleExtractor(self.keywords['zone_type'])
+        
+        # 'punkt' (accurate) or 'fast' (rule-based, for bulk re-indexing)
+        self.segmenter = get_segmenter(segmenter or os.getenv('DOC_SEGMENTER', 'punkt'))
+        
+        # Import documents saved as JSON metadata before the store existed
+        if load_existing:
+            self.load_existing_documents()
         
     def load_existing_documents(self):
-        """Load previously processed documents from metadata"""
-        metadata_dir = 'data'
-        if not os.path.exists(metadata_dir):
-            return
-            
-        print("📂 Loading existing documents from metadata...")
+        """Import legacy data/<id>.json metadata files not yet in the store and index them for search"""
+        count = self.store.import_legacy('data')
+        if count:
+            print(f"📂 Imported {count} documents from JSON metadata.")
+        print(f"✅ {self.store.count()} documents in store.")
+        # Also catches documents stored before the search index existed
+        indexed = self.reindex_search()
+        if indexed:
+            print(f"🔎 Indexed {indexed} documents for search.")
+        
+    def add_document(self, document):
+        """Save a processed document (and its rules) to the store and the search index"""
+        self.store.add(document)
+        self.index_document(document)
+
+    def add_documents(self, documents):
+        """Save several processed documents in one transaction"""
+        self.store.add_many(documents)
+        for document in documents:
+            self.index_document(document)
+
+    def index_document(self, document):
+        """
+        Index a document's sentences for search under its (final) city. Documents
+        without cached sentences, e.g. imported legacy ones, are searchable by the
+        source sentences of their rules.
+        """
+        sentences = None
+        if document.get('content_hash'):
+            sentences = self._cached_sentences(document['content_hash'])
+        if sentences is None:
+            sentences = [rule['source_sentence'] for rule in document.get('rules', []) if rule.get('source_sentence')]
+        self.search_index.add(document, sentences)
+
+    def reindex_search(self):
+        """Index every stored document not in the search index yet; returns how many"""
+        indexed = self.search_index.indexed_documents()
         count = 0
-        for filename in os.listdir(metadata_dir):
-            if filename.endswith('.json'):
-                try:
-                    filepath = os.path.join(metadata_dir, filename)
-                    with open(filepath, 'r') as f:
-                        doc = json.load(f)
-                        
-                    # Add to memory
-                    self.documents.append(doc)
-                    
-                    city = doc.get('city', 'unknown')
-                    if city not in self.documents_by_city:
-                        self.documents_by_city[city] = []
-                    self.documents_by_city[city].append(doc)
-                    count += 1
-                except Exception as e:
-                    print(f"⚠️ Error loading metadata {filename}: {e}")
-                    
-        print(f"✅ Loaded {count} documents from persistence.")
-        
-    def process_document(self, filepath, city='bangalore'):
-        """Process a document and extract zoning rules"""
+        for record in self.store.list():
+            if record['id'] not in indexed:
+                self.index_document(self.store.get(record['id']))
+                count += 1
+        return count
+
+    def search(self, query, city=None, limit=10):
+        """Ranked sentences matching the query, with the filename of their document"""
+        results = self.search_index.search(query, city=city, limit=limit)
+        documents = {}
+        for result in results:
+            doc_id = result['document_id']
+            if doc_id not in documents:
+                documents[doc_id] = self.store.get(doc_id, with_rules=False)
+            document = documents[doc_id] or {}
+            result['filename'] = document.get('filename')
+            result['city'] = document.get('city')
+        return results
+
+    def get_document(self, doc_id):
+        """Full document record including rules, or None"""
+        return self.store.get(doc_id)
+
+    def find_by_hash(self, content_hash, city):
+        """An already processed document with this content for this city, if any"""
+        return self.store.find_by_hash(content_hash, city)
+
+    def process_document(self, filepath, city='bangalore', doc_id=None, progress=None, content_hash=None,
+                         save=True):
+        """
+        Process a document and extract zoning rules.
+        progress(**fields), if given, is called with pages_done/pages_total
+        during extraction and rules_found while parsing.
+        Text, sentences and rules of content seen before (by content_hash) come from the cache.
+        With save=False the record is only returned, e.g. for batched writes.
+        """
         file_ext = os.path.splitext(filepath)[1].lower()
+        if file_ext not in ('.pdf', '.docx', '.txt'):
+            raise ValueError(f"Unsupported file format: {file_ext}")
         
-        if file_ext == '.pdf':
-            text = self._extract_from_pdf(filepath)
-        elif file_ext == '.docx':
-            text = self._extract_from_docx(filepath)
-        elif file_ext == '.txt':
-            text = self._extract_from_txt(filepath)
+        content_hash = content_hash or file_hash(filepath)
+        
+        # The text flows through as a stream of blocks (pages for PDFs), so memory
+        # stays flat with document size and rules turn up while pages are still read
+        if os.path.exists(self._cache_path(content_hash, '.txt.gz')):
+            print(f"♻️ Reusing extracted text for {os.path.basename(filepath)}")
+            blocks = self._iter_cached_text(content_hash)
         else:
-            raise ValueError(f"Unsupported file format: {file_ext}")
+            blocks = self._caching_text(content_hash, self._iter_blocks(filepath, file_ext, progress))
+        
+        stats = {'text_length': 0, 'city_keywords': set()}
+        blocks = self._lowercase_blocks(blocks, stats)
+        
+        # Extract structured data
+        rules = self._cached_rules(content_hash)
+        sentences_path = self._cache_path(content_hash, self._sentences_cache_suffix())
+        if rules is None or not os.path.exists(sentences_path):
+            if os.path.exists(sentences_path):
+                # Only the rule extraction changed: no need to segment again
+                for _ in blocks:
+                    pass
+                sentences = self._iter_cached_sentences(content_hash)
+            else:
+                sentences = self._streaming_cache(
+                    sentences_path, self._iter_sentences(blocks), lambda sentence: json.dumps(sentence) + '\n'
+                )
+            rules = []
+            for rule in self._iter_rules(sentences):
+                rules.append(rule)
+                if progress:
+                    progress(rules_found=len(rules))
+            self._cache_rules(content_hash, rules)
+        else:
+            # Still read the text for its length and city
+            for _ in blocks:
+                pass
+        if progress:
+            progress(rules_found=len(rules))
         
         # Detect city from document if not specified
-        detected_city = self._detect_city(text)
+        detected_city = self._city_from_keywords(stats['city_keywords'])
         if detected_city:
             city = detected_city
             print(f"🔍 Detected city from document: {city}")
         
-        # Extract structured data
-        rules = self._extract_rules(text)
-        
         # Create document record
         document = {
-            'id': datetime.now().strftime('%Y%m%d%H%M%S') + str(len(self.documents)),
+            'id': doc_id or datetime.now().strftime('%Y%m%d%H%M%S') + str(self.store.count()),
             'filename': os.path.basename(filepath),
             'filepath': filepath,
             'city': city,
             'processed_at': datetime.now().isoformat(),
             'rules': rules,
-            'text_length': len(text)
+            'text_length': stats['text_length'],
+            'content_hash': content_hash,
+            'rules_version': RULES_VERSION
         }
         
-        self.documents.append(document)
-        
-        # Store in city-specific collection
-        if city not in self.documents_by_city:
-            self.documents_by_city[city] = []
-        self.documents_by_city[city].append(document)
-        
-        # Save document metadata
-        self._save_document_metadata(document)
+        if save:
+            self.add_document(document)
         
         return document
     
-    def _extract_from_pdf(self, filepath):
-        """Extract text from PDF"""
-        text = ""
+    def _iter_blocks(self, filepath, file_ext, progress=None):
+        """The document text as consecutive blocks; joined, they are the full text"""
+        if file_ext == '.pdf':
+            yield from self._iter_pdf_blocks(filepath, progress)
+        elif file_ext == '.docx':
+            paragraphs = [para.text for para in Document(filepath).paragraphs]
+            last = len(paragraphs) - 1
+            yield from _group_lines(text if i == last else text + "\n" for i, text in enumerate(paragraphs))
+        else:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                yield from _group_lines(f)
+    
+    def _iter_pdf_blocks(self, filepath, progress=None):
+        """PDF text page by page, or by page range on a process pool for long PDFs"""
         with pdfplumber.open(filepath) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
-        return text
+            total = len(pdf.pages)
+        
+        ranges = [
+            (start, min(start + self.pdf_chunk_pages, total))
+            for start in range(0, total, self.pdf_chunk_pages)
+        ]
+        workers = min(self.pdf_workers, len(ranges))
+        # Daemon processes can't start a pool of their own
+        if workers < 2 or multiprocessing.current_process().daemon:
+            yield from _iter_pdf_pages(filepath, 0, total, progress)
+            return
+        
+        # A pool per document: its workers, and whatever pdfminer cached in them, go away afterwards.
+        # At most two ranges per worker run ahead of the consumer; results come back in page order.
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            ranges_left = iter(ranges)
+            window = deque(
+                (pool.submit(_extract_pdf_pages, filepath, start, stop), stop)
+                for start, stop in islice(ranges_left, workers * 2)
+            )
+            while window:
+                future, stop = window.popleft()
+                text = future.result()
+                for start, next_stop in islice(ranges_left, 1):
+                    window.append((pool.submit(_extract_pdf_pages, filepath, start, next_stop), next_stop))
+                if progress:
+                    progress(pages_done=stop, pages_total=total)
+                yield text
+        
+        print(f"📄 Extracted {total} pages with {workers} workers")
     
-    def _extract_from_docx(self, filepath):
-        """Extract text from DOCX"""
-        doc = Document(filepath)
-        text = "\n".join([para.text for para in doc.paragraphs])
-        return text
+    def _lowercase_blocks(self, blocks, stats):
+        """Lowercase each block once, counting characters and city keywords on the way"""
+        for block in blocks:
+            stats['text_length'] += len(block)
+            lowered = block.lower()
+            # Keywords never span a line break, and blocks end on one
+            for keyword in self._city_keyword_list:
+                if keyword not in stats['city_keywords'] and keyword in lowered:
+                    stats['city_keywords'].add(keyword)
+            yield lowered
     
-    def _extract_from_txt(self, filepath):
-        """Extract text from TXT"""
-        with open(filepath, 'r', encoding='utf-8') as f:
-            text = f.read()
-        return text
+    def _iter_sentences(self, blocks):
+        """
+        Sentences of a stream of text blocks. The last sentence of a block may
+        continue in the next one, so it is carried over and tokenized again with it.
+        """
+        carry = ""
+        for block in blocks:
+            buffer = carry + block
+            sentences = self.segmenter.segment(buffer)
+            if not sentences:
+                carry = ""
+                continue
+            last = sentences.pop()
+            yield from sentences
+            carry = buffer[buffer.rfind(last):]
+            if len(carry) > MAX_SENTENCE_CARRY:
+                yield carry.strip()
+                carry = ""
+        if carry:
+            yield from self.segmenter.segment(carry)
     
-    def _extract_rules(self, text):
-        """Extract zoning rules from text using NLP"""
-        rules = []
-        
-        # Tokenize into sentences
-        sentences = sent_tokenize(text.lower())
-        
+    def _iter_rules(self, sentences):
+        """Zoning rules of the sentences that contain any"""
         for sentence in sentences:
             rule = self._parse_sentence_for_rules(sentence)
             if rule:
-                rules.append(rule)
-        
-        return rules
+                yield rule
     
+    def _cache_path(self, content_hash, suffix):
+        return os.path.join(self.text_cache_dir, f"{content_hash}{suffix}")
+
+    def _write_cache_file(self, path, data):
+        # Write then rename, so a concurrent worker never reads half a file
+        os.makedirs(self.text_cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _iter_cached_text(self, content_hash):
+        with gzip.open(self._cache_path(content_hash, '.txt.gz'), 'rt', encoding='utf-8', newline='') as f:
+            yield from _group_lines(f)
+
+    def _caching_text(self, content_hash, blocks):
+        """Pass text blocks through while streaming them into the text cache"""
+        return self._streaming_cache(self._cache_path(content_hash, '.txt.gz'), blocks)
+
+    def _sentences_cache_suffix(self):
+        return f".sentences-{self.segmenter.name}.jsonl.gz"
+
+    def _iter_cached_sentences(self, content_hash):
+        with gzip.open(self._cache_path(content_hash, self._sentences_cache_suffix()), 'rt', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def _cached_sentences(self, content_hash):
+        """Sentences of this content as segmented by the current segmenter, or None"""
+        if not os.path.exists(self._cache_path(content_hash, self._sentences_cache_suffix())):
+            return None
+        return list(self._iter_cached_sentences(content_hash))
+
+    def _streaming_cache(self, path, items, serialize=str):
+        """Pass items through while writing serialize(item) into a gzip cache file"""
+        os.makedirs(self.text_cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        complete = False
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8', newline='') as f:
+                for item in items:
+                    f.write(serialize(item))
+                    yield item
+            # Renamed only once complete, so a concurrent worker never reads half a file
+            os.replace(tmp_path, path)
+            complete = True
+        finally:
+            if not complete and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _rules_cache_suffix(self):
+        # Punkt rules keep the original file name; other segmenters get their own
+        if self.segmenter.name == 'punkt':
+            return f".rules-v{RULES_VERSION}.json"
+        return f".rules-v{RULES_VERSION}-{self.segmenter.name}.json"
+
+    def _cached_rules(self, content_hash):
+        """Rules parsed from this content by the current RULES_VERSION"""
+        path = self._cache_path(content_hash, self._rules_cache_suffix())
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _cache_rules(self, content_hash, rules):
+        self._write_cache_file(
+            self._cache_path(content_hash, self._rules_cache_suffix()),
+            json.dumps(rules).encode('utf-8')
+        )
+
     def _parse_sentence_for_rules(self, sentence):
         """Parse a sentence to extract zoning rules"""
-        rule = {}
-        
-        # Check for zone type
-        for zone_type in self.keywords['zone_type']:
-            if zone_type in sentence:
-                rule['zone_type'] = zone_type.replace('-use', '')
-        
-        # Extract FAR
-        far_match = re.search(r'(?:far|fsi)[\s:]*(?:of|is|=)?[\s]*(\d+\.?\d*)', sentence)
-        if far_match:
-            rule['far'] = float(far_match.group(1))
-        
-        # Extract height
-        height_match = re.search(r'(?:height|tall)[\s:]*(?:of|is|up to)?[\s]*(\d+)[\s]*(?:m|meter|metre|feet|ft)', sentence)
-        if height_match:
-            rule['max_height'] = int(height_match.group(1))
-        
-        # Extract coverage
-        coverage_match = re.search(r'(?:coverage)[\s:]*(?:of|is)?[\s]*(\d+)[\s]*%', sentence)
-        if coverage_match:
-            rule['ground_coverage'] = int(coverage_match.group(1))
-        
-        # Extract setback
-        setback_match = re.search(r'(?:setback)[\s:]*(?:of|is)?[\s]*(\d+)[\s]*(?:m|meter|metre|feet|ft)', sentence)
-        if setback_match:
-            rule['setback'] = int(setback_match.group(1))
-        
-        # Extract parking
-        parking_match = re.search(r'(?:parking)[\s:]*(\d+)[\s]*(?:per|for every|/)[\s]*(\d+)[\s]*(?:sqm|sq\.m|square meter)', sentence)
-        if parking_match:
-            rule['parking'] = f"1 per {parking_match.group(2)} sqm"
-        
-        # Only return if we found at least 2 pieces of information
-        if len(rule) >= 2:
-            rule['source_sentence'] = sentence
-            return rule
-        
-        return None
+        return self.rule_extractor.parse(sentence)
     
     def get_documents(self, city=None):
         """Get list of all processed documents, optionally filtered by city"""
-        docs = self.documents
-
-        if city:
-            # Try exact match first
-            exact = self.documents_by_city.get(city)
-            if exact:
-                docs = exact
-            else:
-                # Fall back to a normalized-match: compare lowercase without spaces/underscores
-                target = city.lower().replace(' ', '').replace('_', '')
-                matched = []
-                for doc in self.documents:
-                    doc_city = str(doc.get('city', 'unknown'))
-                    if doc_city.lower() == city.lower():
-                        matched.append(doc)
-                        continue
-                    if doc_city.lower().replace(' ', '').replace('_', '') == target:
-                        matched.append(doc)
-                docs = matched
-
         return [
             {
                 'id': doc['id'],
                 'filename': doc['filename'],
-                'city': doc.get('city', 'unknown'),
+                'city': doc['city'],
                 'processed_at': doc['processed_at'],
-                'rules_count': len(doc['rules'])
+                'rules_count': doc['rules_count']
             }
-            for doc in docs
+            for doc in self.store.list(city)
         ]
+
+    def get_cities(self):
+        """{city: {'documents': n, 'total_rules': m}} for every city with documents"""
+        return self.store.city_stats()
     
-    def _detect_city(self, text):
-        """Detect city from document text"""
-        text_lower = text.lower()
-        
+    def _city_from_keywords(self, found_keywords):
+        """First city, in city_keywords order, with any of its keywords found in the text"""
         for city, keywords in self.city_keywords.items():
             for keyword in keywords:
-                if keyword in text_lower:
+                if keyword in found_keywords:
                     return city
         
         return None
     
     def delete_document(self, doc_id):
         """Delete a document"""
-        self.documents = [doc for doc in self.documents if doc['id'] != doc_id]
-    
-    def _save_document_metadata(self, document):
-        """Save document metadata to JSON"""
-        metadata_dir = 'data'
-        os.makedirs(metadata_dir, exist_ok=True)
-        
-        metadata_file = os.path.join(metadata_dir, f"{document['id']}.json")
-        
-        # Don't save the full text, just metadata
-        metadata = {
-            'id': document['id'],
-            'filename': document['filename'],
-            'city': document.get('city', 'unknown'),
-            'processed_at': document['processed_at'],
-            'rules': document['rules'],
-            'text_length': document['text_length']
-        }
-        
-        with open(metadata_file, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        self.store.delete(doc_id)
+        self.search_index.delete(doc_id)
     
     def get_training_data(self):
         """Convert extracted rules to training data format"""
         training_data = []
         
-        for doc in self.documents:
-            for rule in doc['rules']:
-                if 'zone_type' in rule and 'far' in rule:
-                    # Create a training sample
-                    sample = {
-                        'zone_type': rule['zone_type'],
-                        'far': rule.get('far', 2.0),
-                        'max_height': rule.get('max_height', 30),
-                        'ground_coverage': rule.get('ground_coverage', 50),
-                        'setback': rule.get('setback', 5)
-                    }
-                    training_data.append(sample)
+        for rule in self.store.iter_rules():
+            if 'zone_type' in rule and 'far' in rule:
+                # Create a training sample
+                sample = {
+                    'zone_type': rule['zone_type'],
+                    'far': rule.get('far', 2.0),
+                    'max_height': rule.get('max_height', 30),
+                    'ground_coverage': rule.get('ground_coverage', 50),
+                    'setback': rule.get('setback', 5)
+                }
+                training_data.append(sample)
         
         return training_data
     
     def summarize_documents(self):
         """Get summary of all processed documents"""
-        total_docs = len(self.documents)
-        total_rules = sum(len(doc['rules']) for doc in self.documents)
+        total_docs = self.store.count()
+        total_rules = 0
         
         zone_types = {}
-        for doc in self.documents:
-            for rule in doc['rules']:
-                if 'zone_type' in rule:
-                    zt = rule['zone_type']
-                    zone_types[zt] = zone_types.get(zt, 0) + 1
+        for rule in self.store.iter_rules():
+            total_rules += 1
+            if 'zone_type' in rule:
+                zt = rule['zone_type']
+                zone_types[zt] = zone_types.get(zt, 0) + 1
         
         return {
             'total_documents': total_docs,
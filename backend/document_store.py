@@ -0,0 +1,218 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+
+_CITY_SLUG = re.compile(r'[a-z0-9-]+')
+
+
+def city_key(city):
+    """Normalized city used for loose matches: lowercase without spaces/underscores"""
+    return str(city).lower().replace(' ', '').replace('_', '')
+
+
+def is_city_slug(name):
+    return bool(_CITY_SLUG.fullmatch(name))
+
+
+def city_slug(city):
+    """city_key(city) for use in file names; raises ValueError unless it is a plain [a-z0-9-]+ slug"""
+    key = city_key(city)
+    if not is_city_slug(key):
+        raise ValueError(f'Invalid city {city!r}: use letters, digits, spaces, hyphens or underscores')
+    return key
+
+
+def city_dir(directory, city):
+    """directory/<city slug>; raises ValueError for a city that isn't a slug or resolves outside directory"""
+    path = os.path.join(directory, city_slug(city))
+    root = os.path.realpath(directory)
+    if os.path.commonpath([root, os.path.realpath(path)]) != root:
+        raise ValueError(f'Invalid city {city!r}')
+    return path
+
+
+class DocumentStore:
+    """
+    Processed document records in one SQLite file shared by every gunicorn worker.
+
+    Document metadata is indexed by id, city and content hash. Rules (with their
+    source sentences) live in a separate table and are only read when asked for,
+    so listing documents never loads rule text.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('DOCUMENT_STORE_PATH', os.path.join('data', 'documents.sqlite3'))
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    city TEXT NOT NULL,
+                    city_key TEXT NOT NULL,
+                    processed_at TEXT NOT NULL,
+                    text_length INTEGER NOT NULL DEFAULT 0,
+                    rules_count INTEGER NOT NULL DEFAULT 0,
+                    content_hash TEXT,
+                    rules_version INTEGER,
+                    storage_path TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_city ON documents (city)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_city_key ON documents (city_key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents (content_hash)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS document_rules (
+                    document_id TEXT PRIMARY KEY,
+                    rules TEXT NOT NULL
+                )
+            """)
+            # Legacy per-document JSON files already imported (or deliberately deleted)
+            conn.execute("CREATE TABLE IF NOT EXISTS legacy_imports (filename TEXT PRIMARY KEY)")
+
+    def _connection(self):
+        # sqlite3 connections are not shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    _SELECT = (
+        "SELECT id, filename, city, processed_at, text_length, rules_count, content_hash, "
+        "rules_version, storage_path FROM documents"
+    )
+
+    @staticmethod
+    def _record(row):
+        return {
+            'id': row[0],
+            'filename': row[1],
+            'city': row[2],
+            'processed_at': row[3],
+            'text_length': row[4],
+            'rules_count': row[5],
+            'content_hash': row[6],
+            'rules_version': row[7],
+            'storage_path': row[8]
+        }
+
+    def add(self, document):
+        """Insert or replace a document record together with its rules"""
+        self._insert(self._connection(), [document])
+
+    def add_many(self, documents):
+        """Insert or replace several documents in one transaction"""
+        self._insert(self._connection(), documents)
+
+    def _insert(self, conn, documents):
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO documents (id, filename, city, city_key, processed_at, text_length, "
+                "rules_count, content_hash, rules_version, storage_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (doc['id'], doc['filename'], doc.get('city', 'unknown'), city_key(doc.get('city', 'unknown')),
+                     doc['processed_at'], doc.get('text_length', 0), len(doc['rules']),
+                     doc.get('content_hash'), doc.get('rules_version'), doc.get('storage_path'))
+                    for doc in documents
+                ]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO document_rules (document_id, rules) VALUES (?, ?)",
+                [(doc['id'], json.dumps(doc['rules'])) for doc in documents]
+            )
+
+    def import_legacy(self, metadata_dir, batch_size=500):
+        """Import data/<id>.json files written before the store existed; each file only once"""
+        if not os.path.exists(metadata_dir):
+            return 0
+        conn = self._connection()
+        imported = {row[0] for row in conn.execute("SELECT filename FROM legacy_imports")}
+        pending = [
+            name for name in os.listdir(metadata_dir)
+            if name.endswith('.json') and name not in imported
+        ]
+
+        count = 0
+        # In batches, so a large backlog of files never sits in memory at once
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            documents = []
+            for filename in batch:
+                try:
+                    with open(os.path.join(metadata_dir, filename), 'r') as f:
+                        documents.append(json.load(f))
+                except Exception as e:
+                    print(f"⚠️ Error loading metadata {filename}: {e}")
+
+            self._insert(conn, documents)
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO legacy_imports (filename) VALUES (?)", [(name,) for name in batch])
+            count += len(documents)
+        return count
+
+    def get(self, doc_id, with_rules=True):
+        """One document record, or None"""
+        conn = self._connection()
+        row = conn.execute(f"{self._SELECT} WHERE id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return None
+        document = self._record(row)
+        if with_rules:
+            document['rules'] = self.rules(doc_id)
+        return document
+
+    def list(self, city=None):
+        """
+        Document records (without rules), oldest first. A city matches exactly,
+        or failing that case-insensitively ignoring spaces and underscores.
+        """
+        conn = self._connection()
+        if not city:
+            rows = conn.execute(f"{self._SELECT} ORDER BY processed_at").fetchall()
+        else:
+            rows = conn.execute(f"{self._SELECT} WHERE city = ? ORDER BY processed_at", (city,)).fetchall()
+            if not rows:
+                rows = conn.execute(
+                    f"{self._SELECT} WHERE city_key = ? ORDER BY processed_at", (city_key(city),)
+                ).fetchall()
+        return [self._record(row) for row in rows]
+
+    def rules(self, doc_id):
+        row = self._connection().execute(
+            "SELECT rules FROM document_rules WHERE document_id = ?", (doc_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def iter_rules(self):
+        """Rules of every document, one document at a time"""
+        for (rules,) in self._connection().execute("SELECT rules FROM document_rules"):
+            yield from json.loads(rules)
+
+    def find_by_hash(self, content_hash, city):
+        row = self._connection().execute(
+            f"{self._SELECT} WHERE content_hash = ? AND city = ? LIMIT 1", (content_hash, city)
+        ).fetchone()
+        return self.get(row[0]) if row else None
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def city_stats(self):
+        """{city: {'documents': n, 'total_rules': m}}"""
+        rows = self._connection().execute(
+            "SELECT city, COUNT(*), SUM(rules_count) FROM documents GROUP BY city"
+        ).fetchall()
+        return {city: {'documents': docs, 'total_rules': rules or 0} for city, docs, rules in rows}
+
+    def delete(self, doc_id):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            conn.execute("DELETE FROM document_rules WHERE document_id = ?", (doc_id,))
@@ -6,13 +6,27 @@ import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestRegressor
 
+import mmap_artifacts
+from metrics import timed
+from model_registry import ModelArtifacts
+from tree_inference import CompiledForestRegressor
+
 
 class FloodPredictor:
+    # Climate change assumptions for the future risk horizons
+    FUTURE_SCENARIOS = [
+        {'years': 5, 'rainfall_increase': 1.05, 'elevation_decrease': 0.5},
+        {'years': 10, 'rainfall_increase': 1.10, 'elevation_decrease': 1.0},
+        {'years': 20, 'rainfall_increase': 1.20, 'elevation_decrease': 2.0}
+    ]
+
     def __init__(self):
-        self.model = None
+        self.model = None  # Compiled forest; the sklearn regressor is only kept in the artifact
+        self.version = None
         self.is_trained = False
-        # Use absolute path for model storage so joblib load/save is unambiguous
-        self.model_path = os.path.join(os.getcwd(), 'models', 'flood_model.pkl')
+        # Versioned array artifacts in MODEL_DIR (flood_model-<version>/) behind a
+        # pointer file; flood_model.pkl from before array artifacts is converted on first load
+        self.artifacts = ModelArtifacts('flood_model')
 
     def train_mock_model(self):
         """Train a Random Forest model on synthetic data"""
@@ -54,44 +68,77 @@ class FloodPredictor:
         X = df[['rainfall', 'temperature', 'humidity', 'pressure', 'elevation']]
         y = df[['risk', 'depth']] # Multi-output regression
         
-        self.model = RandomForestRegressor(n_estimators=100, random_state=42)
-        self.model.fit(X, y)
-        
-        self.is_trained = True
+        regressor = RandomForestRegressor(n_estimators=100, random_state=42)
+        regressor.fit(X, y)
         
         # Save model
-        os.makedirs('models', exist_ok=True)
-        joblib.dump(self.model, self.model_path)
+        self._save(regressor)
         print("✅ Flood Model Trained and Saved")
 
+    def _save(self, regressor):
+        """
+        Write the regressor as a new memory-mapped array artifact, serve it and
+        publish it. Workers training at once each write their own version; the
+        last one published is what the next worker to start loads.
+        """
+        version = self.artifacts.new_version()
+        path = self.artifacts.path_for(version)
+        mmap_artifacts.write(
+            path,
+            CompiledForestRegressor(regressor).to_arrays(),
+            metadata={'features': ['rainfall', 'temperature', 'humidity', 'pressure', 'elevation'], 'outputs': ['risk', 'depth']},
+            version=version,
+            files={'estimator.pkl': lambda pkl_path: joblib.dump(regressor, pkl_path)}
+        )
+        # Mapped before publishing, so pruning by another worker can't remove it first
+        self._load_artifact(path)
+        self.artifacts.publish(version)
+
+    def _load_artifact(self, path):
+        arrays, manifest = mmap_artifacts.read(path)
+        self.model = CompiledForestRegressor.from_arrays(arrays)
+        self.version = manifest['version']
+        self.is_trained = True
+
     def load_model(self):
-        """Load model from disk using joblib. If missing, train a mock model and save it."""
+        """
+        Map the current flood model artifact. A pickle from before array
+        artifacts is converted once; if there is neither, a mock model is
+        trained and saved.
+        """
+        current = self.artifacts.current()
+        path = current[1] if current else self.artifacts.legacy_path
         try:
-            if os.path.exists(self.model_path):
-                self.model = joblib.load(self.model_path)
-                self.is_trained = True
-                print(f"✅ Loaded existing flood model from {self.model_path}")
+            if mmap_artifacts.is_artifact(path):
+                self._load_artifact(path)
+                print(f"✅ Loaded existing flood model from {path}")
+                return
+            if path.endswith('.pkl') and os.path.exists(path):
+                self._save(joblib.load(path))
+                print(f"✅ Converted flood model {path} to {self.artifacts.path_for(self.version)}")
                 return
         except Exception as e:
-            print(f"⚠️ Failed to load flood model from {self.model_path}: {e}")
+            print(f"⚠️ Failed to load flood model from {path}: {e}")
 
         # If we reach here, model does not exist or failed to load -> train a mock model
         print("⚠️ Flood model not found or corrupted; training a mock model now...")
         self.train_mock_model()
 
-    def predict_flood(self, data, lat=None, lng=None):
-        """
-        Predict flood risk based on input data and location
-        data: dict with rainfall, temperature, humidity, pressure, elevation
-        lat, lng: coordinates for location-specific elevation
-        """
-        # Ensure model is loaded from joblib before predicting
+    def model_identity(self):
+        """Identifies the loaded flood model by its artifact version"""
+        if self.version is None:
+            return 'flood-rf@untrained'
+        return f"flood-rf@{self.version}"
+
+    def _ensure_model(self):
+        """Ensure model is loaded before predicting"""
         if self.model is None:
             self.load_model()
         if self.model is None:
             raise RuntimeError("Flood model is not available for prediction")
-        
-        # Get elevation for specific location if coordinates provided
+
+    def _location_elevation(self, data, lat=None, lng=None):
+        """Get elevation for specific location if coordinates provided"""
         elevation = data.get('elevation', 10)
         if lat is not None and lng is not None:
             # Add location-based variation to elevation
@@ -100,69 +147,22 @@ class FloodPredictor:
             loc_hash = hashlib.md5(f"{lat:.4f}{lng:.4f}".encode()).hexdigest()
             loc_variation = int(loc_hash[:4], 16) % 100 - 50  # -50 to +50m variation
             elevation = max(0, elevation + loc_variation)
-            
-        # Prepare input
-        features = np.array([[
+        return elevation
+
+    def _current_features(self, data, elevation):
+        """Model input row for current conditions"""
+        return [
             data.get('rainfall', 0),
             data.get('temperature', 25),
             data.get('humidity', 50),
             data.get('pressure', 1013),
             elevation
-        ]])
-
-        # Debug: print input features
-        try:
-            print(f"[DEBUG] predict_flood inputs -> lat={lat}, lng={lng}, features={features.tolist()}")
-        except Exception:
-            pass
-
-        prediction = self.model.predict(features)[0]
-
-        # Debug: print raw prediction
-        try:
-            print(f"[DEBUG] predict_flood raw prediction -> {prediction}")
-        except Exception:
-            pass
-
-        risk_score = max(0, min(100, prediction[0]))
-        depth_inches = max(0, prediction[1])
-
-        return {
-            'riskScore': round(risk_score, 2),
-            'riskLevel': self._get_risk_level(risk_score),
-            'description': self._get_risk_description(risk_score),
-            'depthInches': round(depth_inches, 1),
-            'elevation': round(elevation, 1)
-        }
-
-    def predict_future_risk(self, current_data, lat=None, lng=None, city_multiplier=1.0):
-        """
-        Predict flood risk for future scenarios (5, 10, 20 years)
-        Assumes climate change increases rainfall and sea levels (effectively lowering elevation relative to sea)
-        """
-        # Ensure model is loaded from joblib before predicting
-        if self.model is None:
-            self.load_model()
-        if self.model is None:
-            raise RuntimeError("Flood model is not available for future prediction")
-        
-        # Get location-specific elevation
-        elevation = current_data.get('elevation', 10)
-        if lat is not None and lng is not None:
-            import hashlib
-            loc_hash = hashlib.md5(f"{lat:.4f}{lng:.4f}".encode()).hexdigest()
-            loc_variation = int(loc_hash[:4], 16) % 100 - 50
-            elevation = max(0, elevation + loc_variation)
-            
-        scenarios = [
-            {'years': 5, 'rainfall_increase': 1.05, 'elevation_decrease': 0.5},
-            {'years': 10, 'rainfall_increase': 1.10, 'elevation_decrease': 1.0},
-            {'years': 20, 'rainfall_increase': 1.20, 'elevation_decrease': 2.0}
         ]
-        
-        future_predictions = []
-        
-        for scenario in scenarios:
+
+    def _future_features(self, current_data, elevation, lat=None, lng=None):
+        """Model input rows for each of the FUTURE_SCENARIOS"""
+        rows = []
+        for scenario in self.FUTURE_SCENARIOS:
             # Adjust data for scenario
             future_data = current_data.copy()
             # apply base rainfall increase for scenario
@@ -184,42 +184,188 @@ class FloodPredictor:
             future_data['rainfall'] = min(future_data['rainfall'], 300.0)
 
             future_elevation = max(0, elevation - scenario['elevation_decrease'])
-            
-            # Predict
-            features = np.array([[
+
+            rows.append([
                 future_data['rainfall'],
                 future_data.get('temperature', 25) + (scenario['years'] * 0.05), # Slight temp increase
                 future_data.get('humidity', 50),
                 future_data.get('pressure', 1013),
                 future_elevation
-            ]])
+            ])
+        return rows
 
-            # Debug: print scenario and features
-            try:
-                print(f"[DEBUG] predict_future_risk scenario={scenario['years']}y features={features.tolist()} city_multiplier={city_multiplier}")
-            except Exception:
-                pass
+    def _current_result(self, prediction, elevation):
+        risk_score = max(0, min(100, prediction[0]))
+        depth_inches = max(0, prediction[1])
+
+        return {
+            'riskScore': round(risk_score, 2),
+            'riskLevel': self._get_risk_level(risk_score),
+            'description': self._get_risk_description(risk_score),
+            'depthInches': round(depth_inches, 1),
+            'elevation': round(elevation, 1)
+        }
 
-            prediction = self.model.predict(features)[0]
+    def _future_result(self, scenario, prediction, city_multiplier):
+        risk_score = max(0, min(100, prediction[0]))
+        # scale depth by city multiplier so city-specific vulnerability affects future depths
+        depth_inches = max(0, prediction[1] * float(city_multiplier))
 
-            # Debug: print raw prediction for future scenario
-            try:
-                print(f"[DEBUG] predict_future_risk raw prediction -> {prediction}")
-            except Exception:
-                pass
+        return {
+            'year': f"+{scenario['years']} Years",
+            'riskScore': round(risk_score, 3),
+            'riskLevel': self._get_risk_level(risk_score),
+            'depthInches': round(depth_inches, 2)
+        }
 
-            risk_score = max(0, min(100, prediction[0]))
-            # scale depth by city multiplier so city-specific vulnerability affects future depths
-            depth_inches = max(0, prediction[1] * float(city_multiplier))
+    @timed('flood_current')
+    def predict_flood(self, data, lat=None, lng=None):
+        """
+        Predict flood risk based on input data and location
+        data: dict with rainfall, temperature, humidity, pressure, elevation
+        lat, lng: coordinates for location-specific elevation
+        """
+        self._ensure_model()
+        
+        elevation = self._location_elevation(data, lat, lng)
             
-            future_predictions.append({
-                'year': f"+{scenario['years']} Years",
-                'riskScore': round(risk_score, 3),
-                'riskLevel': self._get_risk_level(risk_score),
-                'depthInches': round(depth_inches, 2)
+        # Prepare input
+        features = np.array([self._current_features(data, elevation)])
+
+        # Debug: print input features
+        try:
+            print(f"[DEBUG] predict_flood inputs -> lat={lat}, lng={lng}, features={features.tolist()}")
+        except Exception:
+            pass
+
+        prediction = self.model.predict(features)[0]
+
+        # Debug: print raw prediction
+        try:
+            print(f"[DEBUG] predict_flood raw prediction -> {prediction}")
+        except Exception:
+            pass
+
+        return self._current_result(prediction, elevation)
+
+    @timed('flood_future')
+    def predict_future_risk(self, current_data, lat=None, lng=None, city_multiplier=1.0):
+        """
+        Predict flood risk for future scenarios (5, 10, 20 years)
+        Assumes climate change increases rainfall and sea levels (effectively lowering elevation relative to sea)
+        """
+        self._ensure_model()
+        
+        elevation = self._location_elevation(current_data, lat, lng)
+        features = np.array(self._future_features(current_data, elevation, lat, lng))
+
+        # Debug: print scenario features
+        try:
+            print(f"[DEBUG] predict_future_risk features={features.tolist()} city_multiplier={city_multiplier}")
+        except Exception:
+            pass
+
+        # One model call covers every scenario
+        predictions = self.model.predict(features)
+
+        # Debug: print raw predictions for future scenarios
+        try:
+            print(f"[DEBUG] predict_future_risk raw predictions -> {predictions.tolist()}")
+        except Exception:
+            pass
+
+        return [
+            self._future_result(scenario, prediction, city_multiplier)
+            for scenario, prediction in zip(self.FUTURE_SCENARIOS, predictions)
+        ]
+
+    def _city_weather_data(self, city_climate, season_multiplier):
+        """Use city-specific data with some variation"""
+        return {
+            "rainfall": city_climate['monsoon_rainfall'] * season_multiplier * random.uniform(0.8, 1.2),
+            "temperature": city_climate['avg_temperature'] + random.uniform(-3, 3),
+            "humidity": city_climate['avg_humidity'] + random.uniform(-10, 10),
+            "pressure": city_climate['avg_pressure'] + random.uniform(-5, 5),
+            "elevation": city_climate['avg_elevation']
+        }
+
+    def _apply_city_multiplier(self, flood_risk, city_climate):
+        """Apply city-specific risk multiplier"""
+        adjusted_score = min(100, flood_risk['riskScore'] * city_climate['risk_multiplier'])
+        flood_risk['riskScore'] = round(adjusted_score, 2)
+        flood_risk['riskLevel'] = self._get_risk_level(adjusted_score)
+        flood_risk['description'] = f"{city_climate['name']}: {self._get_risk_description(adjusted_score)}"
+        return flood_risk
+
+    def predict_city_risk(self, city, lat=None, lng=None):
+        """
+        Predict current and future flood risk for a location using the
+        historical climate profile of its city
+        """
+        from city_climate_data import get_city_climate, get_season_adjustment
+
+        city_climate = get_city_climate(city)
+        weather_data = self._city_weather_data(city_climate, get_season_adjustment())
+
+        flood_risk = self._apply_city_multiplier(
+            self.predict_flood(weather_data, lat=lat, lng=lng),
+            city_climate
+        )
+
+        # Include city multiplier so future depths vary by city
+        future_flood_risk = self.predict_future_risk(
+            weather_data,
+            lat=lat,
+            lng=lng,
+            city_multiplier=city_climate.get('risk_multiplier', 1.0)
+        )
+
+        return {
+            'current': flood_risk,
+            'future': future_flood_risk,
+            'city_climate': city_climate
+        }
+
+    @timed('flood_batch')
+    def predict_city_risk_batch(self, city, locations):
+        """
+        Batch version of predict_city_risk for many (lat, lng) locations in one city.
+        Current and future scenarios for every location go through a single model call.
+        """
+        from city_climate_data import get_city_climate, get_season_adjustment
+
+        self._ensure_model()
+        if not locations:
+            return []
+
+        city_climate = get_city_climate(city)
+        season_multiplier = get_season_adjustment()
+        city_multiplier = city_climate.get('risk_multiplier', 1.0)
+        rows_per_location = 1 + len(self.FUTURE_SCENARIOS)
+
+        rows = []
+        elevations = []
+        for lat, lng in locations:
+            weather_data = self._city_weather_data(city_climate, season_multiplier)
+            elevation = self._location_elevation(weather_data, lat, lng)
+            elevations.append(elevation)
+            rows.append(self._current_features(weather_data, elevation))
+            rows.extend(self._future_features(weather_data, elevation, lat, lng))
+
+        predictions = self.model.predict(np.array(rows))
+
+        results = []
+        for i, elevation in enumerate(elevations):
+            block = predictions[i * rows_per_location:(i + 1) * rows_per_location]
+            results.append({
+                'current': self._apply_city_multiplier(self._current_result(block[0], elevation), city_climate),
+                'future': [
+                    self._future_result(scenario, prediction, city_multiplier)
+                    for scenario, prediction in zip(self.FUTURE_SCENARIOS, block[1:])
+                ],
+                'city_climate': city_climate
             })
-            
-        return future_predictions
+        return results
 
     def _get_risk_level(self, score):
         if score < 20: return "Low"
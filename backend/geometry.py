@@ -0,0 +1,100 @@
+from itertools import chain
+
+import numpy as np
+
+# Equirectangular degrees-to-meters factors used across the backend
+METERS_PER_DEGREE_LNG = 111320
+METERS_PER_DEGREE_LAT = 110540
+
+
+def as_coords(polygon):
+    """A polygon's [lng, lat] vertices as an (n, 2) float array; extra ordinates are dropped"""
+    coords = np.asarray(polygon, dtype=np.float64)
+    if coords.ndim != 2 or coords.shape[1] < 2:
+        raise ValueError('Polygon must be a list of [lng, lat] coordinates')
+    return coords[:, :2]
+
+
+def pack(polygons):
+    """
+    (coords, offsets) for many polygons: every vertex in one (n, 2) array,
+    polygon i being coords[offsets[i]:offsets[i + 1]]
+    """
+    offsets = np.zeros(len(polygons) + 1, dtype=np.int64)
+    np.cumsum([len(polygon) for polygon in polygons], out=offsets[1:])
+    vertices = offsets[-1]
+
+    # Plain [lng, lat] pairs are read straight into one buffer, without a
+    # temporary array per polygon
+    if sum(map(len, chain.from_iterable(polygons))) == 2 * vertices:
+        coords = np.fromiter(
+            chain.from_iterable(chain.from_iterable(polygons)), dtype=np.float64, count=2 * vertices
+        ).reshape(-1, 2)
+    else:
+        coords = np.concatenate([as_coords(polygon) for polygon in polygons])
+    return coords, offsets
+
+
+def measure(coords, offsets):
+    """
+    Area (sq m), perimeter (m), compactness (4πA/P²) and area centroid
+    (lng, lat) of every polygon in a packed batch, as arrays, in one pass
+    over the vertices. Polygons may be open or closed. Polygons with no
+    area (fewer than 3 vertices, collinear) get their vertex mean as centroid.
+    """
+    counts = np.diff(offsets)
+    polygon_of = np.repeat(np.arange(len(counts)), counts)
+    n = len(counts)
+
+    # Each vertex's successor, wrapping around to the first vertex of its polygon
+    following = np.arange(1, len(coords) + 1)
+    ends = offsets[1:][counts > 0] - 1
+    following[ends] = offsets[:-1][counts > 0]
+
+    # Relative to each polygon's first vertex, so large coordinates don't cancel out
+    origin = coords[np.repeat(offsets[:-1], counts)] if len(coords) else coords
+    local = (coords - origin) * (METERS_PER_DEGREE_LNG, METERS_PER_DEGREE_LAT)
+    x, y = local[:, 0], local[:, 1]
+    x_next, y_next = x[following], y[following]
+
+    cross = x * y_next - x_next * y
+    signed_area = np.bincount(polygon_of, weights=cross, minlength=n) / 2
+    perimeter = np.bincount(polygon_of, weights=np.hypot(x_next - x, y_next - y), minlength=n)
+    area = np.abs(signed_area)
+
+    has_area = area > 1e-9
+    safe_area = np.where(has_area, signed_area, 1.0)
+    safe_counts = np.maximum(counts, 1)
+    centroid_x = np.where(
+        has_area,
+        np.bincount(polygon_of, weights=(x + x_next) * cross, minlength=n) / (6 * safe_area),
+        np.bincount(polygon_of, weights=x, minlength=n) / safe_counts
+    )
+    centroid_y = np.where(
+        has_area,
+        np.bincount(polygon_of, weights=(y + y_next) * cross, minlength=n) / (6 * safe_area),
+        np.bincount(polygon_of, weights=y, minlength=n) / safe_counts
+    )
+    first = coords[np.minimum(offsets[:-1], max(len(coords) - 1, 0))] if len(coords) else np.zeros((n, 2))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        compactness = np.where(perimeter > 0, 4 * np.pi * area / perimeter ** 2, 0.0)
+
+    return {
+        'area': area,
+        'perimeter': perimeter,
+        'compactness': compactness,
+        'centroid_lng': first[:, 0] + centroid_x / METERS_PER_DEGREE_LNG,
+        'centroid_lat': first[:, 1] + centroid_y / METERS_PER_DEGREE_LAT
+    }
+
+
+def measure_polygons(polygons):
+    """measure() over a list of polygons, as one dict of floats per polygon"""
+    columns = {name: values.tolist() for name, values in measure(*pack(polygons)).items()}
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+
+def measure_polygon(polygon):
+    """measure() of a single polygon, as a dict of floats"""
+    return measure_polygons([polygon])[0]
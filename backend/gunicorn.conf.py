@@ -0,0 +1,23 @@
+# Gunicorn picks this file up automatically from the working directory.
+# It only wires up multiprocess metrics; workers, bind and timeout still come
+# from the command line (Procfile, Dockerfile, render.yaml).
+import os
+import shutil
+
+# Every worker writes its metric samples here and /api/metrics aggregates them
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(os.getcwd(), 'metrics-data'))
+
+
+def on_starting(server):
+    # Samples from a previous run would be aggregated into the new one
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+    except ImportError:
+        pass
@@ -0,0 +1,168 @@
+"""
+Bulk ingestion of zoning documents.
+
+Walks a directory laid out like zoning-documents/<city>/..., processes every
+PDF, DOCX and TXT file on a process pool and writes the results to the
+document store in batches. Completed files are recorded by content hash in a
+manifest, so an interrupted run picks up where it stopped and unchanged files
+are skipped. Bumping RULES_VERSION makes every file eligible again; thanks to
+the extracted-text cache that re-index only re-parses.
+
+Run from the backend directory:
+    python ingest.py zoning-documents
+    python ingest.py path/to/pdfs --city pune --workers 8
+    python ingest.py zoning-documents --segmenter fast
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from document_processor import RULES_VERSION, DocumentProcessor, file_hash
+from sentence_segmenter import SEGMENTERS
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt')
+
+# One DocumentProcessor per pool process
+_worker_processor = None
+
+
+def _init_worker(pdf_workers, segmenter):
+    global _worker_processor
+    _worker_processor = DocumentProcessor(load_existing=False, segmenter=segmenter)
+    # Files are already spread over the pool; don't fan out again per page range
+    _worker_processor.pdf_workers = pdf_workers
+
+
+def _process_file(path, city, doc_id, content_hash):
+    return _worker_processor.process_document(
+        path, city=city, doc_id=doc_id, content_hash=content_hash, save=False
+    )
+
+
+def discover(root, city=None):
+    """(path, city) for every supported file; the city is the first folder under root"""
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        relative = os.path.relpath(dirpath, root)
+        folder_city = city or (relative.split(os.sep)[0] if relative != '.' else None)
+        for filename in sorted(filenames):
+            if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                continue
+            path = os.path.join(dirpath, filename)
+            if folder_city is None:
+                print(f"⚠️ Skipping {path}: not inside a city folder (use --city)")
+                continue
+            found.append((path, folder_city.lower()))
+    return sorted(found)
+
+
+def load_manifest(path, segmenter='punkt'):
+    """(content_hash, city) pairs already ingested with the current RULES_VERSION and segmenter"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interrupted run
+            if entry.get('rules_version') == RULES_VERSION and entry.get('segmenter', 'punkt') == segmenter:
+                done.add((entry['content_hash'], entry['city']))
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-ingest zoning documents into the document store')
+    parser.add_argument('root', help='Directory to walk, e.g. zoning-documents')
+    parser.add_argument('--city', help='City for every file (default: first folder under root)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processes to use')
+    parser.add_argument('--batch-size', type=int, default=20, help='Documents per store write')
+    parser.add_argument('--manifest', default=os.path.join('cache', 'ingest_manifest.jsonl'),
+                        help='File recording completed content hashes')
+    parser.add_argument('--force', action='store_true', help='Ignore the manifest and process everything')
+    parser.add_argument('--segmenter', choices=sorted(SEGMENTERS), default=os.getenv('DOC_SEGMENTER', 'punkt'),
+                        help="Sentence segmenter; 'fast' trades a little rule recall for speed")
+    args = parser.parse_args(argv)
+
+    processor = DocumentProcessor(load_existing=False, segmenter=args.segmenter)
+    done = set() if args.force else load_manifest(args.manifest, args.segmenter)
+
+    # Hash everything first: skips completed files and processes duplicates once
+    queued = {}
+    skipped = 0
+    for path, city in discover(args.root, args.city):
+        content_hash = file_hash(path)
+        if (content_hash, city) in done or (content_hash, city) in queued:
+            skipped += 1
+            continue
+        queued[(content_hash, city)] = path
+
+    total = len(queued)
+    print(f"📂 {total} files to ingest, {skipped} already done or duplicates")
+    if not total:
+        return 0
+
+    os.makedirs(os.path.dirname(args.manifest) or '.', exist_ok=True)
+    started = time.monotonic()
+    completed = failed = 0
+    batch = []
+
+    def flush():
+        processor.add_documents(batch)
+        with open(args.manifest, 'a') as manifest:
+            for doc in batch:
+                manifest.write(json.dumps({
+                    'content_hash': doc['content_hash'],
+                    'city': doc['city'],
+                    'rules_version': RULES_VERSION,
+                    'segmenter': args.segmenter,
+                    'document_id': doc['id'],
+                    'path': doc['storage_path']
+                }) + '\n')
+        batch.clear()
+
+    pdf_workers = processor.pdf_workers if args.workers == 1 else 1
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(pdf_workers, args.segmenter)) as pool:
+        futures = {}
+        for (content_hash, city), path in queued.items():
+            # Re-ingesting known content replaces its record instead of adding a copy
+            existing = processor.find_by_hash(content_hash, city)
+            doc_id = existing['id'] if existing else datetime.now().strftime('%Y%m%d%H%M%S') + content_hash[:6]
+            futures[pool.submit(_process_file, path, city, doc_id, content_hash)] = (path, city)
+
+        for future in as_completed(futures):
+            path, city = futures[future]
+            try:
+                document = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"❌ {path}: {e}")
+                continue
+
+            # Filed under its folder's city, like uploads are under the requested one
+            document['city'] = city
+            document['storage_path'] = path
+            batch.append(document)
+            completed += 1
+            if len(batch) >= args.batch_size:
+                flush()
+
+            elapsed = time.monotonic() - started
+            print(f"📄 [{completed + failed}/{total}] {path}: {len(document['rules'])} rules "
+                  f"({completed / elapsed * 60:.1f} files/min)")
+
+    if batch:
+        flush()
+
+    elapsed = time.monotonic() - started
+    print(f"✅ Ingested {completed} files in {elapsed:.1f}s ({completed / elapsed * 60:.1f} files/min), {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,289 @@
+import atexit
+import json
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sandbox import SandboxedWorker
+
+
+class JobStore:
+    """
+    Status and progress of background jobs.
+
+    Kept in a local SQLite file so a job started by one gunicorn worker can be
+    polled through any other worker, and so pool processes can report progress.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('JOB_STORE_PATH', os.path.join('cache', 'jobs.sqlite3'))
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    progress TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def _connection(self):
+        # sqlite3 connections are not shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def create(self, kind, params=None):
+        """Register a queued job and return its id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, progress, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', ?, '{}', ?, ?)",
+                (job_id, kind, json.dumps(params or {}), now, now)
+            )
+        return job_id
+
+    def update_progress(self, job_id, **progress):
+        """Merge progress fields (pages_done, rules_found, ...) and mark the job running"""
+        conn = self._connection()
+        with conn:
+            # Take the write lock before reading so concurrent updates don't drop fields
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            merged = json.loads(row[0])
+            merged.update(progress)
+            conn.execute(
+                "UPDATE jobs SET status = 'running', progress = ?, updated_at = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (json.dumps(merged), time.time(), job_id)
+            )
+
+    def complete(self, job_id, result):
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'completed', result = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id)
+            )
+
+    def fail(self, job_id, error):
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                (str(error), time.time(), job_id)
+            )
+
+    def get(self, job_id):
+        """Job as a JSON-ready dict, or None if unknown"""
+        row = self._connection().execute(
+            "SELECT id, kind, status, params, progress, result, error, created_at, updated_at "
+            "FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'job_id': row[0],
+            'kind': row[1],
+            'status': row[2],
+            'params': json.loads(row[3]),
+            'progress': json.loads(row[4]),
+            'result': json.loads(row[5]) if row[5] else None,
+            'error': row[6],
+            'created_at': datetime.fromtimestamp(row[7]).isoformat(),
+            'updated_at': datetime.fromtimestamp(row[8]).isoformat()
+        }
+
+
+# One DocumentProcessor per sandboxed process, created on its first job
+_worker_processor = None
+
+
+def _ingest_document(store_path, job_id, filepath, city, doc_id, content_hash):
+    """Runs inside a sandboxed process: extract and parse one document, reporting progress"""
+    global _worker_processor
+    from document_processor import DocumentProcessor
+
+    if _worker_processor is None:
+        # The web process already holds the existing documents; the worker doesn't need them
+        _worker_processor = DocumentProcessor(load_existing=False)
+
+    store = JobStore(store_path)
+    store.update_progress(job_id, stage='processing')
+    return _worker_processor.process_document(
+        filepath,
+        city=city,
+        doc_id=doc_id,
+        content_hash=content_hash,
+        progress=lambda **fields: store.update_progress(job_id, **fields),
+        # on_complete saves it; the record keeps the detected city
+        save=False
+    )
+
+
+class DocumentIngestionQueue:
+    """
+    Runs document extraction in sandboxed worker processes so uploads return
+    immediately, and so a hostile or broken file can only exhaust its own
+    worker's memory, CPU and time limits, never the web process serving
+    reports. on_complete(document, city) runs back in the web process once a
+    document is processed; its return value becomes the job result.
+    """
+
+    def __init__(self, store, on_complete, max_workers=None):
+        self.store = store
+        self.on_complete = on_complete
+        self.max_workers = max_workers or int(os.getenv('INGEST_WORKERS', 2))
+        self._queue = queue.Queue()
+        self._workers = []
+        self._running = {}
+        self._closing = False
+        self._lock = threading.Lock()
+
+    def _start_workers(self):
+        # Started lazily so each gunicorn worker forks its own sandboxes after startup
+        with self._lock:
+            if self._workers:
+                return
+            context = multiprocessing.get_context(os.getenv('INGEST_START_METHOD') or None)
+            for index in range(self.max_workers):
+                worker = SandboxedWorker(mp_context=context)
+                self._workers.append(worker)
+                threading.Thread(target=self._work, args=(worker,), name=f'ingest-{index}', daemon=True).start()
+            atexit.register(self.shutdown)
+
+    def submit(self, filepath, city, content_hash=None):
+        """Queue a document and return the job id"""
+        job_id = self.store.create('ingest', {
+            'filename': os.path.basename(filepath),
+            'city': city
+        })
+        doc_id = datetime.now().strftime('%Y%m%d%H%M%S') + job_id[:6]
+        self._start_workers()
+        self._queue.put((job_id, filepath, city, doc_id, content_hash))
+        return job_id
+
+    def _work(self, worker):
+        while True:
+            job_id, filepath, city, doc_id, content_hash = self._queue.get()
+            self._running[job_id] = worker
+            try:
+                document = worker.run(_ingest_document, self.store.path, job_id, filepath, city, doc_id, content_hash)
+                self.store.complete(job_id, self.on_complete(document, city))
+            except Exception as e:
+                if not self._closing:
+                    print(f"❌ Ingestion job {job_id} failed: {e}")
+                    self.store.fail(job_id, e)
+            finally:
+                self._running.pop(job_id, None)
+
+    def shutdown(self):
+        """Stop the sandboxes; jobs still queued or running are marked failed"""
+        self._closing = True
+        pending = list(self._running)
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait()[0])
+        for job_id in pending:
+            self.store.fail(job_id, 'Server shut down before the document was processed')
+        for worker in self._workers:
+            worker.kill()
+
+
+def _train_zoning_model(store_path, job_id, artifact_path, training_store, city):
+    """Runs inside a sandboxed process: fit a new zoning model and write it to artifact_path"""
+    from zoning_ml_model import ZoningMLModel
+
+    JobStore(store_path).update_progress(job_id, stage='training')
+    return ZoningMLModel().train(training_store, city, path=artifact_path)
+
+
+class ModelTrainingQueue:
+    """
+    Trains zoning models in a sandboxed background process, one at a time, so
+    the web process never blocks on a fit or touches the models it is serving.
+    Each run writes a new versioned artifact of the global or a city's model;
+    on_complete(city, artifacts, version, result) publishes it in the web
+    process and its return value becomes the job result.
+    """
+
+    def __init__(self, store, on_complete):
+        self.store = store
+        self.on_complete = on_complete
+        self._queue = queue.Queue()
+        self._worker = None
+        self._pending = {}  # artifacts pointer path -> job id of the run waiting or in progress
+        self._closing = False
+        self._lock = threading.Lock()
+
+    def _active(self, job_id):
+        job = self.store.get(job_id) if job_id else None
+        return job is not None and job['status'] in ('queued', 'running')
+
+    def submit(self, training_store, artifacts, city=None):
+        """
+        Queue a training run on training_store's samples (a city's, or every
+        city's) and return its job id; a run of the same model already waiting
+        or in progress is reused.
+        """
+        with self._lock:
+            pending = self._pending.get(artifacts.pointer_path)
+            if self._active(pending):
+                return pending
+            version = artifacts.new_version()
+            job_id = self.store.create('train', {'city': city, 'version': version, 'samples': training_store.count(city)})
+            self._pending[artifacts.pointer_path] = job_id
+            if self._worker is None:
+                # A fresh process per run, so a fit's memory goes back to the OS
+                self._worker = SandboxedWorker(
+                    memory_mb=int(os.getenv('TRAIN_MEMORY_LIMIT_MB', 4096)),
+                    cpu_seconds=int(os.getenv('TRAIN_CPU_LIMIT', 1800)),
+                    timeout=float(os.getenv('TRAIN_TIMEOUT', 1800)),
+                    max_tasks=1,
+                    mp_context=multiprocessing.get_context(os.getenv('INGEST_START_METHOD') or None)
+                )
+                threading.Thread(target=self._work, name='train', daemon=True).start()
+                atexit.register(self.shutdown)
+        self._queue.put((job_id, city, artifacts, version, training_store))
+        return job_id
+
+    def _work(self):
+        while True:
+            job_id, city, artifacts, version, training_store = self._queue.get()
+            try:
+                result = self._worker.run(
+                    _train_zoning_model, self.store.path, job_id, artifacts.path_for(version), training_store, city
+                )
+                self.store.complete(job_id, self.on_complete(city, artifacts, version, result))
+            except Exception as e:
+                if not self._closing:
+                    print(f"❌ Training job {job_id} failed: {e}")
+                    self.store.fail(job_id, e)
+
+    def shutdown(self):
+        """Stop the training process; runs still queued or in progress are marked failed"""
+        self._closing = True
+        for job_id in list(self._pending.values()):
+            if self._active(job_id):
+                self.store.fail(job_id, 'Server shut down before training finished')
+        if self._worker is not None:
+            self._worker.kill()
@@ -0,0 +1,69 @@
+import numpy as np
+from scipy.special import expit
+
+ACTIVATIONS = {
+    'relu': lambda x: np.maximum(x, 0),
+    'tanh': np.tanh,
+    'linear': lambda x: x,
+    'sigmoid': expit
+}
+
+
+class LSTMRegressor:
+    """
+    Inference for a Keras Sequential([LSTM(units), Dense(1)]) in plain NumPy,
+    from its exported weights. Computes in float32 like Keras; forecasts
+    match the Keras model's to float32 rounding. Needs no TensorFlow.
+    """
+
+    ARRAYS = ('lstm.kernel', 'lstm.recurrent_kernel', 'lstm.bias', 'dense.kernel', 'dense.bias')
+
+    def __init__(self, arrays, activation='tanh', recurrent_activation='sigmoid'):
+        # Keras gate order along the last axis of the kernels: input, forget, cell, output
+        self.kernel = np.asarray(arrays['lstm.kernel'], dtype=np.float32)
+        self.recurrent_kernel = np.asarray(arrays['lstm.recurrent_kernel'], dtype=np.float32)
+        self.bias = np.asarray(arrays['lstm.bias'], dtype=np.float32)
+        self.dense_kernel = np.asarray(arrays['dense.kernel'], dtype=np.float32)
+        self.dense_bias = np.asarray(arrays['dense.bias'], dtype=np.float32)
+        self.units = self.recurrent_kernel.shape[0]
+        self.activation_name = activation
+        self.recurrent_activation_name = recurrent_activation
+        self.activation = ACTIVATIONS[activation]
+        self.recurrent_activation = ACTIVATIONS[recurrent_activation]
+
+    @classmethod
+    def from_keras(cls, model):
+        """Export the weights of a built Keras LSTM + Dense model"""
+        lstm, dense = model.layers
+        kernel, recurrent_kernel, bias = lstm.get_weights()
+        dense_kernel, dense_bias = dense.get_weights()
+        return cls(
+            dict(zip(cls.ARRAYS, (kernel, recurrent_kernel, bias, dense_kernel, dense_bias))),
+            activation=lstm.activation.__name__,
+            recurrent_activation=lstm.recurrent_activation.__name__
+        )
+
+    def to_arrays(self):
+        return dict(zip(self.ARRAYS, (self.kernel, self.recurrent_kernel, self.bias, self.dense_kernel, self.dense_bias)))
+
+    def project(self, X):
+        """Input contribution to the gates, x @ kernel, for (..., features) inputs"""
+        return np.asarray(X, dtype=np.float32) @ self.kernel
+
+    def predict_projected(self, Z):
+        """Predictions for (batch, steps, 4 * units) projected inputs, shape (batch,)"""
+        u = self.units
+        h = np.zeros((len(Z), u), dtype=np.float32)
+        c = np.zeros((len(Z), u), dtype=np.float32)
+        for t in range(Z.shape[1]):
+            # Summed in the order Keras' LSTM cell sums them
+            z = Z[:, t] + h @ self.recurrent_kernel + self.bias
+            # One call for the input, forget and output gates (the cell slice is unused)
+            gates = self.recurrent_activation(z)
+            c = gates[:, u:2 * u] * c + gates[:, :u] * self.activation(z[:, 2 * u:3 * u])
+            h = gates[:, 3 * u:] * self.activation(c)
+        return (h @ self.dense_kernel + self.dense_bias)[:, 0]
+
+    def predict(self, X):
+        """Predictions for (batch, steps, features) inputs, like model.predict(X)[:, 0]"""
+        return self.predict_projected(self.project(X))
@@ -0,0 +1,137 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                                   CollectorRegistry, Counter, Gauge,
+                                   Histogram, generate_latest, multiprocess)
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    print("⚠️ prometheus_client not installed; /api/metrics is disabled (Server-Timing still works)")
+
+# Stage latencies range from sub-millisecond predicts to multi-second HTTP lookups
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+if PROMETHEUS_AVAILABLE:
+    STAGE_DURATION = Histogram(
+        'urbanform_stage_duration_seconds',
+        'Time spent in each processing stage',
+        ['stage'],
+        buckets=STAGE_BUCKETS
+    )
+    STAGE_OUTCOMES = Counter(
+        'urbanform_report_stage_outcomes_total',
+        'Report stage outcomes (ok, timeout, error, cached)',
+        ['stage', 'status']
+    )
+    REQUEST_DURATION = Histogram(
+        'urbanform_http_request_duration_seconds',
+        'HTTP request latency by endpoint',
+        ['endpoint', 'method'],
+        buckets=STAGE_BUCKETS
+    )
+    REQUESTS = Counter(
+        'urbanform_http_requests_total',
+        'HTTP requests by endpoint and status code',
+        ['endpoint', 'method', 'status']
+    )
+    IN_FLIGHT = Gauge(
+        'urbanform_http_requests_in_flight',
+        'Requests currently being handled, per worker',
+        ['endpoint'],
+        multiprocess_mode='liveall'
+    )
+
+# Stage timings of the current request, for the Server-Timing header.
+# Report stages run on worker threads inside a copy of the request context,
+# so they append to the same list.
+_request_timings = ContextVar('request_timings', default=None)
+
+
+def observe_stage(stage, seconds):
+    """Record one stage duration in the histogram and the current request's timings"""
+    if PROMETHEUS_AVAILABLE:
+        STAGE_DURATION.labels(stage).observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage):
+    """Time a block of work as the given stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def record_stage_outcome(stage, status):
+    if PROMETHEUS_AVAILABLE:
+        STAGE_OUTCOMES.labels(stage, status).inc()
+
+
+def server_timing_header(total_seconds=None):
+    """Server-Timing value for the stages recorded during this request"""
+    totals = {}
+    for stage, seconds in _request_timings.get() or []:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items()]
+    if total_seconds is not None:
+        parts.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ', '.join(parts)
+
+
+def init_app(app):
+    """Per-request timing, Server-Timing headers and request metrics for a Flask app"""
+    from flask import g, request
+
+    def endpoint_label():
+        return request.url_rule.rule if request.url_rule else 'unmatched'
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_started = time.perf_counter()
+        _request_timings.set([])
+        if PROMETHEUS_AVAILABLE:
+            g.in_flight = IN_FLIGHT.labels(endpoint_label())
+            g.in_flight.inc()
+
+    @app.after_request
+    def _add_server_timing(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        response.headers['Server-Timing'] = server_timing_header(elapsed)
+        if PROMETHEUS_AVAILABLE:
+            endpoint = endpoint_label()
+            REQUEST_DURATION.labels(endpoint, request.method).observe(elapsed)
+            REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+        return response
+
+    @app.teardown_request
+    def _finish_request(exc):
+        in_flight = g.pop('in_flight', None)
+        if in_flight is not None:
+            in_flight.dec()
+
+
+def export():
+    """
+    Prometheus exposition of every metric. With PROMETHEUS_MULTIPROC_DIR set
+    (see gunicorn.conf.py) the values of all gunicorn workers are aggregated.
+    Returns (body, content_type), or None when prometheus_client is missing.
+    """
+    if not PROMETHEUS_AVAILABLE:
+        return None
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
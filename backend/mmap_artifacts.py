@@ -0,0 +1,123 @@
+import errno
+import hashlib
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+
+import numpy as np
+
+FORMAT = 'zoning-arrays/1'
+PAGE_SIZE = 4096
+MANIFEST = 'manifest.json'
+ARRAYS = 'arrays.bin'
+
+
+def is_artifact(path):
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def write(path, arrays, metadata=None, version=None, files=None):
+    """
+    Write named numpy arrays as one model artifact directory: arrays.bin holds
+    every array uncompressed, each starting on a page boundary, and
+    manifest.json their dtype, shape and offset plus metadata, the version and
+    a SHA-256 of arrays.bin. files maps extra file names in the directory to
+    callables that write them given a path. The directory is assembled under a
+    temporary name and renamed into place, so readers never see half of one.
+    An artifact is never replaced: path must not exist yet (FileExistsError
+    otherwise). Write each version to its own path and switch to it with a
+    pointer file, as model_registry.ModelArtifacts does.
+    """
+    if os.path.exists(path):
+        raise FileExistsError(f'Model artifact {path} already exists')
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    os.makedirs(tmp_path)
+    try:
+        entries = {}
+        digest = hashlib.sha256()
+        offset = 0
+        with open(os.path.join(tmp_path, ARRAYS), 'wb') as f:
+            for name, array in arrays.items():
+                data = np.ascontiguousarray(array)
+                if data.dtype.hasobject:
+                    raise ValueError(f'Array {name} has dtype {data.dtype}; object arrays cannot be mapped')
+                padding = -offset % PAGE_SIZE
+                for chunk in (b'\0' * padding, data.tobytes()):
+                    f.write(chunk)
+                    digest.update(chunk)
+                offset += padding
+                entries[name] = {'dtype': data.dtype.str, 'shape': list(data.shape), 'offset': offset}
+                offset += data.nbytes
+
+        for name, write_file in (files or {}).items():
+            write_file(os.path.join(tmp_path, name))
+
+        manifest = {
+            'format': FORMAT,
+            'version': version or datetime.now().strftime('%Y%m%d%H%M%S'),
+            'created_at': datetime.now().isoformat(),
+            'size': offset,
+            'sha256': digest.hexdigest(),
+            'arrays': entries,
+            'metadata': metadata or {}
+        }
+        with open(os.path.join(tmp_path, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        try:
+            os.rename(tmp_path, path)
+        except OSError as e:
+            # Another writer got there first; its artifact is left alone
+            if e.errno in (errno.EEXIST, errno.ENOTEMPTY):
+                raise FileExistsError(f'Model artifact {path} already exists') from e
+            raise
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    return manifest
+
+
+def read(path, verify=False):
+    """
+    (arrays, manifest) of an artifact directory. The arrays are read-only
+    views of one np.memmap of arrays.bin, so opening an artifact costs the
+    same whatever its size, and processes mapping the same file share its
+    pages through the OS page cache. verify=True also checks the SHA-256,
+    which reads the whole file. Raises ValueError on a malformed artifact.
+    """
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT:
+        raise ValueError(f"Unsupported model artifact format {manifest.get('format')!r} in {path}")
+
+    arrays_path = os.path.join(path, ARRAYS)
+    size = os.path.getsize(arrays_path)
+    if size != manifest['size']:
+        raise ValueError(f"{arrays_path} is {size} bytes, manifest says {manifest['size']}")
+    if verify:
+        verify_checksum(path, manifest)
+
+    # np.memmap can't map an empty file
+    buffer = np.memmap(arrays_path, dtype=np.uint8, mode='r') if size else np.zeros(0, dtype=np.uint8)
+    arrays = {}
+    for name, entry in manifest['arrays'].items():
+        dtype = np.dtype(entry['dtype'])
+        count = int(np.prod(entry['shape'], dtype=np.int64))
+        start = entry['offset']
+        arrays[name] = buffer[start:start + count * dtype.itemsize].view(dtype).reshape(entry['shape'])
+    return arrays, manifest
+
+
+def verify_checksum(path, manifest=None):
+    """Raise ValueError unless arrays.bin matches the manifest's SHA-256"""
+    if manifest is None:
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+    digest = hashlib.sha256()
+    with open(os.path.join(path, ARRAYS), 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    if digest.hexdigest() != manifest['sha256']:
+        raise ValueError(f'Checksum mismatch in model artifact {path}')
@@ -0,0 +1,227 @@
+import glob
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from document_store import city_dir, city_key
+import mmap_artifacts
+
+
+class ModelArtifacts:
+    """
+    Versioned model artifacts in MODEL_DIR (default models) plus a pointer
+    file naming the current one. Training writes a new artifact (an
+    mmap_artifacts directory) and publishing replaces the pointer with
+    os.replace, so readers find either the old version or the new one, never
+    a half-written model.
+    """
+
+    def __init__(self, name='zoning_model', directory=None, keep=None):
+        self.name = name
+        self.directory = directory or os.getenv('MODEL_DIR', 'models')
+        self.keep = keep if keep is not None else int(os.getenv('MODEL_ARTIFACTS_KEEP', 5))
+        self.pointer_path = os.path.join(self.directory, f'{name}.current')
+        # Unversioned file written before artifacts were versioned
+        self.legacy_path = os.path.join(self.directory, f'{name}.pkl')
+
+    def new_version(self):
+        return datetime.now().strftime('%Y%m%d%H%M%S') + '-' + uuid.uuid4().hex[:6]
+
+    def path_for(self, version):
+        return os.path.join(self.directory, f'{self.name}-{version}')
+
+    def publish(self, version):
+        """Make a written artifact the current one; raises ValueError if its checksum doesn't match"""
+        path = self.path_for(version)
+        if mmap_artifacts.is_artifact(path):
+            # Checked once here, so workers can map it without reading it all
+            mmap_artifacts.verify_checksum(path)
+        tmp_path = f'{self.pointer_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, self.pointer_path)
+        self._prune(version)
+
+    def current(self):
+        """(version, path) of the current artifact, or None if there is none"""
+        try:
+            with open(self.pointer_path) as f:
+                version = f.read().strip()
+            path = self.path_for(version)
+            # Versions published before array artifacts are pickles
+            if not os.path.exists(path) and os.path.exists(path + '.pkl'):
+                path += '.pkl'
+            return version, path
+        except OSError:
+            pass
+        if os.path.exists(self.legacy_path):
+            return None, self.legacy_path
+        return None
+
+    def signature(self):
+        """Changes whenever a new version is published"""
+        for path in (self.pointer_path, self.legacy_path):
+            try:
+                stat = os.stat(path)
+                # os.replace gives each published pointer a new inode, even within one mtime tick
+                return path, stat.st_ino, stat.st_mtime_ns, stat.st_size
+            except OSError:
+                continue
+        return None
+
+    def _prune(self, current_version):
+        # Keep the newest few so a request still loading an older one isn't cut off
+        paths = [
+            path for path in glob.glob(os.path.join(self.directory, f'{self.name}-*'))
+            if not path.endswith('.tmp') and path != self.path_for(current_version)
+        ]
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:-self.keep or None]:
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+class ServingModel:
+    """
+    The model predictions are served from. A published version is loaded into
+    a fresh instance and swapped in with a single reference assignment
+    (read-copy-update): a request that already took the old instance from
+    current() finishes with it, and the old instance is never modified.
+    Every worker notices the new pointer on its next call to current().
+    """
+
+    def __init__(self, artifacts, factory):
+        self.artifacts = artifacts
+        self.factory = factory
+        self._model = factory()
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        """The model to use for a whole request"""
+        signature = self.artifacts.signature()
+        if signature != self._signature:
+            self._reload(signature)
+        return self._model
+
+    def _reload(self, signature):
+        with self._lock:
+            if signature == self._signature:
+                return
+            current = self.artifacts.current()
+            if current is None:
+                self._signature = signature
+                return
+            version, path = current
+            try:
+                model = self.factory()
+                model.load_model(path)
+            except Exception as e:
+                # Keep serving the previous model; retried once the pointer changes again
+                print(f"⚠️ Could not load model {path}: {e}")
+                self._signature = signature
+                return
+
+            self._model = model
+            self._signature = signature
+            print(f"✅ Serving zoning model {version or path}")
+
+
+class CityModelRegistry:
+    """
+    Zoning models per city. A city's model is trained on the labelled samples
+    stored for that city in the training_store.TrainingStore (never padded with
+    synthetic data) and kept as its own versioned artifacts under
+    MODEL_DIR/cities/<city>.
+    It is loaded on the city's first request and kept in an LRU; the least
+    recently used ones are evicted beyond CITY_MODEL_MEMORY_MB (default 256).
+    Cities without a model of their own are served by the global model.
+    """
+
+    def __init__(self, factory, directory=None, memory_budget_mb=None):
+        self.factory = factory
+        self.directory = directory or os.getenv('MODEL_DIR', 'models')
+        if memory_budget_mb is None:
+            memory_budget_mb = int(os.getenv('CITY_MODEL_MEMORY_MB', 256))
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.global_model = ServingModel(ModelArtifacts(directory=self.directory), factory)
+        self._models = OrderedDict()  # city key -> (signature, model or None if it failed to load, bytes)
+        self._lock = threading.Lock()
+
+    @property
+    def artifacts(self):
+        return self.global_model.artifacts
+
+    def artifacts_for(self, city=None):
+        """Artifacts of a city's model, or of the global one"""
+        if not city:
+            return self.artifacts
+        # Raises ValueError for a city that is no plain slug, so no artifact is written outside MODEL_DIR
+        return ModelArtifacts(directory=city_dir(os.path.join(self.directory, 'cities'), city))
+
+    def current(self, city=None):
+        """The model to use for a whole request about city"""
+        if not city:
+            return self.global_model.current()
+        try:
+            artifacts = self.artifacts_for(city)
+        except ValueError:
+            # No model can be stored for it
+            return self.global_model.current()
+        signature = artifacts.signature()
+        if signature is None:
+            return self.global_model.current()
+
+        key = city_key(city)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None and entry[0] == signature:
+                self._models.move_to_end(key)
+            else:
+                entry = self._load(key, artifacts, signature)
+        return entry[1] if entry[1] is not None else self.global_model.current()
+
+    def _load(self, key, artifacts, signature):
+        # Called with the lock held; a new version replaces the entry, requests holding the old one keep it
+        version, path = artifacts.current()
+        try:
+            model = self.factory()
+            model.load_model(path)
+            size = model.compiled.nbytes if model.compiled is not None else 0
+            if os.path.isfile(path):
+                # A pickle also keeps its sklearn estimators in memory
+                size += os.path.getsize(path)
+            print(f"✅ Loaded zoning model {version} for {key} ({size / 1024 / 1024:.1f} MB)")
+        except Exception as e:
+            # Served by the global model until a new version is published
+            print(f"⚠️ Could not load zoning model {path}: {e}")
+            model, size = None, 0
+        entry = (signature, model, size)
+        self._models[key] = entry
+        self._models.move_to_end(key)
+        self._evict(keep=key)
+        return entry
+
+    def _evict(self, keep):
+        while sum(entry[2] for entry in self._models.values()) > self.memory_budget:
+            oldest = next(iter(self._models))
+            if oldest == keep:
+                break
+            self._models.pop(oldest)
+            print(f"♻️ Evicted zoning model for {oldest}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': list(self._models),
+                'memory_mb': round(sum(entry[2] for entry in self._models.values()) / 1024 / 1024, 2),
+                'memory_budget_mb': self.memory_budget // (1024 * 1024)
+            }
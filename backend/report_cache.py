@@ -0,0 +1,253 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+# How long each report section stays fresh (seconds)
+DEFAULT_SECTION_TTLS = {
+    'amenities': 3 * 24 * 3600,
+    'roadCondition': 7 * 24 * 3600,
+    'floodRisk': 24 * 3600,
+    'aqiForecast': 6 * 3600,
+    'zoning': 7 * 24 * 3600
+}
+
+
+def json_default(value):
+    """numpy scalars and arrays sneak into model outputs"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def normalize_polygon(polygon, precision=7):
+    """
+    Canonical form of a polygon ring: rounded coordinates, no closing vertex,
+    counter-clockwise, starting at the smallest vertex. Equivalent drawings of
+    the same parcel map to the same ring.
+    """
+    ring = [(round(float(p[0]), precision), round(float(p[1]), precision)) for p in polygon]
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring = ring[:-1]
+
+    signed_area = sum(
+        ring[i][0] * ring[(i + 1) % len(ring)][1] - ring[(i + 1) % len(ring)][0] * ring[i][1]
+        for i in range(len(ring))
+    )
+    if signed_area < 0:
+        ring.reverse()
+
+    if ring:
+        start = ring.index(min(ring))
+        ring = ring[start:] + ring[:start]
+    return ring
+
+
+def polygon_hash(polygon):
+    """Content hash of the normalized polygon"""
+    return hashlib.sha256(json.dumps(normalize_polygon(polygon)).encode()).hexdigest()
+
+
+class ReportCache:
+    """
+    Content-addressed cache for report sections.
+
+    Entries live in a local SQLite file so every gunicorn worker shares them.
+    Each section has its own TTL, least recently used entries are evicted once
+    the cache grows past max_entries, and hit/miss counters are kept per section.
+
+    Lookups only read. Access times and counters are buffered per process and
+    written in one transaction at most every flush_interval seconds
+    (REPORT_CACHE_FLUSH_SECONDS, default 5), and eviction runs on the same
+    schedule from set_sections, so hits never queue up on the write lock. The
+    cache may exceed max_entries by what is inserted in between.
+    """
+
+    def __init__(self, path=None, max_entries=None, section_ttls=None, flush_interval=None):
+        self.path = path or os.getenv('REPORT_CACHE_PATH', os.path.join('cache', 'report_cache.sqlite3'))
+        self.max_entries = max_entries or int(os.getenv('REPORT_CACHE_MAX_ENTRIES', 20000))
+        if flush_interval is None:
+            flush_interval = float(os.getenv('REPORT_CACHE_FLUSH_SECONDS', 5))
+        self.flush_interval = flush_interval
+        self.section_ttls = dict(DEFAULT_SECTION_TTLS)
+        for section in self.section_ttls:
+            env_ttl = os.getenv(f'REPORT_CACHE_TTL_{section.upper()}')
+            if env_ttl:
+                self.section_ttls[section] = int(env_ttl)
+        self.section_ttls.update(section_ttls or {})
+        self._local = threading.local()
+        # Pending writes of this process: last access per (key, section), counter increments
+        self._accessed = {}
+        self._counts = Counter()
+        self._pending_lock = threading.Lock()
+        self._last_flush = time.time()
+        self._last_sweep = 0.0
+        atexit.register(self._flush_at_exit)
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT NOT NULL,
+                    section TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (key, section)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _connection(self):
+        # sqlite3 connections are not shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def make_key(self, polygon, city, model_versions, params=None):
+        """
+        Section key from the normalized polygon, the city, the identities of the
+        models involved and the request parameters that change the output
+        """
+        payload = {
+            'polygon': polygon_hash(polygon),
+            'city': city,
+            'models': model_versions,
+            'params': params or {}
+        }
+        return hashlib.sha256(
+            json.dumps(payload, sort_keys=True, default=json_default).encode()
+        ).hexdigest()
+
+    def get_sections(self, keys):
+        """Return {section: value} for the fresh entries among {section: key}"""
+        now = time.time()
+        conn = self._connection()
+        found = {}
+        for section, key in keys.items():
+            row = conn.execute(
+                "SELECT value FROM entries WHERE key = ? AND section = ? AND expires_at > ?",
+                (key, section, now)
+            ).fetchone()
+            if row:
+                found[section] = json.loads(row[0])
+
+        with self._pending_lock:
+            for section in found:
+                self._accessed[(keys[section], section)] = now
+            for section in keys:
+                self._counts[f"{section}.{'hits' if section in found else 'misses'}"] += 1
+            due = now - self._last_flush >= self.flush_interval
+        if due:
+            with conn:
+                self._flush(conn)
+        return found
+
+    def set_sections(self, keys, values):
+        """Store {section: value} under {section: key} with each section's TTL; sections without a key aren't cached"""
+        values = {section: value for section, value in values.items() if section in keys}
+        if not values:
+            return
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, section, value, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (keys[section], section, json.dumps(value, default=json_default),
+                     now + self.section_ttls.get(section, 3600), now)
+                    for section, value in values.items()
+                ]
+            )
+            # Pending access times and counters go out with this write anyway
+            self._flush(conn)
+            if now - self._last_sweep >= self.flush_interval:
+                self._last_sweep = now
+                self._evict(conn)
+
+    def _flush(self, conn):
+        """Write this process' buffered access times and counters (inside a transaction)"""
+        with self._pending_lock:
+            accessed, self._accessed = self._accessed, {}
+            counts, self._counts = self._counts, Counter()
+            self._last_flush = time.time()
+        if not accessed and not counts:
+            return
+        # An entry replaced since keeps its newer access time
+        conn.executemany(
+            "UPDATE entries SET last_access = MAX(last_access, ?) WHERE key = ? AND section = ?",
+            [(accessed_at, key, section) for (key, section), accessed_at in accessed.items()]
+        )
+        for name, amount in counts.items():
+            self._increment(conn, name, amount)
+
+    def _flush_at_exit(self):
+        try:
+            conn = self._connection()
+            with conn:
+                self._flush(conn)
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not write report cache counters: {e}")
+
+    def _evict(self, conn):
+        """Drop expired entries, then the least recently used ones beyond max_entries"""
+        count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            # Evict a little extra so we don't pay for eviction on every sweep
+            overflow += self.max_entries // 10
+            conn.execute(
+                "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY last_access LIMIT ?)",
+                (overflow,)
+            )
+            self._increment(conn, 'evictions', overflow)
+
+    def _increment(self, conn, name, amount=1):
+        conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?",
+            (name, amount, amount)
+        )
+
+    def stats(self):
+        """Hit/miss counters per section plus the current entry count (other workers' may lag by flush_interval)"""
+        conn = self._connection()
+        with conn:
+            self._flush(conn)
+        counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        sections = {}
+        for name, value in counters.items():
+            if '.' in name:
+                section, kind = name.split('.', 1)
+                sections.setdefault(section, {'hits': 0, 'misses': 0})[kind] = value
+        for counts in sections.values():
+            total = counts['hits'] + counts['misses']
+            counts['hitRate'] = round(counts['hits'] / total, 4) if total else 0.0
+        return {
+            'entries': conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+            'maxEntries': self.max_entries,
+            'evictions': counters.get('evictions', 0),
+            'sections': sections,
+            'ttls': self.section_ttls
+        }
+
+    def clear(self):
+        """Remove every entry and reset the counters"""
+        conn = self._connection()
+        with self._pending_lock:
+            self._accessed, self._counts = {}, Counter()
+        with conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM stats")
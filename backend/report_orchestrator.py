@@ -0,0 +1,148 @@
+import contextvars
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import observe_stage, record_stage_outcome
+
+StageResult = namedtuple('StageResult', ['name', 'value', 'status', 'elapsed'])
+
+
+class ReportStage:
+    """
+    One independent unit of report work (an HTTP lookup or a model inference)
+    with its own deadline and a fallback used when it fails or runs late
+    """
+
+    def __init__(self, name, func, timeout, fallback=None):
+        self.name = name
+        self.func = func
+        self.timeout = timeout
+        self.fallback = fallback
+
+    def fallback_value(self):
+        """Build a fresh fallback value so callers can mutate it safely"""
+        return self.fallback() if self.fallback else None
+
+
+class StageRun:
+    """
+    Handle for a set of stages submitted together to the orchestrator. With
+    max_concurrency, at most that many of them occupy pool threads at once
+    (counting expired ones still running); the rest wait their turn. A
+    stage's deadline counts from when a pool thread starts it, or from its
+    submission while it is still queued behind other requests' stages.
+    """
+
+    def __init__(self, executor, stages, max_concurrency=None):
+        self.executor = executor
+        self.started = time.monotonic()
+        self.queued = deque(stages)
+        self.max_concurrency = max_concurrency or max(len(self.queued), 1)
+        self.pending = {}  # future -> (stage, clock)
+        self.abandoned = set()  # expired futures that were already running
+        self._fill()
+
+    def _submit(self, stage):
+        submitted = time.monotonic()
+        started = []
+
+        def run():
+            started.append(time.monotonic())
+            return stage.func()
+
+        # Stages run in a copy of the caller's context so their timings reach its Server-Timing header
+        future = self.executor.submit(contextvars.copy_context().run, run)
+        self.pending[future] = (stage, lambda: started[0] if started else submitted)
+
+    def _fill(self):
+        self.abandoned = {future for future in self.abandoned if not future.done()}
+        while self.queued and len(self.pending) + len(self.abandoned) < self.max_concurrency:
+            self._submit(self.queued.popleft())
+
+    def iter_completed(self):
+        """Yield a StageResult per stage, in the order they finish or expire"""
+        for result in self._iter_completed():
+            # Batch stages are named 'amenities:<index>'; keep metric labels bounded
+            stage = result.name.split(':')[0]
+            observe_stage(f"stage_{stage}", result.elapsed)
+            record_stage_outcome(stage, result.status)
+            yield result
+
+    def _expire(self, stage, elapsed):
+        print(f"⏱️ Report stage '{stage.name}' exceeded {stage.timeout}s, using fallback")
+        return StageResult(stage.name, stage.fallback_value(), 'timeout', elapsed)
+
+    def _iter_completed(self):
+        while self.pending or self.queued:
+            self._fill()
+            now = time.monotonic()
+            for future, (stage, clock) in list(self.pending.items()):
+                if now - clock() >= stage.timeout and not future.done():
+                    del self.pending[future]
+                    if not future.cancel():
+                        # Can't be stopped; it keeps its slot until it returns
+                        self.abandoned.add(future)
+                    yield self._expire(stage, now - clock())
+
+            if not self.pending:
+                if self.queued:
+                    # Every slot is held by expired stages still running; the next stage waits at most its timeout
+                    stage = self.queued[0]
+                    done, _ = wait(self.abandoned, timeout=stage.timeout, return_when=FIRST_COMPLETED)
+                    if not done:
+                        self.queued.popleft()
+                        yield self._expire(stage, stage.timeout)
+                continue
+
+            next_deadline = min(clock() + stage.timeout for stage, clock in self.pending.values())
+            done, _ = wait(
+                list(self.pending) + list(self.abandoned),
+                timeout=max(0.0, next_deadline - time.monotonic()),
+                return_when=FIRST_COMPLETED
+            )
+
+            for future in done:
+                if future not in self.pending:
+                    continue
+                stage, clock = self.pending.pop(future)
+                elapsed = time.monotonic() - clock()
+                try:
+                    yield StageResult(stage.name, future.result(), 'ok', elapsed)
+                except Exception as e:
+                    print(f"⚠️ Report stage '{stage.name}' failed, using fallback: {e}")
+                    yield StageResult(stage.name, stage.fallback_value(), 'error', elapsed)
+
+    def results(self):
+        """Wait for every stage and return {name: StageResult}"""
+        return {result.name: result for result in self.iter_completed()}
+
+
+class ReportOrchestrator:
+    """
+    Runs the independent report stages concurrently on a bounded thread pool,
+    so report latency follows the slowest stage instead of the sum of all of them
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or int(os.getenv('REPORT_MAX_WORKERS', 16))
+        self._executor = None
+
+    @property
+    def executor(self):
+        # Created lazily so each gunicorn worker gets its own pool after fork
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='report-stage'
+            )
+        return self._executor
+
+    def start(self, stages, max_concurrency=None):
+        """Submit the stages, all at once or at most max_concurrency at a time"""
+        return StageRun(self.executor, stages, max_concurrency)
+
+    def run(self, stages, max_concurrency=None):
+        """Run all stages and block until each has finished or expired"""
+        return self.start(stages, max_concurrency).results()
@@ -0,0 +1,64 @@
+import re
+
+# Attribute patterns, compiled once. Each starts with a literal keyword, which
+# lets the regex engine jump straight to candidate positions.
+FAR_PATTERN = re.compile(r'(?:far|fsi)[\s:]*(?:of|is|=)?[\s]*(\d+\.?\d*)')
+HEIGHT_PATTERN = re.compile(r'(?:height|tall)[\s:]*(?:of|is|up to)?[\s]*(\d+)[\s]*(?:m|meter|metre|feet|ft)')
+COVERAGE_PATTERN = re.compile(r'(?:coverage)[\s:]*(?:of|is)?[\s]*(\d+)[\s]*%')
+SETBACK_PATTERN = re.compile(r'(?:setback)[\s:]*(?:of|is)?[\s]*(\d+)[\s]*(?:m|meter|metre|feet|ft)')
+PARKING_PATTERN = re.compile(r'(?:parking)[\s:]*(\d+)[\s]*(?:per|for every|/)[\s]*(\d+)[\s]*(?:sqm|sq\.m|square meter)')
+
+# Every attribute pattern begins with one of these
+TRIGGER_KEYWORDS = ('far', 'fsi', 'height', 'tall', 'coverage', 'setback', 'parking')
+
+
+class RuleExtractor:
+    """
+    Zoning rule parser for single lowercase sentences.
+
+    A rule needs at least one numeric attribute besides the zone type, so
+    sentences without any trigger keyword are rejected with a few substring
+    checks before any regex runs. Most sentences of a bylaw end there.
+    """
+
+    def __init__(self, zone_keywords):
+        self.zone_keywords = tuple(zone_keywords)
+
+    def parse(self, sentence):
+        """Rule dict for the sentence, or None with fewer than two attributes"""
+        if not any(keyword in sentence for keyword in TRIGGER_KEYWORDS):
+            return None
+
+        rule = {}
+
+        # Check for zone type; of several, the last keyword wins
+        for zone_type in self.zone_keywords:
+            if zone_type in sentence:
+                rule['zone_type'] = zone_type.replace('-use', '')
+
+        far_match = FAR_PATTERN.search(sentence)
+        if far_match:
+            rule['far'] = float(far_match.group(1))
+
+        height_match = HEIGHT_PATTERN.search(sentence)
+        if height_match:
+            rule['max_height'] = int(height_match.group(1))
+
+        coverage_match = COVERAGE_PATTERN.search(sentence)
+        if coverage_match:
+            rule['ground_coverage'] = int(coverage_match.group(1))
+
+        setback_match = SETBACK_PATTERN.search(sentence)
+        if setback_match:
+            rule['setback'] = int(setback_match.group(1))
+
+        parking_match = PARKING_PATTERN.search(sentence)
+        if parking_match:
+            rule['parking'] = f"1 per {parking_match.group(2)} sqm"
+
+        # Only return if we found at least 2 pieces of information
+        if len(rule) >= 2:
+            rule['source_sentence'] = sentence
+            return rule
+
+        return None
@@ -0,0 +1,211 @@
+import math
+import re
+import threading
+from bisect import bisect_right
+
+from document_store import city_key
+
+# Interval tables in bylaws are keyed by one of these, named in the table header
+DIMENSIONS = {
+    'road_width': ('road width', 'width of road', 'abutting road'),
+    'plot_area': ('plot area', 'plot size', 'area of plot', 'size of plot')
+}
+
+_NUMBER = r'(\d+(?:\.\d+)?)'
+_UNIT = r'\s*(?:m|mt|mts|sq\.?\s*m|sqm|sq\.?\s*mt)?\.?\s*'
+# Row ranges such as "less than 12.0", "above 12 and up to 18", "12 to 18" or "above 30.0 m"
+_BETWEEN = re.compile(
+    rf'^(?P<above>above|over|more than)?\s*{_NUMBER}{_UNIT}(?:and\s*|&\s*)?(?P<to>up\s*to|upto|to|-)\s*{_NUMBER}{_UNIT}$'
+)
+_BELOW = re.compile(rf'^(?P<below>less than|below|up\s*to|upto)\s*{_NUMBER}{_UNIT}$')
+_ABOVE = re.compile(rf'^(?:above|over|more than)\s*{_NUMBER}{_UNIT}(?:and above)?$')
+# Row values: a coverage percentage and/or an FAR
+_COVERAGE = re.compile(rf'{_NUMBER}\s*%')
+_FAR = re.compile(r'(?<![\d.%])(\d+\.\d+|\d)(?![\d.%])')
+_VALUES_LINE = re.compile(r'^\s*\d+(?:\.\d+)?\s*%?(?:\s+\d+(?:\.\d+)?\s*%?)?\s*$')
+
+
+def _after(value):
+    # Smallest bound above value: makes an inclusive upper or exclusive lower bound half-open
+    return math.nextafter(value, math.inf)
+
+
+def parse_range(line):
+    """
+    Half-open [low, high) bounds for a table row range, or None. "above 12"
+    excludes 12 and "up to 18" includes 18, so "above 12 and up to 18" is
+    (12, 18]; "less than 12" and bare ranges like "12 to 18" exclude their end.
+    """
+    line = line.strip().rstrip(':;,')
+    match = _BETWEEN.match(line)
+    if match:
+        low, high = float(match.group(2)), float(match.group(4))
+        if match.group('above'):
+            low = _after(low)
+        if match.group('to').replace(' ', '') == 'upto':
+            high = _after(high)
+        return low, high
+    match = _BELOW.match(line)
+    if match:
+        high = float(match.group(2))
+        return 0.0, _after(high) if match.group('below').replace(' ', '') == 'upto' else high
+    match = _ABOVE.match(line)
+    if match:
+        return _after(float(match.group(1))), math.inf
+    return None
+
+
+def parse_values(line):
+    """{'ground_coverage': .., 'far': ..} from a table row like "55% 2.25", or None"""
+    # Only numbers: anything else (words, page numbers like "- 4 5 -") isn't a row
+    if not _VALUES_LINE.match(line):
+        return None
+    values = {}
+    coverage = _COVERAGE.search(line)
+    if coverage:
+        values['ground_coverage'] = int(float(coverage.group(1)))
+        line = line[:coverage.start()] + line[coverage.end():]
+    far = _FAR.search(line)
+    if far:
+        values['far'] = float(far.group(1))
+    return values or None
+
+
+def parse_interval_table(sentence):
+    """
+    (dimension, [(low, high, values), ...]) for a road width or plot size table
+    in an extracted sentence, or None. PDF extraction may put a row's values on
+    the line before or after its range; each range is paired with the nearest
+    values line next to it.
+    """
+    positions = {
+        dimension: min((sentence.find(name) for name in names if name in sentence), default=-1)
+        for dimension, names in DIMENSIONS.items()
+    }
+    found = [(position, dimension) for dimension, position in positions.items() if position >= 0]
+    if not found:
+        return None
+    dimension = min(found)[1]
+
+    rows = []
+    pending_range = pending_values = None
+    for line in sentence.split('\n'):
+        interval = parse_range(line)
+        values = None if interval else parse_values(line)
+        if interval:
+            if pending_values:
+                rows.append((interval[0], interval[1], pending_values))
+                pending_values = None
+            else:
+                pending_range = interval
+        elif values:
+            if pending_range:
+                rows.append((pending_range[0], pending_range[1], values))
+                pending_range = None
+            else:
+                pending_values = values
+    return (dimension, rows) if rows else None
+
+
+class IntervalIndex:
+    """
+    Disjoint [start, end) segments over a numeric dimension, each mapped to the
+    entry of the latest added interval covering it. Lookups are one bisect.
+    """
+
+    def __init__(self, intervals):
+        # intervals: (low, high, entry), later ones override earlier ones where they overlap
+        bounds = sorted({bound for low, high, _ in intervals for bound in (low, high)})
+        self.starts = []
+        self.ends = []
+        self.entries = []
+        for start, end in zip(bounds, bounds[1:]):
+            covering = [entry for low, high, entry in intervals if low <= start and end <= high]
+            if covering:
+                self.starts.append(start)
+                self.ends.append(end)
+                self.entries.append(covering[-1])
+
+    def find(self, value):
+        i = bisect_right(self.starts, value) - 1
+        if i >= 0 and value < self.ends[i]:
+            return self.entries[i]
+        return None
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class RuleTable:
+    """
+    Compiled regulation tables of one city: an interval index per
+    (zone type, dimension) built from the rules of its documents.
+    """
+
+    def __init__(self, city, documents):
+        # documents: (document_id, rules) pairs, oldest first, so newer documents win
+        self.city = city
+        intervals = {}
+        for doc_id, rules in documents:
+            for rule in rules:
+                table = parse_interval_table(rule.get('source_sentence', ''))
+                if table is None:
+                    continue
+                dimension, rows = table
+                key = (rule.get('zone_type'), dimension)
+                for low, high, values in rows:
+                    # Shown as the numbers in the bylaw, without the half-open adjustment
+                    entry = dict(values, zone_type=rule.get('zone_type'), dimension=dimension,
+                                 range=[round(low, 6), round(high, 6) if high != math.inf else None], document_id=doc_id)
+                    intervals.setdefault(key, []).append((low, high, entry))
+        self.indexes = {key: IntervalIndex(rows) for key, rows in intervals.items()}
+
+    def __len__(self):
+        return sum(len(index) for index in self.indexes.values())
+
+    def lookup(self, zone_type=None, road_width=None, plot_area=None):
+        """
+        Regulation entries matching the parcel, one per dimension given, or []
+        when none applies. Without a zone type, matches must agree on one.
+        """
+        dimensions = {'road_width': road_width, 'plot_area': plot_area}
+        matches = []
+        for (table_zone, dimension), index in self.indexes.items():
+            value = dimensions[dimension]
+            if value is None or (zone_type and table_zone not in (zone_type, None)):
+                continue
+            entry = index.find(value)
+            if entry:
+                matches.append(entry)
+
+        zones = {entry['zone_type'] for entry in matches if entry['zone_type']}
+        if not zone_type and len(zones) > 1:
+            return []
+        return matches
+
+
+class RuleTableCache:
+    """Rule tables per city, rebuilt when the city's documents change"""
+
+    # Documents whose city wasn't detected don't regulate any one city
+    NO_CITY = 'unknown'
+
+    def __init__(self, store):
+        self.store = store
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def get(self, city):
+        """The city's RuleTable, or None for documents without a city"""
+        if city_key(city) == self.NO_CITY:
+            return None
+        documents = self.store.list(city)
+        signature = tuple((doc['id'], doc['processed_at']) for doc in documents)
+        cached = self._tables.get(city)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        table = RuleTable(city, [(doc['id'], self.store.rules(doc['id'])) for doc in documents])
+        with self._lock:
+            self._tables[city] = (signature, table)
+        return table
@@ -0,0 +1,168 @@
+import multiprocessing
+import os
+import signal
+import threading
+
+try:
+    import resource
+except ImportError:  # Windows: only the wall-clock limit applies
+    resource = None
+
+
+def _limit_memory(memory_mb):
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = memory_mb * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _limit_cpu(cpu_seconds):
+    # RLIMIT_CPU counts the whole life of the process, so move it past what earlier tasks used
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    limit = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+
+
+def _worker_main(conn, memory_mb, cpu_seconds, niceness):
+    """
+    Task loop of a sandboxed process: receive (func, args) and send back
+    ('ok', result), ('error', message), or ('fatal', message) before exiting
+    """
+    if hasattr(os, 'setpgrp'):
+        # Own process group, so a kill also reaches the PDF page workers it starts
+        os.setpgrp()
+    if niceness and hasattr(os, 'nice'):
+        os.nice(niceness)
+    if resource is not None and memory_mb:
+        _limit_memory(memory_mb)
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return  # the web process went away
+        if task is None:
+            return
+
+        func, args = task
+        if resource is not None and cpu_seconds:
+            _limit_cpu(cpu_seconds)
+        try:
+            conn.send(('ok', func(*args)))
+        except MemoryError:
+            # Don't reuse a process that ran out of memory
+            conn.send(('fatal', f"Memory limit of {memory_mb} MB exceeded"))
+            return
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+
+class SandboxedWorker:
+    """
+    A child process that runs one task at a time under resource limits:
+    address space (memory_mb) and CPU time (cpu_seconds) per task through
+    rlimits, and a wall-clock timeout after which the process is killed.
+    The process is replaced after max_tasks tasks, or after any failure that
+    may have left it in a bad state. A value of 0 disables a limit.
+    """
+
+    def __init__(self, memory_mb=None, cpu_seconds=None, timeout=None, max_tasks=None, niceness=None,
+                 mp_context=None):
+        self.memory_mb = memory_mb if memory_mb is not None else int(os.getenv('INGEST_MEMORY_LIMIT_MB', 2048))
+        self.cpu_seconds = cpu_seconds if cpu_seconds is not None else int(os.getenv('INGEST_CPU_LIMIT', 300))
+        self.timeout = timeout if timeout is not None else float(os.getenv('INGEST_TIMEOUT', 600))
+        self.max_tasks = max_tasks if max_tasks is not None else int(os.getenv('INGEST_MAX_TASKS_PER_WORKER', 20))
+        self.niceness = niceness if niceness is not None else int(os.getenv('INGEST_NICE', 10))
+        self.mp_context = mp_context or multiprocessing.get_context()
+        self._process = None
+        self._conn = None
+        self._tasks = 0
+        # kill() may come from another thread (shutdown) while run() waits
+        self._lock = threading.Lock()
+
+    def _start(self):
+        parent_conn, child_conn = self.mp_context.Pipe()
+        self._process = self.mp_context.Process(
+            target=_worker_main,
+            args=(child_conn, self.memory_mb, self.cpu_seconds, self.niceness),
+            name='sandboxed-worker'
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        self._tasks = 0
+
+    def run(self, func, *args):
+        """Call func(*args) in the sandbox and return its result; RuntimeError if it fails or hits a limit"""
+        if self._process is None or not self._process.is_alive():
+            self.kill()
+            self._start()
+        process, conn = self._process, self._conn
+
+        self._tasks += 1
+        try:
+            conn.send((func, args))
+            # poll() also returns once the process has died, and recv() then raises EOFError
+            if not conn.poll(self.timeout or None):
+                self.kill()
+                raise RuntimeError(f"Time limit of {self.timeout:g}s exceeded")
+            status, value = conn.recv()
+        except (EOFError, OSError):
+            process.join(1)
+            message = self._describe_exit(process.exitcode)
+            self.kill()
+            raise RuntimeError(message)
+
+        if status != 'ok':
+            if status == 'fatal':
+                self.kill()
+            raise RuntimeError(value)
+        if self.max_tasks and self._tasks >= self.max_tasks:
+            # Recycled to release whatever memory the last tasks leaked
+            self.stop()
+        return value
+
+    def _describe_exit(self, exitcode):
+        if exitcode is not None and exitcode == -getattr(signal, 'SIGXCPU', -1):
+            return f"CPU time limit of {self.cpu_seconds}s exceeded"
+        if exitcode is not None and exitcode == -getattr(signal, 'SIGKILL', -1):
+            return "Worker process was killed (out of memory?)"
+        if exitcode is not None and exitcode < 0:
+            return f"Worker process crashed with signal {-exitcode}"
+        return f"Worker process exited unexpectedly (code {exitcode})"
+
+    def stop(self):
+        """Let the process finish its loop, killing it if it doesn't exit promptly"""
+        process, conn = self._process, self._conn
+        if process is None:
+            return
+        try:
+            conn.send(None)
+        except (OSError, ValueError):
+            pass
+        process.join(5)
+        self.kill()
+
+    def kill(self):
+        """Kill the process and any children it started; safe to call from any thread"""
+        with self._lock:
+            process, conn = self._process, self._conn
+            if process is None:
+                return
+            self._process = self._conn = None
+
+        if process.exitcode != 0:
+            # Also after the process died on a limit: its PDF page workers may still be running
+            if hasattr(os, 'killpg'):
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except OSError:
+                    pass  # group already empty, or killed before it set one up
+            if process.exitcode is None:
+                process.kill()
+        process.join()
+        conn.close()
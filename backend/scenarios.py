@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+
+SQFT_PER_SQM = 10.764
+# Construction cost per sqm of built-up area (INR)
+DEFAULT_COST_PER_SQM = float(os.getenv('BUILD_COST_PER_SQM', 35000))
+
+# Report scenarios: share of the maximum FAR and of the maximum ground coverage used
+PRESETS = [
+    {'name': 'Conservative', 'description': 'Minimum FAR utilization with maximum open space',
+     'far_utilisation': 0.6, 'coverage': 0.75, 'roi': '12-15%'},
+    {'name': 'Moderate', 'description': 'Balanced development with good open space',
+     'far_utilisation': 0.8, 'coverage': 0.9, 'roi': '15-18%'},
+    {'name': 'Maximum', 'description': 'Full FAR utilization for maximum returns',
+     'far_utilisation': 1.0, 'coverage': 1.0, 'roi': '18-22%'}
+]
+
+
+def sweep(plot_area, far_max, coverage_max, far_utilisation, coverage, cost_per_sqm):
+    """
+    Development scenarios for every parcel x FAR utilisation x coverage x
+    cost cell in one broadcast. plot_area (sqm), far_max and coverage_max
+    (share of the plot) are per parcel; far_utilisation and coverage are
+    shares of each parcel's maximum FAR and ground coverage; cost_per_sqm is
+    per sqm of built-up area. Returns (parcels, far_utilisation, coverage,
+    cost_per_sqm) arrays: far, floors, built_area, footprint, open_space
+    (sqm) and cost. Each array is a broadcast view of only the axes it
+    depends on.
+    """
+    area = np.asarray(plot_area, dtype=np.float64)[:, None, None, None]
+    far = np.asarray(far_max, dtype=np.float64)[:, None, None, None] * np.asarray(far_utilisation, dtype=np.float64)[None, :, None, None]
+    footprint = area * np.asarray(coverage_max, dtype=np.float64)[:, None, None, None] * np.asarray(coverage, dtype=np.float64)[None, None, :, None]
+    built_area = area * far
+    with np.errstate(divide='ignore', invalid='ignore'):
+        floors = np.where(footprint > 0, np.maximum(1, np.floor(built_area / footprint)), 1)
+    cost = built_area * np.asarray(cost_per_sqm, dtype=np.float64)[None, None, None, :]
+
+    results = {
+        'far': far,
+        'floors': floors.astype(np.int64),
+        'built_area': built_area,
+        'footprint': footprint,
+        'open_space': area - footprint,
+        'cost': cost
+    }
+    shape = np.broadcast_shapes(*(value.shape for value in results.values()))
+    return {name: np.broadcast_to(value, shape) for name, value in results.items()}
+
+
+def report_columns(grid):
+    """
+    A sweep as report fields (areas in sqft), per parcel one list with an
+    entry per scenario, scenarios in row-major grid order
+    """
+    columns = {
+        'far': np.round(grid['far'], 2),
+        'floors': grid['floors'],
+        'builtArea': np.rint(grid['built_area'] * SQFT_PER_SQM).astype(np.int64),
+        'openSpace': np.rint(grid['open_space'] * SQFT_PER_SQM).astype(np.int64),
+        'estimatedCost': np.rint(grid['cost']).astype(np.int64)
+    }
+    return {name: values.reshape(len(values), -1).tolist() for name, values in columns.items()}
+
+
+def report_scenarios(area, far_max, coverage_max, cost_per_sqm=DEFAULT_COST_PER_SQM):
+    """The PRESETS for one parcel, as report sections list them (areas in sqft)"""
+    shares = [preset['far_utilisation'] for preset in PRESETS]
+    grid = sweep([area], [far_max], [coverage_max], shares, [preset['coverage'] for preset in PRESETS], [cost_per_sqm])
+    # Presets pair the i-th FAR share with the i-th coverage share: the grid's diagonal
+    diagonal = np.arange(len(PRESETS))
+    columns = report_columns({name: values[:, diagonal, diagonal, :] for name, values in grid.items()})
+    return [
+        dict(
+            {'name': preset['name'], 'description': preset['description']},
+            **{name: values[0][i] for name, values in columns.items()},
+            roi=preset['roi']
+        )
+        for i, preset in enumerate(PRESETS)
+    ]
@@ -0,0 +1,220 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+import numpy as np
+from nltk.stem import PorterStemmer
+
+from document_store import city_key
+
+_TERM = re.compile(r'\w+')
+
+# One posting per sentence containing the term
+POSTING = np.dtype([('sentence', '<i8'), ('tf', '<u2'), ('length', '<u2')])
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_stem = lru_cache(maxsize=200000)(PorterStemmer().stem)
+
+
+class SearchIndex:
+    """
+    BM25-ranked inverted index over the sentences of processed documents.
+
+    Postings are stored per (term, city, document) as packed arrays of
+    (sentence id, term frequency, sentence length) in an SQLite file shared by
+    every gunicorn worker. Adding or deleting a document only touches its own
+    rows. A city-scoped query reads that city's postings for the query terms
+    and scores them with a few NumPy operations. Nothing is loaded at startup;
+    the file is memory-mapped and pages are read on demand.
+    """
+
+    def __init__(self, path=None, stop_words=()):
+        self.path = path or os.getenv('SEARCH_INDEX_PATH', os.path.join('data', 'search.sqlite3'))
+        self.mmap_bytes = int(os.getenv('SEARCH_INDEX_MMAP_MB', 256)) * 1024 * 1024
+        self.stop_words = set(stop_words)
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sentences (
+                    id INTEGER PRIMARY KEY,
+                    document_id TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    rule TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sentences_document ON sentences (document_id)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    city_key TEXT NOT NULL,
+                    document_id TEXT NOT NULL,
+                    entries BLOB NOT NULL,
+                    PRIMARY KEY (term, city_key, document_id)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_document ON postings (document_id)")
+            # Sentence counts and lengths, for BM25's collection statistics
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS indexed_documents (
+                    document_id TEXT PRIMARY KEY,
+                    city_key TEXT NOT NULL,
+                    sentences INTEGER NOT NULL,
+                    terms INTEGER NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_indexed_documents_city ON indexed_documents (city_key)")
+
+    def _connection(self):
+        # sqlite3 connections are not shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA mmap_size={self.mmap_bytes}')
+            self._local.conn = conn
+        return conn
+
+    def terms(self, text):
+        """Stemmed index terms of a text, stop words left out"""
+        return [_stem(term) for term in _TERM.findall(text.lower()) if term not in self.stop_words]
+
+    def add(self, document, sentences):
+        """(Re)index a document's sentences under its city"""
+        rules = {rule['source_sentence']: rule for rule in document.get('rules', []) if rule.get('source_sentence')}
+        doc_id = document['id']
+        key = city_key(document.get('city', 'unknown'))
+
+        rows = []
+        postings = defaultdict(list)
+        total_terms = 0
+        conn = self._connection()
+        with conn:
+            # Take the write lock first so sentence ids can be handed out here
+            conn.execute('BEGIN IMMEDIATE')
+            self._delete(conn, doc_id)
+            next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM sentences").fetchone()[0]
+            for sentence in sentences:
+                counts = Counter(self.terms(sentence))
+                if not counts:
+                    continue
+                length = min(sum(counts.values()), 65535)
+                total_terms += length
+                for term, tf in counts.items():
+                    postings[term].append((next_id, min(tf, 65535), length))
+                rule = rules.get(sentence)
+                rows.append((next_id, doc_id, sentence, json.dumps(rule) if rule else None))
+                next_id += 1
+
+            conn.executemany("INSERT INTO sentences (id, document_id, text, rule) VALUES (?, ?, ?, ?)", rows)
+            conn.executemany(
+                "INSERT INTO postings (term, city_key, document_id, entries) VALUES (?, ?, ?, ?)",
+                (
+                    (term, key, doc_id, np.array(entries, dtype=POSTING).tobytes())
+                    for term, entries in postings.items()
+                )
+            )
+            conn.execute(
+                "INSERT INTO indexed_documents (document_id, city_key, sentences, terms) VALUES (?, ?, ?, ?)",
+                (doc_id, key, len(rows), total_terms)
+            )
+
+    def _delete(self, conn, doc_id):
+        conn.execute("DELETE FROM sentences WHERE document_id = ?", (doc_id,))
+        conn.execute("DELETE FROM postings WHERE document_id = ?", (doc_id,))
+        conn.execute("DELETE FROM indexed_documents WHERE document_id = ?", (doc_id,))
+
+    def delete(self, doc_id):
+        conn = self._connection()
+        with conn:
+            self._delete(conn, doc_id)
+
+    def indexed_documents(self):
+        return {row[0] for row in self._connection().execute("SELECT document_id FROM indexed_documents")}
+
+    def search(self, query, city=None, limit=10):
+        """
+        Best matching sentences as dicts with document_id, sentence, score and
+        rule (or None), best first. Any term of the query may match; sentences
+        matching more and rarer terms rank higher.
+        """
+        terms = list(dict.fromkeys(self.terms(query)))
+        if not terms:
+            return []
+
+        conn = self._connection()
+        scope = "WHERE city_key = ?" if city else ""
+        params = (city_key(city),) if city else ()
+        total_sentences, total_terms = conn.execute(
+            f"SELECT COALESCE(SUM(sentences), 0), COALESCE(SUM(terms), 0) FROM indexed_documents {scope}", params
+        ).fetchone()
+        if not total_sentences:
+            return []
+        average_length = total_terms / total_sentences
+
+        sentence_ids = []
+        partial_scores = []
+        for term in terms:
+            if city:
+                blobs = conn.execute(
+                    "SELECT entries FROM postings WHERE term = ? AND city_key = ?", (term, city_key(city))
+                ).fetchall()
+            else:
+                blobs = conn.execute("SELECT entries FROM postings WHERE term = ?", (term,)).fetchall()
+            if not blobs:
+                continue
+            entries = np.frombuffer(b''.join(blob for (blob,) in blobs), dtype=POSTING)
+            idf = math.log(1 + (total_sentences - len(entries) + 0.5) / (len(entries) + 0.5))
+            tf = entries['tf'].astype(np.float64)
+            norm = K1 * (1 - B + B * entries['length'] / average_length)
+            sentence_ids.append(entries['sentence'])
+            partial_scores.append(idf * tf * (K1 + 1) / (tf + norm))
+
+        if not sentence_ids:
+            return []
+        ids, inverse = np.unique(np.concatenate(sentence_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(partial_scores))
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        best = [int(sentence_id) for sentence_id in ids[top]]
+        rows = conn.execute(
+            f"SELECT id, document_id, text, rule FROM sentences WHERE id IN ({','.join('?' * len(best))})", best
+        ).fetchall()
+        by_id = {row[0]: row[1:] for row in rows}
+        return [
+            {
+                'document_id': by_id[sentence_id][0],
+                'sentence': by_id[sentence_id][1],
+                'score': round(float(score), 4),
+                'rule': json.loads(by_id[sentence_id][2]) if by_id[sentence_id][2] else None
+            }
+            for sentence_id, score in zip(best, scores[top])
+            if sentence_id in by_id
+        ]
+
+
+def main():
+    """Index every stored document that isn't in the search index yet"""
+    from document_processor import DocumentProcessor
+
+    processor = DocumentProcessor(load_existing=False)
+    count = processor.reindex_search()
+    print(f"✅ Indexed {count} documents for search")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from document_store import city_key
+import geometry
+
+# Distances are Euclidean in degrees times this, like ZoningMLModel._distance (km)
+KM_PER_DEGREE = 111
+
+
+def load_areas(data):
+    """
+    Area dicts (name, type, value, far, lng, lat) from a GeoJSON
+    FeatureCollection or a list of areas as the frontend sends them in
+    nearby_areas. Polygon features are placed at their area centroid.
+    Raises ValueError on an area without a location or a numeric value.
+    """
+    items = data.get('features', []) if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise ValueError('Expected a GeoJSON FeatureCollection or a list of areas')
+
+    areas = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f'Area {index} is not an object')
+        properties = (item.get('properties') or {}) if item.get('type') == 'Feature' else item
+        try:
+            lng, lat = _location(item)
+            areas.append({
+                'name': properties.get('name') or properties.get('id') or f'area-{index}',
+                'type': properties.get('type', 'residential'),
+                'value': float(properties['value']),
+                'far': float(properties.get('far', 2.0)),
+                'lng': lng,
+                'lat': lat
+            })
+        except (KeyError, TypeError, ValueError, IndexError) as e:
+            raise ValueError(f'Area {index} needs a location and a numeric value ({e})')
+    return areas
+
+
+def _location(item):
+    """(lng, lat) of an area: explicit lng/lat, else its Point or (Multi)Polygon geometry"""
+    if 'lng' in item and 'lat' in item:
+        return float(item['lng']), float(item['lat'])
+    geom = item['geometry']
+    if geom['type'] == 'Point':
+        return float(geom['coordinates'][0]), float(geom['coordinates'][1])
+    ring = geom['coordinates'][0] if geom['type'] == 'Polygon' else geom['coordinates'][0][0]
+    shape = geometry.measure_polygon(ring)
+    return shape['centroid_lng'], shape['centroid_lat']
+
+
+class AreaIndex:
+    """
+    Known areas of one city in KD-trees over their locations: one for all
+    areas and one per zone type, for k-nearest, radius and nearest-of-type
+    queries in O(log n).
+    """
+
+    def __init__(self, areas, version=None):
+        self.areas = areas
+        self.version = version
+        points = np.array([[area['lng'], area['lat']] for area in areas], dtype=np.float64).reshape(-1, 2)
+        self.tree = cKDTree(points)
+        self.type_trees = {}
+        for zone_type in {area['type'] for area in areas}:
+            members = np.array([i for i, area in enumerate(areas) if area['type'] == zone_type])
+            self.type_trees[zone_type] = cKDTree(points[members])
+
+    def __len__(self):
+        return len(self.areas)
+
+    def _with_distance(self, i, distance):
+        return dict(self.areas[i], distance=float(distance) * KM_PER_DEGREE)
+
+    def nearest(self, lng, lat, k=5):
+        """The k nearest areas, closest first, each with its distance (km)"""
+        k = min(k, len(self.areas))
+        if k == 0:
+            return []
+        distances, indices = self.tree.query([lng, lat], k=k)
+        return [self._with_distance(i, d) for d, i in zip(np.atleast_1d(distances), np.atleast_1d(indices))]
+
+    def within(self, lng, lat, radius_km):
+        """Areas within radius_km, closest first"""
+        indices = self.tree.query_ball_point([lng, lat], r=radius_km / KM_PER_DEGREE)
+        distances = np.hypot(*(self.tree.data[indices] - [lng, lat]).T) if indices else []
+        return [self._with_distance(indices[j], distances[j]) for j in np.argsort(distances)]
+
+    def distance_to_type(self, lng, lat, zone_type):
+        """Distance (km) to the nearest area of a zone type, or None if the city has none"""
+        tree = self.type_trees.get(zone_type)
+        if tree is None:
+            return None
+        distance, _ = tree.query([lng, lat])
+        return float(distance) * KM_PER_DEGREE
+
+
+class AreaStore:
+    """
+    Known areas per city, one GeoJSON file each in AREA_DATA_DIR (default
+    data/areas). Indexes are built on first use and rebuilt when the file
+    changes, so an upload through any worker reaches all of them.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.getenv('AREA_DATA_DIR', os.path.join('data', 'areas'))
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _path(self, city):
+        return os.path.join(self.directory, f'{city_key(city)}.geojson')
+
+    def get(self, city):
+        """The city's AreaIndex, or None when no areas are known for it"""
+        path = self._path(city)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        version = f'{stat.st_mtime_ns}-{stat.st_size}'
+        cached = self._indexes.get(path)
+        if cached is not None and cached.version == version:
+            return cached
+
+        with open(path, encoding='utf-8') as f:
+            index = AreaIndex(load_areas(json.load(f)), version)
+        with self._lock:
+            self._indexes[path] = index
+        print(f"🗺️ Indexed {len(index)} known areas for {city}")
+        return index
+
+    def put(self, city, areas):
+        """Replace the city's known areas"""
+        os.makedirs(self.directory, exist_ok=True)
+        collection = {
+            'type': 'FeatureCollection',
+            'features': [
+                {
+                    'type': 'Feature',
+                    'properties': {key: area[key] for key in ('name', 'type', 'value', 'far')},
+                    'geometry': {'type': 'Point', 'coordinates': [area['lng'], area['lat']]}
+                }
+                for area in areas
+            ]
+        }
+        path = self._path(city)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(collection, f)
+        os.replace(tmp_path, path)
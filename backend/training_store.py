@@ -0,0 +1,176 @@
+import glob
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+from document_store import city_dir, is_city_slug
+
+try:
+    import fcntl
+except ImportError:  # Windows: readers take the lock exclusively too
+    fcntl = None
+    import msvcrt
+
+
+def _lock(f, shared, blocking):
+    """Lock an open lock file; returns False if blocking=False and it is held elsewhere"""
+    if fcntl is not None:
+        mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        try:
+            fcntl.flock(f, mode if blocking else mode | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+    while True:
+        try:
+            # LK_LOCK itself retries for about 10 seconds before giving up
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class TrainingStore:
+    """
+    Labelled zoning samples on disk, as append-only columnar partitions per
+    city in TRAINING_DATA_DIR (default data/training): each append is one
+    uncompressed .npz with a float64 feature matrix in the order of the
+    store's feature names, plus zone type and FAR columns. Reads concatenate
+    the partitions into contiguous arrays, so training costs file I/O rather
+    than a Python loop per sample. A city's partitions are merged into one
+    once there are more than TRAINING_STORE_MAX_PARTITIONS (default 64).
+    """
+
+    def __init__(self, feature_names, directory=None, max_partitions=None):
+        self.feature_names = list(feature_names)
+        self.directory = directory or os.getenv('TRAINING_DATA_DIR', os.path.join('data', 'training'))
+        if max_partitions is None:
+            max_partitions = int(os.getenv('TRAINING_STORE_MAX_PARTITIONS', 64))
+        self.max_partitions = max_partitions
+
+    def _city_dir(self, city):
+        # Raises ValueError for a city that is no plain slug, so no path leaves the directory
+        return city_dir(self.directory, city)
+
+    def _partitions(self, city):
+        # Named <time_ns>-<rows>-<id>.npz, so they sort in append order and count without being opened
+        return sorted(glob.glob(os.path.join(self._city_dir(city), '*.npz')))
+
+    @contextmanager
+    def _locked(self, city, shared, blocking=True):
+        """Readers share the city's lock; a merge holds it exclusively so no one reads half-merged partitions"""
+        city_dir = self._city_dir(city)
+        os.makedirs(city_dir, exist_ok=True)
+        with open(os.path.join(city_dir, '.lock'), 'w') as f:
+            if not _lock(f, shared, blocking):
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                _unlock(f)
+
+    def feature_matrix(self, features_list):
+        """Feature dicts as rows in the store's column order; raises ValueError on a missing feature"""
+        try:
+            return np.array(
+                [[float(features[name]) for name in self.feature_names] for features in features_list],
+                dtype=np.float64
+            ).reshape(-1, len(self.feature_names))
+        except KeyError as e:
+            raise ValueError(f'Missing feature {e}')
+
+    def append(self, city, X, zone_types, fars):
+        """Add samples of a city: feature matrix X (in feature_names order), zone types and FARs"""
+        X = np.asarray(X, dtype=np.float64)
+        zone_types = np.asarray(zone_types, dtype=str)
+        fars = np.asarray(fars, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(self.feature_names):
+            raise ValueError(f'Expected {len(self.feature_names)} feature columns')
+        if not len(X) == len(zone_types) == len(fars):
+            raise ValueError('Features, zone types and FARs differ in length')
+        if not len(X):
+            return 0
+
+        city_dir = self._city_dir(city)
+        os.makedirs(city_dir, exist_ok=True)
+        path = os.path.join(city_dir, f'{time.time_ns():020d}-{len(X)}-{uuid.uuid4().hex[:8]}.npz')
+        self._write(path, X, zone_types, fars)
+        if len(self._partitions(city)) > self.max_partitions:
+            self.compact(city, blocking=False)
+        return len(X)
+
+    def _write(self, path, X, zone_types, fars):
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, X=X, zone_type=zone_types, far=fars, feature_names=np.array(self.feature_names))
+        os.replace(tmp_path, path)
+
+    def _load(self, path):
+        with np.load(path, allow_pickle=False) as partition:
+            X = partition['X']
+            names = partition['feature_names'].tolist()
+            if names != self.feature_names:
+                # Written with another feature order or schema: map columns by name
+                try:
+                    X = X[:, [names.index(name) for name in self.feature_names]]
+                except ValueError:
+                    raise ValueError(f'{path} lacks features of the current schema')
+            return X, partition['zone_type'], partition['far']
+
+    def read(self, city=None):
+        """(X, zone_types, fars) of a city's samples, or of every city's, as contiguous arrays"""
+        cities = [city] if city else self.cities()
+        parts = []
+        for name in cities:
+            if not os.path.isdir(self._city_dir(name)):
+                continue
+            with self._locked(name, shared=True):
+                parts.extend(self._load(path) for path in self._partitions(name))
+        if not parts:
+            return np.empty((0, len(self.feature_names))), np.empty(0, dtype=str), np.empty(0)
+        return tuple(np.concatenate(column) for column in zip(*parts))
+
+    def compact(self, city, blocking=True):
+        """Merge a city's partitions into one; skipped if blocking=False and another merge is running"""
+        with self._locked(city, shared=False, blocking=blocking) as locked:
+            if not locked:
+                return
+            paths = self._partitions(city)
+            if len(paths) < 2:
+                return
+            X, zone_types, fars = (np.concatenate(column) for column in zip(*map(self._load, paths)))
+            # Named after the newest merged partition, so it sorts before anything appended since
+            stamp = os.path.basename(paths[-1]).split('-')[0]
+            self._write(os.path.join(self._city_dir(city), f'{stamp}-{len(X)}-{uuid.uuid4().hex[:8]}.npz'), X, zone_types, fars)
+            for path in paths:
+                os.remove(path)
+        print(f"🗜️ Merged {len(paths)} training partitions of {city} ({len(X)} samples)")
+
+    def count(self, city=None):
+        cities = [city] if city else self.cities()
+        return sum(
+            int(os.path.basename(path).split('-')[1])
+            for name in cities for path in self._partitions(name)
+        )
+
+    def cities(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if is_city_slug(name) and os.path.isdir(os.path.join(self.directory, name))
+        )
@@ -0,0 +1,209 @@
+import numpy as np
+
+# Bit patterns of float64 values, mapped so integer order matches numeric order
+_SIGN_FLIP = np.int64(0x7FFFFFFFFFFFFFFF)
+_FLOAT_MAX = np.finfo(np.float64).max
+
+
+def _ordered(values):
+    bits = np.asarray(values, dtype=np.float64).view(np.int64)
+    return bits ^ ((bits >> 63) & _SIGN_FLIP)
+
+
+def _from_ordered(keys):
+    return (keys ^ ((keys >> 63) & _SIGN_FLIP)).view(np.float64)
+
+
+def raw_thresholds(thresholds, mean, scale):
+    """
+    Thresholds on unscaled features equivalent to sklearn's split tests on
+    scaled ones. sklearn compares float32((x - mean) / scale) <= t; that is
+    monotone in x, so the largest float64 x that still goes left is found by
+    bisecting the float64 bit patterns, and x <= that value makes exactly
+    the same decision for every input.
+    """
+    def goes_left(x):
+        with np.errstate(over='ignore', invalid='ignore'):
+            return ((x - mean) / scale).astype(np.float32) <= thresholds
+
+    lo = np.full(len(thresholds), _ordered(-_FLOAT_MAX))
+    hi = np.full(len(thresholds), _ordered(_FLOAT_MAX))
+    # Invariant: lo goes left, hi doesn't (or everything goes left)
+    everything_left = goes_left(_from_ordered(hi))
+    for _ in range(64):
+        mid = (lo >> 1) + (hi >> 1) + (lo & hi & 1)
+        left = goes_left(_from_ordered(mid))
+        lo = np.where(left, mid, lo)
+        hi = np.where(left, hi, mid)
+    return np.where(everything_left, np.inf, _from_ordered(lo))
+
+
+class TreeEnsemble:
+    """
+    Fitted sklearn decision trees as one set of flat node arrays. Leaves point
+    to themselves, so every tree of every row advances one level per step of
+    a fixed number of vectorized steps (the depth of the deepest tree).
+    """
+
+    ARRAYS = ('roots', 'feature', 'children', 'values', 'threshold')
+
+    def __init__(self, trees, leaf_values, scaler=None):
+        # trees: sklearn Tree objects (estimator.tree_); leaf_values: per-tree (node_count, ...) arrays
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+        self.roots = offsets[:-1]
+        self.depth = max(tree.max_depth for tree in trees)
+
+        features, thresholds, left, right = [], [], [], []
+        for tree, offset in zip(trees, offsets):
+            leaf = tree.children_left == -1
+            nodes = np.arange(tree.node_count) + offset
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            left.append(np.where(leaf, nodes, tree.children_left + offset))
+            right.append(np.where(leaf, nodes, tree.children_right + offset))
+        self.feature = np.concatenate(features).astype(np.intp)
+        # Children interleaved, so node n's next node is children[2n + went_right]
+        self.children = np.stack([np.concatenate(left), np.concatenate(right)], axis=1).ravel().astype(np.intp)
+        self.values = np.concatenate(leaf_values)
+
+        thresholds = np.concatenate(thresholds)
+        # Fold the scaler (if any) and sklearn's float32 cast in: split tests run on the raw feature values
+        n_features = int(self.feature.max()) + 1 if len(self.feature) else 0
+        mean, scale = np.zeros(n_features), np.ones(n_features)
+        if scaler is not None:
+            if scaler.mean_ is not None:
+                mean = scaler.mean_
+            if scaler.scale_ is not None:
+                scale = scaler.scale_
+        internal = np.isfinite(thresholds)
+        f = self.feature[internal]
+        thresholds[internal] = raw_thresholds(thresholds[internal], mean[f], scale[f])
+        self.threshold = thresholds
+
+    def to_arrays(self, prefix):
+        """The node arrays, named for mmap_artifacts.write"""
+        arrays = {prefix + name: getattr(self, name) for name in self.ARRAYS}
+        arrays[prefix + 'depth'] = np.array([self.depth], dtype=np.int64)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        """An ensemble over arrays written by to_arrays, used as they are (e.g. memory-mapped)"""
+        ensemble = cls.__new__(cls)
+        for name in cls.ARRAYS:
+            setattr(ensemble, name, arrays[prefix + name])
+        ensemble.depth = int(arrays[prefix + 'depth'][0])
+        return ensemble
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.roots, self.feature, self.threshold, self.children, self.values))
+
+    def leaves(self, X):
+        """(n_rows, n_trees) node index of the leaf each row reaches in each tree"""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        values = X.ravel()
+        row_starts = (np.arange(len(X)) * X.shape[1])[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            went_right = ~(values.take(row_starts + self.feature.take(nodes)) <= self.threshold.take(nodes))
+            nodes = self.children.take(2 * nodes + went_right)
+        return nodes
+
+
+class CompiledZoningModel:
+    """
+    Inference-only form of ZoningMLModel's fitted scaler, random forest
+    classifier and gradient boosting FAR regressor. Labels, probabilities and
+    FAR match sklearn's exactly; one pass per model, no thread pool.
+    """
+
+    def __init__(self, classifier, regressor, scaler):
+        self.classes = classifier.classes_
+
+        # Each tree votes with its leaf's class distribution, normalized as in predict_proba
+        trees = [estimator.tree_ for estimator in classifier.estimators_]
+        distributions = []
+        for tree in trees:
+            values = tree.value[:, 0, :len(self.classes)].astype(np.float64)
+            normalizer = values.sum(axis=1)[:, None]
+            normalizer[normalizer == 0.0] = 1.0
+            distributions.append(values / normalizer)
+        self.forest = TreeEnsemble(trees, distributions, scaler)
+
+        # Boosting stages add learning_rate * leaf value to the initial estimate
+        stages = [estimator.tree_ for estimator in regressor.estimators_[:, 0]]
+        self.boosting = TreeEnsemble(
+            stages, [regressor.learning_rate * tree.value[:, 0, 0] for tree in stages], scaler
+        )
+        self.far_init = float(
+            regressor._raw_predict_init(np.zeros((1, regressor.n_features_in_), dtype=np.float32))[0, 0]
+        )
+
+    @property
+    def nbytes(self):
+        return self.forest.nbytes + self.boosting.nbytes
+
+    def to_arrays(self):
+        arrays = dict(self.forest.to_arrays('forest.'), **self.boosting.to_arrays('boosting.'))
+        arrays['classes'] = np.asarray(self.classes).astype(str)
+        arrays['far_init'] = np.array([self.far_init])
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        model = cls.__new__(cls)
+        model.classes = arrays['classes']
+        model.forest = TreeEnsemble.from_arrays(arrays, 'forest.')
+        model.boosting = TreeEnsemble.from_arrays(arrays, 'boosting.')
+        model.far_init = float(arrays['far_init'][0])
+        return model
+
+    def predict_proba(self, X):
+        votes = self.forest.values[self.forest.leaves(X)]
+        # Accumulated tree by tree, in sklearn's order, so the sums match bit for bit
+        return np.cumsum(votes, axis=1)[:, -1] / votes.shape[1]
+
+    def predict_far(self, X):
+        contributions = self.boosting.values[self.boosting.leaves(X)]
+        raw = np.concatenate([np.full((len(contributions), 1), self.far_init), contributions], axis=1)
+        return np.cumsum(raw, axis=1)[:, -1]
+
+    def predict(self, X):
+        """(zone types, confidences, FARs) for the rows of raw (unscaled) feature matrix X"""
+        proba = self.predict_proba(X)
+        best = np.argmax(proba, axis=1)
+        return self.classes[best], proba[np.arange(len(proba)), best], self.predict_far(X)
+
+
+class CompiledForestRegressor:
+    """
+    Inference-only form of a fitted sklearn RandomForestRegressor (one or more
+    outputs), such as FloodPredictor's. Predictions match sklearn's exactly.
+    """
+
+    def __init__(self, regressor):
+        trees = [estimator.tree_ for estimator in regressor.estimators_]
+        self.n_outputs = regressor.n_outputs_
+        self.forest = TreeEnsemble(trees, [tree.value[:, :, 0].astype(np.float64) for tree in trees])
+
+    @property
+    def nbytes(self):
+        return self.forest.nbytes
+
+    def to_arrays(self):
+        return self.forest.to_arrays('forest.')
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        model = cls.__new__(cls)
+        model.forest = TreeEnsemble.from_arrays(arrays, 'forest.')
+        model.n_outputs = model.forest.values.shape[1]
+        return model
+
+    def predict(self, X):
+        """Like the regressor's predict: (n_rows,) for one output, else (n_rows, n_outputs)"""
+        predictions = self.forest.values[self.forest.leaves(X)]
+        # Summed tree by tree in sklearn's order, then averaged, so results match bit for bit
+        averaged = np.cumsum(predictions, axis=1)[:, -1] / predictions.shape[1]
+        return averaged[:, 0] if self.n_outputs == 1 else averaged
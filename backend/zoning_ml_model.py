@@ -9,12 +9,31 @@ import os
 from datetime import datetime
 import json
 
+import geometry
+import mmap_artifacts
+import scenarios
+from metrics import timed
+from tree_inference import CompiledZoningModel
+
+# Known areas used for the neighbourhood features of a parcel
+NEARBY_AREAS = int(os.getenv('NEARBY_AREAS', 5))
+
 class ZoningMLModel:
     """
     Machine Learning model for zoning regulation prediction
     Uses ensemble methods for classification and regression tasks
     """
     
+    # Feature columns of training samples, in training_store order
+    FEATURE_NAMES = [
+        'area', 'perimeter', 'compactness', 'centroid_lng', 'centroid_lat',
+        'avg_nearby_value', 'nearby_residential_count', 'nearby_commercial_count',
+        'nearby_industrial_count', 'nearby_mixed_count', 'avg_nearby_far', 'dist_to_commercial'
+    ]
+    # Below this many real samples the global model is made up with synthetic (Bangalore) data
+    # and a city model is not trained at all
+    MIN_TRAINING_SAMPLES = 10
+    
     def __init__(self):
         self.classifier = RandomForestClassifier(
             n_estimators=100,
@@ -28,45 +47,30 @@ class ZoningMLModel:
             random_state=42
         )
         self.scaler = StandardScaler()
-        self.training_data = []
-        self.training_data_by_city = {}  # City-specific training data
+        self.compiled = None  # Flat-array form of the fitted models, used for inference
         self.trained = False
         self.model_version = '1.0.0'
+        self.trained_at = None
         self.feature_names = []
         
         # Zoning categories
         self.zone_types = ['residential', 'commercial', 'industrial', 'mixed']
         
-    def add_training_data(self, document_data, city='bangalore'):
-        """Add extracted document data to training set"""
-        # Add city information
-        document_data['city'] = city
-        self.training_data.append(document_data)
-        
-        # Store in city-specific collection
-        if city not in self.training_data_by_city:
-            self.training_data_by_city[city] = []
-        self.training_data_by_city[city].append(document_data)
-        
-        print(f"📚 Added training data for {city}. Total documents: {len(self.training_data_by_city.get(city, []))}")
-        
-    def extract_features(self, polygon, nearby_areas):
-        """Extract features from polygon and surrounding areas"""
-        features = {}
-        
-        # Geometric features
-        area = self._calculate_area(polygon)
-        perimeter = self._calculate_perimeter(polygon)
-        compactness = (4 * np.pi * area) / (perimeter ** 2) if perimeter > 0 else 0
-        
-        features['area'] = area
-        features['perimeter'] = perimeter
-        features['compactness'] = compactness
-        
-        # Centroid
-        centroid = self._get_centroid(polygon)
-        features['centroid_lng'] = centroid[0]
-        features['centroid_lat'] = centroid[1]
+    @timed('feature_extraction')
+    def extract_features(self, polygon, nearby_areas, shape=None, area_index=None):
+        """
+        Extract features from polygon and surrounding areas. shape is the
+        polygon's geometry.measure_polygon() result, when a batch already measured it.
+        With a non-empty spatial_index.AreaIndex of the city, the surrounding
+        areas come from it and the client's nearby_areas are ignored.
+        """
+        if shape is None:
+            shape = geometry.measure_polygon(polygon)
+        features = dict(shape)
+        centroid = [shape['centroid_lng'], shape['centroid_lat']]
+        
+        if area_index:
+            nearby_areas = area_index.nearest(centroid[0], centroid[1], NEARBY_AREAS)
         
         # Nearby area features
         if nearby_areas:
@@ -89,7 +93,11 @@ class ZoningMLModel:
             
             # Distance to nearest commercial/industrial
             commercial_areas = [a for a in nearby_areas if a.get('type') == 'commercial']
-            if commercial_areas:
+            if area_index:
+                # Nearest in the whole city, not just among the k nearest areas
+                min_dist = area_index.distance_to_type(centroid[0], centroid[1], 'commercial')
+                features['dist_to_commercial'] = min_dist if min_dist is not None else 10.0
+            elif commercial_areas:
                 min_dist = min([
                     self._distance(centroid, [a['lng'], a['lat']]) 
                     for a in commercial_areas
@@ -109,25 +117,30 @@ class ZoningMLModel:
         
         return features
     
-    def train(self):
-        """Train the ML model on collected data"""
-        if len(self.training_data) < 10:
+    def train(self, store=None, city=None, path=os.path.join('models', 'zoning_model.pkl')):
+        """
+        Train the ML model on the labelled samples of a training_store.TrainingStore
+        (a city's, or every city's) and save it to path. A city's model is
+        trained on its own samples only; raises ValueError if it has fewer than
+        MIN_TRAINING_SAMPLES.
+        """
+        if store is not None:
+            X, y_zone, y_far = store.read(city)
+        else:
+            X, y_zone, y_far = np.empty((0, len(self.FEATURE_NAMES))), np.empty(0, dtype=str), np.empty(0)
+        real = len(X)
+        synthetic = 0
+        if city and real < self.MIN_TRAINING_SAMPLES:
+            # Synthetic data describes Bangalore, not this city
+            raise ValueError(f'{city} has {real} training samples, at least {self.MIN_TRAINING_SAMPLES} are needed')
+        if real < self.MIN_TRAINING_SAMPLES:
             # Use synthetic data if not enough real data
-            self._generate_synthetic_training_data()
-        
-        # Prepare training data
-        X = []
-        y_zone = []
-        y_far = []
-        
-        for data in self.training_data:
-            features = data['features']
-            X.append(list(features.values()))
-            y_zone.append(data['zone_type'])
-            y_far.append(data['far'])
-        
-        X = np.array(X)
-        self.feature_names = list(self.training_data[0]['features'].keys())
+            synthetic_data = self._generate_synthetic_training_data()
+            synthetic = len(synthetic_data)
+            X = np.vstack([X, [[data['features'][name] for name in self.FEATURE_NAMES] for data in synthetic_data]])
+            y_zone = np.concatenate([y_zone, [data['zone_type'] for data in synthetic_data]])
+            y_far = np.concatenate([y_far, [data['far'] for data in synthetic_data]])
+        self.feature_names = list(self.FEATURE_NAMES)
         
         # Scale features
         X_scaled = self.scaler.fit_transform(X)
@@ -147,18 +160,35 @@ class ZoningMLModel:
         self.far_regressor.fit(X_train_far, y_train_far)
         
         self.trained = True
+        self.trained_at = datetime.now().isoformat()
+        self._compile()
         
         # Save model
-        self.save_model('models/zoning_model.pkl')
+        self.save_model(path)
         
         return {
             'accuracy': float(accuracy),
             'version': self.model_version,
-            'samples': len(self.training_data)
+            'trained_at': self.trained_at,
+            'samples': real + synthetic,
+            'synthetic_samples': synthetic
         }
     
-    def predict(self, features):
-        """Predict zoning attributes for given features"""
+    @timed('zoning_predict')
+    def predict(self, features, rule_table=None, road_width=None, zone_type=None, plot_area=None):
+        """
+        Predict zoning attributes for given features.
+        With the city's rule_table and a zone_type, a parcel covered by an
+        extracted regulation table for the road_width or plot_area the caller
+        gave is answered from it and the models are only the fallback. 'source'
+        says which path answered: 'rule_table', 'ml_model' or 'rule_based'.
+        """
+        if rule_table is not None and zone_type and (road_width is not None or plot_area is not None):
+            regulations = rule_table.lookup(zone_type=zone_type, road_width=road_width, plot_area=plot_area)
+            prediction = self._regulation_prediction(regulations, zone_type)
+            if prediction:
+                return prediction
+        
         if not self.trained:
             # Return rule-based predictions if model not trained
             return self._rule_based_prediction(features)
@@ -166,15 +196,21 @@ class ZoningMLModel:
         # Prepare feature vector
         feature_vector = [features[name] for name in self.feature_names]
         feature_vector = np.array([feature_vector])
-        feature_vector_scaled = self.scaler.transform(feature_vector)
-        
-        # Predict zone type
-        zone_type = self.classifier.predict(feature_vector_scaled)[0]
-        zone_proba = self.classifier.predict_proba(feature_vector_scaled)[0]
-        confidence = float(max(zone_proba))
         
-        # Predict FAR
-        predicted_far = float(self.far_regressor.predict(feature_vector_scaled)[0])
+        if self.compiled is not None:
+            # Zone type, its probability and FAR in one pass over the flat trees
+            zone_types, confidences, predicted_fars = self.compiled.predict(feature_vector)
+            zone_type, confidence, predicted_far = zone_types[0], float(confidences[0]), float(predicted_fars[0])
+        else:
+            feature_vector_scaled = self.scaler.transform(feature_vector)
+            
+            # Predict zone type
+            zone_type = self.classifier.predict(feature_vector_scaled)[0]
+            zone_proba = self.classifier.predict_proba(feature_vector_scaled)[0]
+            confidence = float(max(zone_proba))
+            
+            # Predict FAR
+            predicted_far = float(self.far_regressor.predict(feature_vector_scaled)[0])
         
         # Get zoning attributes based on predicted type
         attributes = self._get_zoning_attributes(zone_type, predicted_far)
@@ -182,27 +218,92 @@ class ZoningMLModel:
         return {
             'attributes': attributes,
             'confidence': confidence,
-            'model_version': self.model_version
+            'model_version': self.model_version,
+            'source': 'ml_model'
         }
     
-    def generate_comprehensive_report(self, polygon, nearby_areas, amenities=None, aqi_forecast=None, lightning_risk=None, road_condition=None, area=None, flood_risk=None):
+    @timed('zoning_predict_batch')
+    def predict_batch(self, features_list):
+        """
+        Predict zoning attributes for many parcels at once.
+        The feature rows are stacked into one matrix so each model runs a single pass.
+        """
+        if not self.trained:
+            return [self._rule_based_prediction(features) for features in features_list]
+        if not features_list:
+            return []
+        
+        X = np.array([[features[name] for name in self.feature_names] for features in features_list])
+        
+        if self.compiled is not None:
+            zone_types, confidences, predicted_fars = self.compiled.predict(X)
+        else:
+            X_scaled = self.scaler.transform(X)
+            
+            # The forest's predicted label is the argmax of its class probabilities
+            zone_proba = self.classifier.predict_proba(X_scaled)
+            zone_types = self.classifier.classes_[np.argmax(zone_proba, axis=1)]
+            confidences = zone_proba.max(axis=1)
+            
+            predicted_fars = self.far_regressor.predict(X_scaled)
+        
+        return [
+            {
+                'attributes': self._get_zoning_attributes(zone_type, float(predicted_far)),
+                'confidence': float(confidence),
+                'model_version': self.model_version,
+                'source': 'ml_model'
+            }
+            for zone_type, confidence, predicted_far in zip(zone_types, confidences, predicted_fars)
+        ]
+    
+    @timed('report_assembly')
+    def generate_comprehensive_report(self, polygon, nearby_areas, amenities=None, aqi_forecast=None, lightning_risk=None, road_condition=None, area=None, flood_risk=None, features=None, predictions=None):
         """Generate full ML-powered report"""
-        # Extract features
-        features = self.extract_features(polygon, nearby_areas)
+        # Extract features (unless the caller already did)
+        if features is None:
+            features = self.extract_features(polygon, nearby_areas)
         
         # Make predictions
-        predictions = self.predict(features)
+        if predictions is None:
+            predictions = self.predict(features)
+        
+        area = self.resolve_area(polygon, area, features)
+        
+        report = self.report_local_sections(polygon, features, predictions, area)
+        report.update(self.report_amenity_sections(
+            predictions['attributes'],
+            area,
+            amenities,
+            report['parcelInfo']['centroid']
+        ))
+        report.update({
+            'aqiForecast': aqi_forecast,
+            'lightningRisk': lightning_risk,
+            'roadCondition': road_condition,
+            'floodRisk': flood_risk if flood_risk else self.default_flood_risk()
+        })
         
-        # Calculate additional metrics
-        # Use provided area (from frontend turf.js) if available, otherwise calculate
+        return report
+    
+    def resolve_area(self, polygon, area=None, features=None):
+        """Use provided area (from frontend turf.js) if available, otherwise calculate"""
         if area is None or area == 0:
-            area = self._calculate_area(polygon)
+            area = features['area'] if features else geometry.measure_polygon(polygon)['area']
             print(f"⚠️ Area calculated by backend: {area:.2f} sqm")
         else:
             print(f"✅ Area provided by frontend: {area:.2f} sqm")
-            
-        centroid = self._get_centroid(polygon)
-        perimeter = self._calculate_perimeter(polygon)
+        return area
+    
+    def report_local_sections(self, polygon, features, predictions, area):
+        """
+        Report sections that only need the parcel geometry and the zoning prediction
+        (parcel info, pricing, zoning details, scenarios), so they can be sent
+        before any external lookup finishes. area must already be resolved.
+        """
+        # Geometry was measured once, during feature extraction
+        centroid = [features['centroid_lng'], features['centroid_lat']]
+        perimeter = features['perimeter']
         
         # Price analysis
         avg_price = features.get('avg_nearby_value', 8500)
@@ -212,23 +313,9 @@ class ZoningMLModel:
             'average': int(avg_price)
         }
         
-        # Amenities (use passed real data or fallback to simulation)
-        if not amenities:
-            amenities = self._find_amenities(centroid)
-        
-        # Buildability score
-        buildability = self._calculate_buildability(predictions['attributes'], area, amenities)
-        
         # Development scenarios
         scenarios = self._generate_scenarios(area, predictions['attributes'])
         
-        # Recommendations
-        recommendations = self._generate_recommendations(
-            predictions['attributes'], 
-            buildability, 
-            amenities
-        )
-        
         # Market trend
         market_trend = {
             'trend': 'rising',
@@ -240,7 +327,7 @@ class ZoningMLModel:
         # Convert area from sq meters to sq feet for price calculation
         area_sqft = area * 10.764
         
-        report = {
+        return {
             'generatedAt': datetime.now().isoformat(),
             'parcelInfo': {
                 'area': int(area),
@@ -258,28 +345,45 @@ class ZoningMLModel:
                 'marketTrend': market_trend
             },
             'zoningDetails': predictions['attributes'],
-            'amenities': amenities,
-            'buildability': buildability,
             'scenarios': scenarios,
-            'mlConfidence': predictions['confidence'],
-            'recommendations': recommendations,
-            'aqiForecast': aqi_forecast,
-            'lightningRisk': lightning_risk,
-            'roadCondition': road_condition,
-            'floodRisk': flood_risk if flood_risk else {
-                'current': {'riskScore': 15, 'riskLevel': 'Low', 'description': 'Minimal flood risk', 'depthInches': 0.5},
-                'future': [
-                    {'year': '+5 Years', 'riskScore': 18, 'riskLevel': 'Low', 'depthInches': 0.8},
-                    {'year': '+10 Years', 'riskScore': 25, 'riskLevel': 'Moderate', 'depthInches': 2.5},
-                    {'year': '+20 Years', 'riskScore': 35, 'riskLevel': 'Moderate', 'depthInches': 4.2}
-                ]
-            }
+            'mlConfidence': predictions['confidence']
         }
+    
+    def report_amenity_sections(self, attributes, area, amenities, centroid):
+        """Report sections that depend on the amenities lookup"""
+        # Amenities (use passed real data or fallback to simulation)
+        if not amenities:
+            amenities = self._find_amenities(centroid)
         
-        return report
+        # Buildability score
+        buildability = self._calculate_buildability(attributes, area, amenities)
+        
+        # Recommendations
+        recommendations = self._generate_recommendations(
+            attributes, 
+            buildability, 
+            amenities
+        )
+        
+        return {
+            'amenities': amenities,
+            'buildability': buildability,
+            'recommendations': recommendations
+        }
+    
+    def default_flood_risk(self):
+        """Flood block used when no flood prediction is available"""
+        return {
+            'current': {'riskScore': 15, 'riskLevel': 'Low', 'description': 'Minimal flood risk', 'depthInches': 0.5},
+            'future': [
+                {'year': '+5 Years', 'riskScore': 18, 'riskLevel': 'Low', 'depthInches': 0.8},
+                {'year': '+10 Years', 'riskScore': 25, 'riskLevel': 'Moderate', 'depthInches': 2.5},
+                {'year': '+20 Years', 'riskScore': 35, 'riskLevel': 'Moderate', 'depthInches': 4.2}
+            ]
+        }
     
     def _generate_synthetic_training_data(self):
-        """Generate synthetic training data for initial model"""
+        """Synthetic training samples for an initial model"""
         synthetic_data = []
         
         for _ in range(100):
@@ -320,7 +424,7 @@ class ZoningMLModel:
                 'far': far
             })
         
-        self.training_data.extend(synthetic_data)
+        return synthetic_data
     
     def _rule_based_prediction(self, features):
         """Fallback rule-based prediction if model not trained"""
@@ -341,11 +445,43 @@ class ZoningMLModel:
         return {
             'attributes': attributes,
             'confidence': 0.75,
-            'model_version': 'rule-based'
+            'model_version': 'rule-based',
+            'source': 'rule_based'
+        }
+    
+    def _regulation_prediction(self, regulations, zone_type):
+        """
+        Prediction for zone_type from its matching regulation table rows, or None.
+        The zone always comes from the caller: a table row's zone is only the
+        last zone keyword seen near it, too weak to override the model.
+        """
+        if not regulations or zone_type not in self.zone_types:
+            return None
+        
+        attributes = self._get_zoning_attributes(zone_type)
+        # Where road width and plot size both apply, the stricter limit holds
+        fars = [r['far'] for r in regulations if 'far' in r]
+        coverages = [r['ground_coverage'] for r in regulations if 'ground_coverage' in r]
+        if fars:
+            attributes['far'] = f"{min(fars):g}"
+            attributes['limits']['far'] = [min(fars), min(fars)]
+        if coverages:
+            attributes['groundCoverage'] = f"{min(coverages)}%"
+            attributes['limits']['groundCoverage'] = [min(coverages) / 100, min(coverages) / 100]
+        
+        return {
+            'attributes': attributes,
+            'confidence': 1.0,
+            'model_version': 'rule-table',
+            'source': 'rule_table',
+            'regulations': regulations
         }
     
     def _get_zoning_attributes(self, zone_type, predicted_far=None):
-        """Get zoning attributes for a given zone type"""
+        """
+        Get zoning attributes for a given zone type. 'limits' holds the ranges
+        as [min, max] numbers, ground coverage as a share of the plot.
+        """
         attributes_map = {
             'residential': {
                 'zoneType': 'residential',
@@ -355,7 +491,8 @@ class ZoningMLModel:
                 'setback': '3m - 6m',
                 'parking': '1 per 100 sqm',
                 'landUse': ['Apartments', 'Villas', 'Gated Communities', 'Row Houses'],
-                'restrictions': ['No commercial activities', 'Noise compliance', 'Green space requirements']
+                'restrictions': ['No commercial activities', 'Noise compliance', 'Green space requirements'],
+                'limits': {'far': [1.5, 2.5], 'groundCoverage': [0.4, 0.6], 'maxHeight': [15, 45], 'setback': [3, 6]}
             },
             'commercial': {
                 'zoneType': 'commercial',
@@ -365,7 +502,8 @@ class ZoningMLModel:
                 'setback': '6m - 9m',
                 'parking': '1 per 50 sqm',
                 'landUse': ['Office Buildings', 'Shopping Malls', 'Retail Stores', 'Business Parks'],
-                'restrictions': ['Fire safety compliance', 'Parking requirements', 'Signage regulations']
+                'restrictions': ['Fire safety compliance', 'Parking requirements', 'Signage regulations'],
+                'limits': {'far': [2.5, 3.5], 'groundCoverage': [0.5, 0.7], 'maxHeight': [45, 60], 'setback': [6, 9]}
             },
             'industrial': {
                 'zoneType': 'industrial',
@@ -375,7 +513,8 @@ class ZoningMLModel:
                 'setback': '9m - 12m',
                 'parking': '1 per 75 sqm',
                 'landUse': ['Factories', 'Warehouses', 'Manufacturing Units', 'Storage Facilities'],
-                'restrictions': ['Environmental clearance', 'No hazardous materials', 'Pollution control']
+                'restrictions': ['Environmental clearance', 'No hazardous materials', 'Pollution control'],
+                'limits': {'far': [1.5, 2.0], 'groundCoverage': [0.6, 0.75], 'maxHeight': [15, 30], 'setback': [9, 12]}
             },
             'mixed': {
                 'zoneType': 'mixed',
@@ -385,43 +524,16 @@ class ZoningMLModel:
                 'setback': '4.5m - 7.5m',
                 'parking': '1 per 65 sqm',
                 'landUse': ['Mixed-use Towers', 'Live-Work Spaces', 'Retail + Apartments', 'Office + Residential'],
-                'restrictions': ['Mixed-use compliance', 'Separate entrances', 'Noise mitigation']
+                'restrictions': ['Mixed-use compliance', 'Separate entrances', 'Noise mitigation'],
+                'limits': {'far': [2.0, 3.0], 'groundCoverage': [0.5, 0.65], 'maxHeight': [30, 50], 'setback': [4.5, 7.5]}
             }
         }
         
         return attributes_map.get(zone_type, attributes_map['residential'])
     
-    def _calculate_area(self, polygon):
-        """Calculate polygon area in square meters"""
-        if len(polygon) < 3:
-            return 0
-        
-        area = 0
-        for i in range(len(polygon)):
-            j = (i + 1) % len(polygon)
-            xi = polygon[i][0] * 111320
-            yi = polygon[i][1] * 110540
-            xj = polygon[j][0] * 111320
-            yj = polygon[j][1] * 110540
-            area += xi * yj - xj * yi
-        
-        return abs(area / 2)
-    
-    def _calculate_perimeter(self, polygon):
-        """Calculate polygon perimeter in meters"""
-        perimeter = 0
-        for i in range(len(polygon)):
-            j = (i + 1) % len(polygon)
-            dx = (polygon[j][0] - polygon[i][0]) * 111320
-            dy = (polygon[j][1] - polygon[i][1]) * 110540
-            perimeter += np.sqrt(dx * dx + dy * dy)
-        return perimeter
-    
-    def _get_centroid(self, polygon):
-        """Calculate polygon centroid"""
-        x = sum(p[0] for p in polygon) / len(polygon)
-        y = sum(p[1] for p in polygon) / len(polygon)
-        return [x, y]
+    def zone_limits(self, zone_type):
+        """Numeric [min, max] FAR, ground coverage, height and setback of a zone type"""
+        return self._get_zoning_attributes(zone_type)['limits']
     
     def _distance(self, point1, point2):
         """Calculate distance between two points"""
@@ -450,6 +562,10 @@ class ZoningMLModel:
             ]
         }
     
+    def _transit_options(self, amenities):
+        """Transit amenities: 'metro' from the simulation, 'transport' from AmenitiesFinder"""
+        return amenities.get('metro') or amenities.get('transport') or []
+    
     def _calculate_buildability(self, attributes, area, amenities):
         """Calculate buildability score"""
         score = 0
@@ -474,7 +590,8 @@ class ZoningMLModel:
             score += 10
             factors.append({'name': 'School Proximity', 'score': 10, 'status': 'good'})
         
-        min_metro = min([m['distance'] for m in amenities['metro']])
+        transit = self._transit_options(amenities)
+        min_metro = min([m['distance'] for m in transit]) if transit else float('inf')
         if min_metro < 2:
             score += 20
             factors.append({'name': 'Metro Access', 'score': 20, 'status': 'excellent'})
@@ -500,86 +617,8 @@ class ZoningMLModel:
     
     def _generate_scenarios(self, area, attributes):
         """Generate development scenarios"""
-        far_range = attributes['far'].split('-')
-        far_max = float(far_range[1].strip())
-        coverage_range = attributes['groundCoverage'].split('-')
-        coverage_max = float(coverage_range[1].strip().replace('%', '')) / 100
-        
-        # Calculate based on FAR: Total Built-up Area = Plot Area × FAR
-        # Ground floor coverage area (maximum allowed footprint)
-        ground_floor_area = area * coverage_max
-        
-        print(f"\n📊 Scenario Calculation Debug:")
-        print(f"Plot Area: {area:.2f} sqm ({area * 10.764:.2f} sqft)")
-        print(f"Max FAR: {far_max}, Max Ground Coverage: {coverage_max * 100}%")
-        print(f"Ground Floor Area: {ground_floor_area:.2f} sqm ({ground_floor_area * 10.764:.2f} sqft)")
-        
-        # Conservative scenario
-        conservative_far = round(far_max * 0.6, 1)
-        conservative_built_area = area * conservative_far
-        conservative_floors = max(1, int(conservative_built_area / ground_floor_area)) if ground_floor_area > 0 else 1
-        
-        print(f"\n🏗️ Conservative: FAR={conservative_far}")
-        print(f"  Built-up Area: {conservative_built_area:.2f} sqm ({conservative_built_area * 10.764:.2f} sqft)")
-        print(f"  Floors: {conservative_floors}")
-        print(f"  Avg Floor Area: {conservative_built_area / conservative_floors:.2f} sqm ({(conservative_built_area / conservative_floors) * 10.764:.2f} sqft)")
-        
-        # Moderate scenario
-        moderate_far = round(far_max * 0.8, 1)
-        moderate_built_area = area * moderate_far
-        moderate_floors = max(1, int(moderate_built_area / ground_floor_area)) if ground_floor_area > 0 else 1
-        
-        print(f"\n🏗️ Moderate: FAR={moderate_far}")
-        print(f"  Built-up Area: {moderate_built_area:.2f} sqm ({moderate_built_area * 10.764:.2f} sqft)")
-        print(f"  Floors: {moderate_floors}")
-        print(f"  Avg Floor Area: {moderate_built_area / moderate_floors:.2f} sqm ({(moderate_built_area / moderate_floors) * 10.764:.2f} sqft)")
-        
-        # Maximum scenario
-        max_built_area = area * far_max
-        max_floors = max(1, int(max_built_area / ground_floor_area)) if ground_floor_area > 0 else 1
-        
-        print(f"\n🏗️ Maximum: FAR={far_max}")
-        print(f"  Built-up Area: {max_built_area:.2f} sqm ({max_built_area * 10.764:.2f} sqft)")
-        print(f"  Floors: {max_floors}")
-        print(f"  Avg Floor Area: {max_built_area / max_floors:.2f} sqm ({(max_built_area / max_floors) * 10.764:.2f} sqft)\n")
-        
-        # Convert to square feet for frontend display (1 sqm = 10.764 sqft)
-        conservative_built_area_sqft = conservative_built_area * 10.764
-        moderate_built_area_sqft = moderate_built_area * 10.764
-        max_built_area_sqft = max_built_area * 10.764
-        
-        return [
-            {
-                'name': 'Conservative',
-                'description': 'Minimum FAR utilization with maximum open space',
-                'far': conservative_far,
-                'floors': conservative_floors,
-                'builtArea': int(conservative_built_area_sqft),
-                'openSpace': int(area * 0.5 * 10.764),
-                'estimatedCost': int(conservative_built_area * 35000),
-                'roi': '12-15%'
-            },
-            {
-                'name': 'Moderate',
-                'description': 'Balanced development with good open space',
-                'far': moderate_far,
-                'floors': moderate_floors,
-                'builtArea': int(moderate_built_area_sqft),
-                'openSpace': int(area * 0.35 * 10.764),
-                'estimatedCost': int(moderate_built_area * 35000),
-                'roi': '15-18%'
-            },
-            {
-                'name': 'Maximum',
-                'description': 'Full FAR utilization for maximum returns',
-                'far': far_max,
-                'floors': max_floors,
-                'builtArea': int(max_built_area_sqft),
-                'openSpace': int(area * 0.25 * 10.764),
-                'estimatedCost': int(max_built_area * 35000),
-                'roi': '18-22%'
-            }
-        ]
+        limits = attributes['limits']
+        return scenarios.report_scenarios(area, limits['far'][1], limits['groundCoverage'][1])
     
     def _generate_recommendations(self, attributes, buildability, amenities):
         """Generate AI recommendations"""
@@ -592,7 +631,8 @@ class ZoningMLModel:
                 'description': 'This site shows strong indicators for development with good zoning compliance and amenity access.'
             })
         
-        if amenities['metro'][0]['distance'] < 1.5:
+        transit = self._transit_options(amenities)
+        if transit and transit[0]['distance'] < 1.5:
             recommendations.append({
                 'type': 'positive',
                 'title': 'Premium Metro Connectivity',
@@ -615,20 +655,51 @@ class ZoningMLModel:
         return recommendations
     
     def save_model(self, filepath):
-        """Save trained model to disk"""
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        """
+        Save trained model to disk. A .pkl path gets a joblib pickle; any other
+        path an mmap_artifacts directory of the compiled node arrays, with the
+        pickle alongside as estimators.pkl (not read when serving).
+        """
+        os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
         model_data = {
             'classifier': self.classifier,
             'far_regressor': self.far_regressor,
             'scaler': self.scaler,
             'feature_names': self.feature_names,
             'model_version': self.model_version,
+            'trained_at': self.trained_at,
             'trained': self.trained
         }
-        joblib.dump(model_data, filepath)
+        if filepath.endswith('.pkl'):
+            joblib.dump(model_data, filepath)
+            return
+        if self.compiled is None:
+            raise ValueError('Only a trained, compiled model can be saved as an array artifact')
+        mmap_artifacts.write(
+            filepath,
+            self.compiled.to_arrays(),
+            metadata={
+                'feature_names': self.feature_names,
+                'model_version': self.model_version,
+                'trained_at': self.trained_at,
+                'trained': self.trained
+            },
+            version=os.path.basename(filepath),
+            files={'estimators.pkl': lambda path: joblib.dump(model_data, path)}
+        )
     
     def load_model(self, filepath):
-        """Load trained model from disk"""
+        """Load trained model from disk: an array artifact is memory-mapped, a .pkl unpickled"""
+        if mmap_artifacts.is_artifact(filepath):
+            arrays, manifest = mmap_artifacts.read(filepath)
+            metadata = manifest['metadata']
+            self.feature_names = metadata['feature_names']
+            self.model_version = metadata['model_version']
+            self.trained = metadata['trained']
+            self.trained_at = metadata.get('trained_at')
+            # Only the compiled model is loaded; the sklearn estimators stay unfitted
+            self.compiled = CompiledZoningModel.from_arrays(arrays)
+            return
         model_data = joblib.load(filepath)
         self.classifier = model_data['classifier']
         self.far_regressor = model_data['far_regressor']
@@ -636,6 +707,24 @@ class ZoningMLModel:
         self.feature_names = model_data['feature_names']
         self.model_version = model_data['model_version']
         self.trained = model_data['trained']
+        self.trained_at = model_data.get('trained_at')
+        self._compile()
+    
+    def _compile(self):
+        """Flatten the fitted models for inference; sklearn's predict stays the fallback"""
+        self.compiled = None
+        if not self.trained:
+            return
+        try:
+            self.compiled = CompiledZoningModel(self.classifier, self.far_regressor, self.scaler)
+        except Exception as e:
+            print(f"⚠️ Could not compile zoning model, using sklearn predict: {e}")
+    
+    def model_identity(self):
+        """Identifies the fitted model; changes whenever it is retrained"""
+        if not self.trained:
+            return 'rule-based'
+        return f"{self.model_version}@{self.trained_at}"
     
     def is_trained(self):
         """Check if model is trained"""
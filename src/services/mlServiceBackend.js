@@ -46,7 +46,8 @@ class MLServiceBackend {
         throw new Error("Upload failed");
       }
 
-      const data = await response.json();
+      const job = await response.json();
+      const data = await this._waitForJob(job.job_id);
       return {
         id: data.document_id,
         name: file.name,
@@ -63,7 +64,29 @@ class MLServiceBackend {
     }
   }
 
-  async trainModel() {
+  // Poll a background job until it completes; resolves with its result
+  async _waitForJob(jobId, onProgress, intervalMs = 1000) {
+    for (;;) {
+      const response = await fetch(`${API_URL}/jobs/${jobId}`);
+      if (!response.ok) {
+        throw new Error("Job status unavailable");
+      }
+
+      const job = await response.json();
+      if (job.status === "completed") {
+        return job.result;
+      }
+      if (job.status === "failed") {
+        throw new Error(job.error || "Job failed");
+      }
+      if (onProgress) {
+        onProgress(job.progress);
+      }
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+  }
+
+  async trainModel(city = null) {
     if (!this.backendAvailable) {
       return {
         success: true,
@@ -76,13 +99,18 @@ class MLServiceBackend {
     try {
       const response = await fetch(`${API_URL}/train-model`, {
         method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(city ? { city } : {}),
       });
 
       if (!response.ok) {
         throw new Error("Training failed");
       }
 
-      return await response.json();
+      // Training runs in the background; the new model is live once the job completes
+      const job = await response.json();
+      const result = await this._waitForJob(job.job_id);
+      return { success: true, ...result };
     } catch (error) {
       console.error("Error training model:", error);
       throw error;
@@ -409,6 +437,68 @@ class MLServiceBackend {
     }
   }
 
+  // Stream a report section by section. parcelInfo, zoningDetails and scenarios
+  // arrive first; floodRisk, aqiForecast, amenities and roadCondition follow as
+  // the backend finishes them. onSection(name, data, partialReport) is called
+  // for every section and the assembled report is returned at the end.
+  async streamReport(
+    polygon,
+    nearbyAreas,
+    city = "bangalore",
+    area = null,
+    onSection = () => {}
+  ) {
+    const response = await fetch(`${API_URL}/generate-report/stream`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        Accept: "application/x-ndjson",
+      },
+      body: JSON.stringify({
+        polygon,
+        nearby_areas: nearbyAreas,
+        city: city,
+        area: area,
+      }),
+    });
+
+    if (!response.ok) {
+      const errorData = await response.json();
+      if (errorData.code === "NO_ZONING_DOCS") {
+        throw new Error(errorData.error);
+      }
+      throw new Error("Backend request failed");
+    }
+
+    const report = {};
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    const handleLine = (line) => {
+      if (!line.trim()) return;
+      const frame = JSON.parse(line);
+      if (frame.event === "section") {
+        report[frame.section] = frame.data;
+        onSection(frame.section, frame.data, report);
+      } else if (frame.event === "error") {
+        throw new Error(frame.error);
+      }
+    };
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split("\n");
+      buffer = lines.pop();
+      lines.forEach(handleLine);
+    }
+    handleLine(buffer);
+
+    return report;
+  }
+
   async getDocuments(city = null) {
     // Try to fetch documents from backend even if health check previously failed.
     try {
@@ -431,6 +521,24 @@ class MLServiceBackend {
     }
   }
 
+  async searchRegulations(query, city = null, limit = 10) {
+    if (!this.backendAvailable) return [];
+
+    try {
+      const url = new URL(`${API_URL}/search`);
+      url.searchParams.append("q", query);
+      if (city) url.searchParams.append("city", city);
+      url.searchParams.append("limit", limit);
+      const response = await fetch(url.toString());
+      if (!response.ok) return [];
+      const data = await response.json();
+      return data.results;
+    } catch (error) {
+      console.error("Error searching regulations:", error);
+      return [];
+    }
+  }
+
   async deleteDocument(docId) {
     if (!this.backendAvailable) return;
 